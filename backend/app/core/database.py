@@ -1,16 +1,259 @@
+import asyncio
 import os
-from supabase import create_client, Client
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient, Client
 
 url: str = os.environ.get("SUPABASE_URL", "")
 key: str = os.environ.get("SUPABASE_SERVICE_KEY", "")
 
+# Storage backend: "supabase" (default) or "memory" (in-process, for local benchmarking/tests)
+backend: str = os.environ.get("PERSISTENCE_BACKEND", "supabase").lower()
+
+# Connection pool tuning (per gunicorn worker; 4 workers => 4 pools)
+POOL_MAX_CONNECTIONS: int = int(os.environ.get("SUPABASE_POOL_SIZE", "20"))
+POOL_MAX_KEEPALIVE: int = int(os.environ.get("SUPABASE_POOL_KEEPALIVE", "10"))
+POOL_KEEPALIVE_EXPIRY: float = float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", "120"))
+HTTP_CONNECT_TIMEOUT: float = float(os.environ.get("SUPABASE_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT: float = float(os.environ.get("SUPABASE_HTTP_TIMEOUT", "15"))
+POOL_ACQUIRE_TIMEOUT: float = float(os.environ.get("SUPABASE_POOL_TIMEOUT", "5"))
+HTTP2_ENABLED: bool = os.environ.get("SUPABASE_HTTP2", "true").lower() == "true"
+# Async pool (per event loop): sized for many concurrent requests on one worker
+ASYNC_POOL_MAX_CONNECTIONS: int = int(os.environ.get("SUPABASE_ASYNC_POOL_SIZE", "100"))
+ASYNC_POOL_MAX_KEEPALIVE: int = int(os.environ.get("SUPABASE_ASYNC_POOL_KEEPALIVE", "50"))
+
+
+class PoolMetrics:
+    """Counters for the shared PostgREST connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_total = 0
+        self.errors_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def started(self):
+        with self._lock:
+            self.requests_total += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, failed: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors_total += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests_total": self.requests_total,
+                "errors_total": self.errors_total,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+
+pool_metrics = PoolMetrics()
+_http_transport: Optional[Any] = None
+
+
+def _build_http_session(base_url: Any, headers: Any):
+    """Keep-alive (HTTP/2 when available) session with explicit limits and timeouts"""
+    import httpx
+
+    class InstrumentedTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            pool_metrics.started()
+            failed = True
+            try:
+                response = super().handle_request(request)
+                failed = response.status_code >= 500
+                return response
+            finally:
+                pool_metrics.finished(failed)
+
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401  (httpx[http2] extra)
+        except ImportError:
+            print("⚠️ SUPABASE_HTTP2 requested but 'h2' is not installed. Falling back to HTTP/1.1.")
+            http2 = False
+
+    global _http_transport
+    _http_transport = InstrumentedTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        ),
+        retries=1,  # Retry connect failures once (stale keep-alive sockets)
+    )
+    return httpx.Client(
+        base_url=base_url,
+        headers=headers,
+        transport=_http_transport,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=POOL_ACQUIRE_TIMEOUT),
+    )
+
+
+def _create_pooled_client(url: str, key: str) -> "Client":
+    from supabase import create_client, ClientOptions
+
+    client = create_client(url, key, options=ClientOptions(
+        postgrest_client_timeout=HTTP_TIMEOUT,
+        auto_refresh_token=False,
+        persist_session=False,
+    ))
+    # Replace the default PostgREST session with the tuned, instrumented pool.
+    # The postgrest client is created once and reused for every table()/rpc() call.
+    try:
+        postgrest = client.postgrest
+        default_session = postgrest.session
+        postgrest.session = _build_http_session(default_session.base_url, default_session.headers)
+        default_session.close()
+    except Exception as e:
+        print(f"⚠️ Could not install pooled PostgREST session, using client defaults: {e}")
+    return client
+
+
+def _build_async_http_session(base_url: Any, headers: Any):
+    """Async counterpart of _build_http_session; bound to the event loop it is first used on"""
+    import httpx
+
+    class InstrumentedAsyncTransport(httpx.AsyncHTTPTransport):
+        async def handle_async_request(self, request):
+            pool_metrics.started()
+            failed = True
+            try:
+                response = await super().handle_async_request(request)
+                failed = response.status_code >= 500
+                return response
+            finally:
+                pool_metrics.finished(failed)
+
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            http2 = False
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=headers,
+        transport=InstrumentedAsyncTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=ASYNC_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+            retries=1,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=POOL_ACQUIRE_TIMEOUT),
+    )
+
+
+async def _create_async_client(url: str, key: str) -> "AsyncClient":
+    from supabase import acreate_client, AsyncClientOptions
+
+    client = await acreate_client(url, key, options=AsyncClientOptions(
+        postgrest_client_timeout=HTTP_TIMEOUT,
+        auto_refresh_token=False,
+        persist_session=False,
+    ))
+    try:
+        postgrest = client.postgrest
+        default_session = postgrest.session
+        postgrest.session = _build_async_http_session(default_session.base_url, default_session.headers)
+        await default_session.aclose()
+    except Exception as e:
+        print(f"⚠️ Could not install pooled async PostgREST session, using client defaults: {e}")
+    return client
+
+
+if backend == "memory":
+    from app.core.memory_db import InMemoryClient
+    print("ℹ️ PERSISTENCE_BACKEND=memory: using in-process storage. Data is not persisted.")
+    supabase_admin: "Client" = InMemoryClient() # type: ignore
 # Fallback for localized dev without DB
-if not url or "your-project" in url:
+elif not url or "your-project" in url:
     print("⚠️ Supabase URL not properly configured. Persistence will fail.")
-    supabase_admin: Client = None # type: ignore
+    supabase_admin: "Client" = None # type: ignore
 else:
-    supabase_admin: Client = create_client(url, key)
+    supabase_admin: "Client" = _create_pooled_client(url, key)
 
-def get_supabase_client() -> Client:
+def get_supabase_client() -> "Client":
     """Returns the admin client (Service Role) for backend operations"""
     return supabase_admin
+
+# One async client per event loop: httpx.AsyncClient connections cannot be shared across loops
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+async def get_async_supabase_client() -> Optional["AsyncClient"]:
+    """Returns the async admin client for the running event loop (created on first use)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is not None:
+        return client
+    if backend == "memory":
+        from app.core.memory_db import AsyncInMemoryClient
+        client = AsyncInMemoryClient(supabase_admin)
+    elif supabase_admin is None:
+        return None
+    else:
+        client = await _create_async_client(url, key)
+    with _async_clients_lock:
+        # Another task on this loop may have won the race while we awaited; keep the first
+        existing = _async_clients.setdefault(loop, client)
+    if existing is not client:
+        await _close_async_client(client)
+    return existing
+
+async def _close_async_client(client: Any):
+    session = getattr(getattr(client, "postgrest", None), "session", None)
+    if session is not None and hasattr(session, "aclose"):
+        await session.aclose()
+
+async def close_async_supabase_client():
+    """Closes the running loop's async client (called on app shutdown)"""
+    with _async_clients_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await _close_async_client(client)
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Connection pool configuration and usage for the /metrics endpoint"""
+    stats: Dict[str, Any] = {
+        "backend": backend,
+        "max_connections": POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": POOL_MAX_KEEPALIVE,
+        "keepalive_expiry_s": POOL_KEEPALIVE_EXPIRY,
+        "http2": HTTP2_ENABLED,
+        "async_max_connections": ASYNC_POOL_MAX_CONNECTIONS,
+        "async_clients": len(_async_clients),
+        **pool_metrics.snapshot(),
+    }
+    pool = getattr(_http_transport, "_pool", None)
+    if pool is not None:
+        try:
+            connections = list(pool.connections)
+            stats["open_connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for c in connections if c.is_idle())
+        except Exception:
+            pass
+    return stats
+
+def close_supabase_client():
+    """Closes pooled connections (called on app shutdown)"""
+    session = getattr(getattr(supabase_admin, "postgrest", None), "session", None)
+    if session is not None and hasattr(session, "close"):
+        session.close()
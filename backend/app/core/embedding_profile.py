@@ -0,0 +1,56 @@
+"""
+Embedding profiles: how vectors are generated, where they are stored and which RPC searches them.
+
+    full     1536-dim float32 in `embedding` (vector), searched by match_knowledge_base / match_signals
+    compact  512-dim float16 in `embedding_compact` (halfvec), searched by the *_compact RPCs
+
+text-embedding-3-small is trained so a prefix of its output is itself a usable embedding; the API's
+`dimensions` parameter returns that prefix re-normalized. Storing it as halfvec cuts each vector
+from 6144 to 1024 bytes, which shrinks both the HNSW index and every insert payload.
+
+Select with EMBEDDING_PROFILE. Switching to compact on an existing deployment: apply the
+20251219_compact_embeddings migration, run `python -m app.jobs.reembed`, flip the profile, then
+run the backfill once more for rows written during the switch.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+NATIVE_DIMENSIONS = 1536
+
+EMBEDDING_PROFILES: Dict[str, Dict[str, Any]] = {
+    "full": {
+        "dimensions": NATIVE_DIMENSIONS,
+        "column": "embedding",
+        "storage": "vector",
+        "knowledge_rpc": "match_knowledge_base",
+        "signals_rpc": "match_signals",
+    },
+    "compact": {
+        # Must match the halfvec(512) columns in supabase/migrations/20251219_compact_embeddings.sql
+        "dimensions": 512,
+        "column": "embedding_compact",
+        "storage": "halfvec",
+        "knowledge_rpc": "match_knowledge_base_compact",
+        "signals_rpc": "match_signals_compact",
+    },
+}
+
+BYTES_PER_COMPONENT = {"vector": 4, "halfvec": 2}
+
+
+def get_embedding_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """The named profile, or the one selected by EMBEDDING_PROFILE (default: full)"""
+    name = name or os.environ.get("EMBEDDING_PROFILE", "full")
+    if name not in EMBEDDING_PROFILES:
+        raise ValueError(f"Unknown EMBEDDING_PROFILE '{name}' (expected one of {', '.join(EMBEDDING_PROFILES)})")
+    return {"name": name, **EMBEDDING_PROFILES[name]}
+
+
+def embedding_fields(vector: Optional[List[float]], profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Row fragment storing `vector` in the profile's column"""
+    return {(profile or get_embedding_profile())["column"]: vector}
+
+
+def bytes_per_vector(profile: Dict[str, Any]) -> int:
+    return profile["dimensions"] * BYTES_PER_COMPONENT[profile["storage"]]
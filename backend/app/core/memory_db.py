@@ -0,0 +1,893 @@
+"""
+In-process storage backend.
+
+Implements the subset of the supabase-py client interface that
+PersistenceRepository (and the few routes that touch `repo.db` directly) rely on:
+table()/from_() query builders with select/insert/upsert/update/delete, the
+eq/neq/gt/gte/lt/lte/in_/is_ filters, or_() logic trees, order/limit/range,
+single/maybe_single, embedded resources in select() (e.g. "*, workflow_nodes(*)"),
+and rpc() for the Postgres functions defined in supabase/migrations.
+
+Select it with PERSISTENCE_BACKEND=memory to run or profile the trigger engine,
+webhooks and RAG without network access. Every executed request is counted in
+`client.stats` so query-count regressions can be asserted on. Set
+MEMORY_DB_LATENCY_MS to add a simulated network round trip to every request.
+AsyncInMemoryClient exposes the same storage through awaitable execute() calls.
+"""
+import asyncio
+import copy
+import math
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MemoryDBError(Exception):
+    """Raised where PostgREST would return an error response."""
+
+
+class MemoryResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+# Column defaults mirrored from supabase/migrations
+_TABLE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "teams": {"auto_pilot_enabled": True, "shadow_workflow_id": None},
+    "raw_signals": {"actor": None, "metadata": {}, "embedding": None, "embedding_compact": None},
+    "inference_runs": {"status": "pending", "completed_at": None, "model_config": {}},
+    "inference_run_signals": {},
+    "workflows": {"inference_run_id": None, "title": "Untitled Workflow", "is_active": False},
+    "workflow_nodes": {"description": None, "type": "process", "actor": None, "metadata": {}, "auto_run_enabled": False},
+    "workflow_edges": {"label": None, "condition": None},
+    "knowledge_base": {"embedding": None, "embedding_compact": None, "metadata": {}},
+    "team_usage": {"period_end": None, "automation_count": 0, "automation_limit": 100, "plan_tier": "free"},
+    "channel_configs": {"channel_name": None, "workflow_template": None, "auto_pilot_enabled": False, "config": {}},
+    "idempotency_keys": {"executed_at": None},
+    "evaluation_jobs": {
+        "team_id": None, "kind": "evaluate_signal", "dedupe_key": None, "status": "queued", "attempts": 0,
+        "max_attempts": 5, "leased_until": None, "lease_token": None, "worker_id": None, "last_error": None
+    },
+    "shadow_decisions": {
+        "active_workflow_id": None, "source": None, "external_id": None, "signal_text": None,
+        "active_node_id": None, "active_node_label": None, "active_confidence": 0.0,
+        "shadow_node_id": None, "shadow_node_label": None, "shadow_confidence": 0.0, "shadow_cached": False
+    },
+}
+
+# Unique constraints: (columns, predicate for partial indexes)
+_UNIQUE_CONSTRAINTS: Dict[str, List[Tuple[Tuple[str, ...], Optional[Callable[[Dict], bool]]]]] = {
+    "raw_signals": [(("team_id", "source", "external_id"), None)],
+    "inference_run_signals": [(("inference_run_id", "signal_id"), None)],
+    "workflows": [(("team_id",), lambda row: row.get("is_active") is True)],
+    "channel_configs": [(("team_id", "channel_id"), None)],
+    "idempotency_keys": [(("team_id", "key"), None)],
+    "evaluation_jobs": [(("dedupe_key",), None)],
+}
+
+
+# Foreign keys used to resolve embedded selects: (child, parent) -> child column
+_FOREIGN_KEYS: Dict[Tuple[str, str], str] = {
+    ("workflow_nodes", "workflows"): "workflow_id",
+    ("workflow_edges", "workflows"): "workflow_id",
+    ("workflows", "teams"): "team_id",
+    ("raw_signals", "teams"): "team_id",
+    ("inference_runs", "teams"): "team_id",
+    ("knowledge_base", "teams"): "team_id",
+    ("inference_run_signals", "inference_runs"): "inference_run_id",
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _resolve(row: Dict, column: str) -> Any:
+    """Resolves plain columns and JSON paths like model_config->>idempotency_key"""
+    if "->" not in column:
+        return row.get(column)
+    parts = column.replace("->>", "->").split("->")
+    value: Any = row.get(parts[0])
+    for key in parts[1:]:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        return value
+    return None if value is None else str(value)
+
+
+def _compare(left: Any, right: Any) -> Optional[int]:
+    left, right = _normalize(left), _normalize(right)
+    if left is None or right is None:
+        return None
+    if isinstance(left, (int, float)) and isinstance(right, str):
+        try:
+            right = float(right)
+        except ValueError:
+            left = str(left)
+    elif isinstance(right, (int, float)) and isinstance(left, str):
+        try:
+            left = float(left)
+        except ValueError:
+            right = str(right)
+    return (left > right) - (left < right)
+
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda v, t: _compare(v, t) == 0,
+    "neq": lambda v, t: _compare(v, t) not in (0, None),
+    "gt": lambda v, t: (_compare(v, t) or 0) > 0,
+    "gte": lambda v, t: _compare(v, t) is not None and _compare(v, t) >= 0,
+    "lt": lambda v, t: (_compare(v, t) or 0) < 0,
+    "lte": lambda v, t: _compare(v, t) is not None and _compare(v, t) <= 0,
+    "in": lambda v, t: any(_compare(v, x) == 0 for x in t),
+    "is": lambda v, t: v is t if t is None or isinstance(t, bool) else _normalize(v) == _normalize(t),
+}
+
+
+def _split_top_level(expr: str) -> List[str]:
+    """Splits on commas that are not inside parentheses or double quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _parse_logic_tree(expr: str, combine: Callable[[Any], bool] = any) -> Callable[[Dict], bool]:
+    """
+    Parses a PostgREST logic tree as passed to .or_(), e.g.
+    'created_at.lt."2025-01-01",and(created_at.eq."2025-01-01",id.lt.abc)'
+    """
+    predicates = []
+    for part in _split_top_level(expr):
+        for name, fn in (("and(", all), ("or(", any)):
+            if part.startswith(name) and part.endswith(")"):
+                predicates.append(_parse_logic_tree(part[len(name):-1], fn))
+                break
+        else:
+            column, op, value = part.split(".", 2)
+            if op == "in":
+                target: Any = [_unquote(v) for v in _split_top_level(value.strip("()"))]
+            elif op == "is":
+                target = {"null": None, "true": True, "false": False}.get(value, value)
+            else:
+                target = _unquote(value)
+            predicates.append(lambda row, c=column, o=op, t=target: _OPERATORS[o](_resolve(row, c), t))
+    return lambda row: combine(p(row) for p in predicates)
+
+
+def _split_columns(columns: str) -> List[str]:
+    """Splits a select string on top-level commas: "*, nodes(id, label)" -> ["*", "nodes(id, label)"]"""
+    parts, depth, current = [], 0, ""
+    for char in columns:
+        if char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += (char == "(") - (char == ")")
+        current += char
+    parts.append(current.strip())
+    return [p for p in parts if p]
+
+
+def _cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = math.sqrt(sum(x * x for x in a))
+    norm_b = math.sqrt(sum(y * y for y in b))
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+def _same_key(a: Dict[str, Any], b: Dict[str, Any], columns: Tuple[str, ...]) -> bool:
+    """Unique-key equality with Postgres semantics: NULLs never collide"""
+    return all(
+        a.get(c) is not None and b.get(c) is not None and _compare(a.get(c), b.get(c)) == 0
+        for c in columns
+    )
+
+
+class MemoryStore:
+    """Thread-safe table storage shared by every builder of one client."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.lock = threading.RLock()
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(table, [])
+
+    def prepare(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        prepared = copy.deepcopy(_TABLE_DEFAULTS.get(table, {}))
+        prepared.update(copy.deepcopy(row))
+        prepared.setdefault("id", str(uuid.uuid4()))
+        prepared.setdefault("created_at", _now())
+        return prepared
+
+    def check_unique(self, table: str, row: Dict[str, Any], ignore: Optional[Dict] = None):
+        for columns, predicate in _UNIQUE_CONSTRAINTS.get(table, []) + [(("id",), None)]:
+            if predicate and not predicate(row):
+                continue
+            for existing in self.rows(table):
+                if existing is ignore or (predicate and not predicate(existing)):
+                    continue
+                if _same_key(existing, row, columns):
+                    raise MemoryDBError(
+                        f'duplicate key value violates unique constraint on {table}({", ".join(columns)})'
+                    )
+
+    def find_conflict(self, table: str, row: Dict[str, Any], columns: Tuple[str, ...]) -> Optional[Dict]:
+        for existing in self.rows(table):
+            if _same_key(existing, row, columns):
+                return existing
+        return None
+
+
+class _KeyIndex:
+    """
+    Hash indexes over one table's unique keys, built once per write statement so batch
+    inserts/upserts stay O(rows) instead of rescanning the table for every row.
+    """
+
+    def __init__(self, store: MemoryStore, table: str, extra: Tuple[str, ...] = ()):
+        self._table = table
+        self._unique = _UNIQUE_CONSTRAINTS.get(table, []) + [(("id",), None)]
+        # ON CONFLICT target: only looked up, never enforced
+        self._constraints = list(self._unique)
+        if extra and all(columns != extra for columns, _ in self._unique):
+            self._constraints.append((extra, None))
+        self._indexes: Dict[Tuple[str, ...], Dict[Tuple, Dict]] = {c: {} for c, _ in self._constraints}
+        for row in store.rows(table):
+            self.add(row)
+
+    @staticmethod
+    def _key(row: Dict[str, Any], columns: Tuple[str, ...]) -> Optional[Tuple]:
+        values = tuple(_normalize(row.get(c)) for c in columns)
+        return None if any(v is None for v in values) else values
+
+    def add(self, row: Dict[str, Any]):
+        for columns, predicate in self._constraints:
+            key = self._key(row, columns)
+            if key is not None and not (predicate and not predicate(row)):
+                self._indexes[columns][key] = row
+
+    def find(self, row: Dict[str, Any], columns: Tuple[str, ...]) -> Optional[Dict]:
+        key = self._key(row, columns)
+        return None if key is None else self._indexes[columns].get(key)
+
+    def check(self, row: Dict[str, Any]):
+        for columns, predicate in self._unique:
+            if predicate and not predicate(row):
+                continue
+            if self.find(row, columns) is not None:
+                raise MemoryDBError(
+                    f'duplicate key value violates unique constraint on {self._table}({", ".join(columns)})'
+                )
+
+
+class _QueryBuilder:
+    def __init__(self, client: "InMemoryClient", table: str):
+        self._client = client
+        self._store = client.store
+        self._table = table
+        self._op = "select"
+        self._columns = "*"
+        self._count: Optional[str] = None
+        self._payload: Any = None
+        self._on_conflict: Tuple[str, ...] = ()
+        self._ignore_duplicates = False
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._single: Optional[str] = None
+
+    # --- Operations ---
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "_QueryBuilder":
+        self._op, self._columns, self._count = "select", columns, count
+        return self
+
+    def insert(self, rows: Any, **kwargs) -> "_QueryBuilder":
+        self._op, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows: Any, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs) -> "_QueryBuilder":
+        self._op, self._payload = "upsert", rows
+        self._on_conflict = tuple(c.strip() for c in on_conflict.split(",") if c.strip()) or ("id",)
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: Dict[str, Any], **kwargs) -> "_QueryBuilder":
+        self._op, self._payload = "update", values
+        return self
+
+    def delete(self, **kwargs) -> "_QueryBuilder":
+        self._op = "delete"
+        return self
+
+    # --- Filters & Modifiers ---
+    def _filter(self, op: str, column: str, value: Any) -> "_QueryBuilder":
+        self._filters.append((op, column, value))
+        return self
+
+    def eq(self, column: str, value: Any): return self._filter("eq", column, value)
+    def neq(self, column: str, value: Any): return self._filter("neq", column, value)
+    def gt(self, column: str, value: Any): return self._filter("gt", column, value)
+    def gte(self, column: str, value: Any): return self._filter("gte", column, value)
+    def lt(self, column: str, value: Any): return self._filter("lt", column, value)
+    def lte(self, column: str, value: Any): return self._filter("lte", column, value)
+    def in_(self, column: str, values: List[Any]): return self._filter("in", column, list(values))
+    def is_(self, column: str, value: Any): return self._filter("is", column, None if value in (None, "null") else value)
+
+    def or_(self, filters: str, **kwargs) -> "_QueryBuilder":
+        return self._filter("logic", "", _parse_logic_tree(filters))
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> "_QueryBuilder":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> "_QueryBuilder":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs) -> "_QueryBuilder":
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self) -> "_QueryBuilder":
+        self._single = "single"
+        return self
+
+    def maybe_single(self) -> "_QueryBuilder":
+        self._single = "maybe_single"
+        return self
+
+    # --- Execution ---
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(
+            value(row) if op == "logic" else _OPERATORS[op](_resolve(row, column), value)
+            for op, column, value in self._filters
+        )
+
+    def _project(self, row: Dict[str, Any], table: Optional[str] = None, columns: Optional[str] = None) -> Dict[str, Any]:
+        table = table or self._table
+        projected: Dict[str, Any] = {}
+        for column in _split_columns(self._columns if columns is None else columns):
+            if column == "*":
+                projected.update(copy.deepcopy(row))
+            elif column.endswith(")") and "(" in column:
+                child, inner = column[:-1].split("(", 1)
+                projected[child] = self._embed(row, table, child.strip(), inner)
+            elif column in row:
+                projected[column] = copy.deepcopy(row[column])
+        return projected
+
+    def _embed(self, row: Dict[str, Any], table: str, child: str, columns: str) -> List[Dict[str, Any]]:
+        fk = _FOREIGN_KEYS.get((child, table))
+        if fk is None:
+            raise MemoryDBError(f"Could not find a relationship between '{table}' and '{child}'")
+        return [
+            self._project(c, child, columns)
+            for c in self._store.rows(child)
+            if _compare(c.get(fk), row.get("id")) == 0
+        ]
+
+    def _sorted(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for column, desc in reversed(self._order):
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, _normalize(r.get(column)) or ""), reverse=desc)
+        return rows
+
+    def _record(self):
+        self._client.record(self._table, self._op)
+
+    def execute(self) -> MemoryResponse:
+        self._record()
+        self._client.simulate_latency()
+        return self._run()
+
+    def _run(self) -> MemoryResponse:
+        with self._store.lock:
+            handler = getattr(self, f"_execute_{self._op}")
+            data = handler()
+        count = len(data) if self._count and isinstance(data, list) else None
+        if self._single:
+            if len(data) > 1 or (self._single == "single" and not data):
+                raise MemoryDBError(f"JSON object requested, multiple (or no) rows returned ({len(data)} rows)")
+            data = data[0] if data else None
+        return MemoryResponse(data, count)
+
+    def _execute_select(self) -> List[Dict[str, Any]]:
+        rows = self._sorted([r for r in self._store.rows(self._table) if self._matches(r)])
+        end = None if self._limit is None else self._offset + self._limit
+        return [self._project(r) for r in rows[self._offset:end]]
+
+    def _execute_insert(self) -> List[Dict[str, Any]]:
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        prepared = [self._store.prepare(self._table, r) for r in payload]
+        table_rows = self._store.rows(self._table)
+        inserted = []
+        # Validate the whole batch first so a failing statement writes nothing
+        snapshot = list(table_rows)
+        index = _KeyIndex(self._store, self._table)
+        try:
+            for row in prepared:
+                index.check(row)
+                index.add(row)
+                table_rows.append(row)
+                inserted.append(copy.deepcopy(row))
+        except MemoryDBError:
+            table_rows[:] = snapshot
+            raise
+        return inserted
+
+    def _execute_upsert(self) -> List[Dict[str, Any]]:
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        result = []
+        index = _KeyIndex(self._store, self._table, extra=self._on_conflict)
+        for raw in payload:
+            existing = index.find(raw, self._on_conflict)
+            if existing is None:
+                row = self._store.prepare(self._table, raw)
+                index.check(row)
+                index.add(row)
+                self._store.rows(self._table).append(row)
+                result.append(copy.deepcopy(row))
+            elif not self._ignore_duplicates:
+                existing.update(copy.deepcopy(raw))
+                result.append(copy.deepcopy(existing))
+        return result
+
+    def _execute_update(self) -> List[Dict[str, Any]]:
+        updated = []
+        for row in self._store.rows(self._table):
+            if not self._matches(row):
+                continue
+            candidate = {**row, **copy.deepcopy(self._payload)}
+            self._store.check_unique(self._table, candidate, ignore=row)
+            row.update(copy.deepcopy(self._payload))
+            updated.append(copy.deepcopy(row))
+        return updated
+
+    def _execute_delete(self) -> List[Dict[str, Any]]:
+        table_rows = self._store.rows(self._table)
+        deleted = [r for r in table_rows if self._matches(r)]
+        table_rows[:] = [r for r in table_rows if not self._matches(r)]
+        return deleted
+
+
+class _RpcBuilder:
+    def __init__(self, client: "InMemoryClient", name: str, params: Dict[str, Any]):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def _record(self):
+        self._client.record(f"rpc:{self._name}", "call")
+
+    def execute(self) -> MemoryResponse:
+        self._record()
+        self._client.simulate_latency()
+        return self._run()
+
+    def _run(self) -> MemoryResponse:
+        handler = _RPC_HANDLERS.get(self._name)
+        if handler is None:
+            raise MemoryDBError(f"Could not find the function public.{self._name}")
+        with self._client.store.lock:
+            return MemoryResponse(handler(self._client.store, self._params))
+
+
+# --- RPC implementations (see supabase/migrations) ---
+def _match_embeddings(store: MemoryStore, table: str, column: str, fields: Tuple[str, ...], params: Dict[str, Any]) -> List[Dict]:
+    query = params["query_embedding"]
+    scored = []
+    for row in store.rows(table):
+        if _compare(row.get("team_id"), params["filter_team_id"]) != 0 or not row.get(column):
+            continue
+        similarity = _cosine_similarity(row[column], query)
+        if similarity > params["match_threshold"]:
+            scored.append({**{f: copy.deepcopy(row[f]) for f in fields}, "similarity": similarity})
+    scored.sort(key=lambda r: r["similarity"], reverse=True)
+    return scored[:params["match_count"]]
+
+
+def _rpc_match_signals(store: MemoryStore, params: Dict[str, Any]) -> List[Dict]:
+    return _match_embeddings(store, "raw_signals", "embedding", ("id", "content", "occurred_at"), params)
+
+
+def _rpc_match_signals_compact(store: MemoryStore, params: Dict[str, Any]) -> List[Dict]:
+    return _match_embeddings(store, "raw_signals", "embedding_compact", ("id", "content", "occurred_at"), params)
+
+
+def _rpc_match_knowledge_base(store: MemoryStore, params: Dict[str, Any]) -> List[Dict]:
+    return _match_embeddings(store, "knowledge_base", "embedding", ("id", "content", "metadata"), params)
+
+
+def _rpc_match_knowledge_base_compact(store: MemoryStore, params: Dict[str, Any]) -> List[Dict]:
+    return _match_embeddings(store, "knowledge_base", "embedding_compact", ("id", "content", "metadata"), params)
+
+
+def _rpc_set_compact_embeddings(store: MemoryStore, params: Dict[str, Any]) -> int:
+    if params["p_table"] not in ("knowledge_base", "raw_signals"):
+        raise MemoryDBError(f"set_compact_embeddings: unsupported table {params['p_table']}")
+    vectors = {str(r["id"]): r["embedding"] for r in params["p_rows"]}
+    updated = 0
+    for row in store.rows(params["p_table"]):
+        if row.get("embedding_compact") is None and str(row["id"]) in vectors:
+            row["embedding_compact"] = list(vectors[str(row["id"])])
+            updated += 1
+    return updated
+
+
+def _rpc_increment_usage(store: MemoryStore, params: Dict[str, Any]) -> None:
+    team_id = params["team_id_input"]
+    usage = store.find_conflict("team_usage", {"team_id": team_id}, ("team_id",))
+    if usage is None:
+        usage = store.prepare("team_usage", {"team_id": team_id})
+        store.rows("team_usage").append(usage)
+    usage["automation_count"] += 1
+    usage["updated_at"] = _now()
+    return None
+
+
+def _rpc_update_workflow_nodes_batch(store: MemoryStore, params: Dict[str, Any]) -> List[Dict]:
+    results = []
+    # Validate every element before writing so the batch applies atomically
+    for elem in params["p_nodes"]:
+        if "label" in elem and elem["label"] is None:
+            raise MemoryDBError('null value in column "label" of relation "workflow_nodes" violates not-null constraint')
+    for elem in params["p_nodes"]:
+        matched = False
+        for row in store.rows("workflow_nodes"):
+            if _compare(row.get("workflow_id"), params["p_workflow_id"]) == 0 and row.get("step_id") == elem.get("id"):
+                for field in ("label", "description", "auto_run_enabled", "metadata"):
+                    if field in elem:
+                        row[field] = copy.deepcopy(elem[field])
+                matched = True
+        results.append({"node_id": elem.get("id"), "updated": matched})
+    return results
+
+
+def _rpc_save_workflow_graph(store: MemoryStore, params: Dict[str, Any]) -> str:
+    nodes = params.get("p_nodes") or []
+    edges = params.get("p_edges") or []
+    if any(n.get("id") is None for n in nodes):
+        raise MemoryDBError('null value in column "step_id" of relation "workflow_nodes" violates not-null constraint')
+    if any(e.get("source") is None or e.get("target") is None for e in edges):
+        raise MemoryDBError('null value in column "source_step_id" of relation "workflow_edges" violates not-null constraint')
+
+    # Runs under the store lock, which gives the same serialization as the advisory lock
+    activate = params.get("p_activate", True)
+    if activate:
+        _deactivate_workflows(store, params["p_team_id"])
+    workflow = store.prepare("workflows", {
+        "team_id": params["p_team_id"],
+        "inference_run_id": params.get("p_inference_run_id"),
+        "title": params.get("p_title") or "Generated Workflow",
+        "is_active": activate,
+    })
+    store.rows("workflows").append(workflow)
+    for n in nodes:
+        data = n.get("data") or {}
+        store.rows("workflow_nodes").append(store.prepare("workflow_nodes", {
+            "workflow_id": workflow["id"],
+            "step_id": str(n["id"]),
+            "label": data.get("label", "Untitled"),
+            "type": n.get("type", "process"),
+            "description": data.get("description", ""),
+            "actor": data.get("actor", ""),
+            "metadata": data,
+        }))
+    for e in edges:
+        store.rows("workflow_edges").append(store.prepare("workflow_edges", {
+            "workflow_id": workflow["id"],
+            "source_step_id": str(e["source"]),
+            "target_step_id": str(e["target"]),
+            "label": e.get("label", ""),
+            "condition": "",
+        }))
+    if not activate:
+        for team in store.rows("teams"):
+            if _compare(team.get("id"), params["p_team_id"]) == 0:
+                team["shadow_workflow_id"] = workflow["id"]
+    return workflow["id"]
+
+
+def _deactivate_workflows(store: MemoryStore, team_id: str):
+    for row in store.rows("workflows"):
+        if _compare(row.get("team_id"), team_id) == 0 and row.get("is_active"):
+            row["is_active"] = False
+
+
+def _rpc_promote_shadow_workflow(store: MemoryStore, params: Dict[str, Any]) -> Optional[str]:
+    team = next((t for t in store.rows("teams") if _compare(t.get("id"), params["p_team_id"]) == 0), None)
+    if team is None or team.get("shadow_workflow_id") is None:
+        return None
+    workflow_id = team["shadow_workflow_id"]
+    _deactivate_workflows(store, params["p_team_id"])
+    for row in store.rows("workflows"):
+        if row["id"] == workflow_id:
+            row["is_active"] = True
+    team["shadow_workflow_id"] = None
+    return workflow_id
+
+
+def _rpc_shadow_decision_stats(store: MemoryStore, params: Dict[str, Any]) -> Dict[str, Any]:
+    rows = [
+        r for r in store.rows("shadow_decisions")
+        if _compare(r.get("team_id"), params["p_team_id"]) == 0
+        and _compare(r.get("shadow_workflow_id"), params["p_shadow_workflow_id"]) == 0
+    ]
+    active = [r["active_outcome"] == "fired" for r in rows]
+    shadow = [r["shadow_outcome"] == "fired" for r in rows]
+    return {
+        "evaluated": len(rows),
+        "differs": sum(bool(r["differs"]) for r in rows),
+        "both_fired": sum(a and s for a, s in zip(active, shadow)),
+        "active_only": sum(a and not s for a, s in zip(active, shadow)),
+        "shadow_only": sum(s and not a for a, s in zip(active, shadow)),
+        "different_node": sum(bool(r["differs"]) and a and s for r, a, s in zip(rows, active, shadow)),
+        "first_at": min((r["created_at"] for r in rows), default=None),
+        "last_at": max((r["created_at"] for r in rows), default=None),
+    }
+
+
+def _rpc_claim_idempotency_key(store: MemoryStore, params: Dict[str, Any]) -> bool:
+    now = datetime.now(timezone.utc)
+    expires_at = (now + timedelta(seconds=params["p_ttl_seconds"])).isoformat()
+    existing = store.find_conflict("idempotency_keys", {"team_id": params["p_team_id"], "key": params["p_key"]}, ("team_id", "key"))
+    if existing is None:
+        store.rows("idempotency_keys").append(store.prepare("idempotency_keys", {
+            "team_id": params["p_team_id"], "key": params["p_key"], "expires_at": expires_at
+        }))
+        return True
+    if existing["expires_at"] <= now.isoformat():
+        existing.update({"created_at": now.isoformat(), "expires_at": expires_at, "executed_at": None})
+        return True
+    return False
+
+
+def _rpc_mark_idempotency_key_executed(store: MemoryStore, params: Dict[str, Any]) -> bool:
+    now = datetime.now(timezone.utc)
+    existing = store.find_conflict("idempotency_keys", {"team_id": params["p_team_id"], "key": params["p_key"]}, ("team_id", "key"))
+    if existing is None:
+        store.rows("idempotency_keys").append(store.prepare("idempotency_keys", {
+            "team_id": params["p_team_id"], "key": params["p_key"], "executed_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=params["p_ttl_seconds"])).isoformat()
+        }))
+        return True
+    if existing.get("executed_at") is None:
+        existing["executed_at"] = now.isoformat()
+        return True
+    return False
+
+
+def _rpc_purge_expired_idempotency_keys(store: MemoryStore, params: Dict[str, Any]) -> int:
+    rows = store.rows("idempotency_keys")
+    now = _now()
+    live = [r for r in rows if r["expires_at"] > now]
+    deleted = len(rows) - len(live)
+    rows[:] = live
+    return deleted
+
+
+def _rpc_claim_evaluation_jobs(store: MemoryStore, params: Dict[str, Any]) -> List[Dict]:
+    now = _now()
+    jobs = store.rows("evaluation_jobs")
+    for job in jobs:
+        if job["status"] == "running" and job["leased_until"] <= now and job["attempts"] >= job["max_attempts"]:
+            job.update({"status": "dead", "leased_until": None, "lease_token": None, "updated_at": now,
+                        "last_error": job.get("last_error") or "lease expired"})
+    ready = sorted(
+        (j for j in jobs if (j["status"] == "queued" and j["available_at"] <= now)
+         or (j["status"] == "running" and j["leased_until"] <= now)),
+        key=lambda j: (j["available_at"], j["created_at"])
+    )[:params["p_limit"]]
+    leased_until = (datetime.now(timezone.utc) + timedelta(seconds=params["p_visibility_seconds"])).isoformat()
+    for job in ready:
+        job.update({"status": "running", "attempts": job["attempts"] + 1, "leased_until": leased_until,
+                    "lease_token": str(uuid.uuid4()), "worker_id": params["p_worker_id"], "updated_at": now})
+    return copy.deepcopy(ready)
+
+
+def _rpc_complete_evaluation_job(store: MemoryStore, params: Dict[str, Any]) -> bool:
+    jobs = store.rows("evaluation_jobs")
+    for i, job in enumerate(jobs):
+        if job["id"] == params["p_id"] and job["lease_token"] == params["p_lease_token"]:
+            del jobs[i]
+            return True
+    return False
+
+
+def _rpc_fail_evaluation_job(store: MemoryStore, params: Dict[str, Any]) -> Optional[str]:
+    for job in store.rows("evaluation_jobs"):
+        if job["id"] == params["p_id"] and job["lease_token"] == params["p_lease_token"]:
+            job.update({
+                "status": "dead" if job["attempts"] >= job["max_attempts"] else "queued",
+                "available_at": (datetime.now(timezone.utc) + timedelta(seconds=params["p_retry_delay_seconds"])).isoformat(),
+                "leased_until": None, "lease_token": None, "last_error": params["p_error"], "updated_at": _now()
+            })
+            return job["status"]
+    return None
+
+
+def _rpc_extend_evaluation_job_lease(store: MemoryStore, params: Dict[str, Any]) -> bool:
+    for job in store.rows("evaluation_jobs"):
+        if job["id"] == params["p_id"] and job["lease_token"] == params["p_lease_token"] and job["status"] == "running":
+            job.update({
+                "leased_until": (datetime.now(timezone.utc) + timedelta(seconds=params["p_visibility_seconds"])).isoformat(),
+                "updated_at": _now()
+            })
+            return True
+    return False
+
+
+def _rpc_release_evaluation_job(store: MemoryStore, params: Dict[str, Any]) -> bool:
+    for job in store.rows("evaluation_jobs"):
+        if job["id"] == params["p_id"] and job["lease_token"] == params["p_lease_token"]:
+            job.update({
+                "status": "queued", "attempts": max(job["attempts"] - 1, 0),
+                "available_at": (datetime.now(timezone.utc) + timedelta(seconds=params["p_delay_seconds"])).isoformat(),
+                "leased_until": None, "lease_token": None, "updated_at": _now()
+            })
+            return True
+    return False
+
+
+def _rpc_evaluation_queue_stats(store: MemoryStore, params: Dict[str, Any]) -> Dict[str, Any]:
+    now = _now()
+    jobs = store.rows("evaluation_jobs")
+    ready = [j["available_at"] for j in jobs if j["status"] == "queued" and j["available_at"] <= now]
+    oldest = (datetime.now(timezone.utc) - datetime.fromisoformat(min(ready))).total_seconds() if ready else 0
+    return {
+        "queued": sum(j["status"] == "queued" for j in jobs),
+        "ready": len(ready),
+        "running": sum(j["status"] == "running" for j in jobs),
+        "dead": sum(j["status"] == "dead" for j in jobs),
+        "oldest_ready_age_seconds": oldest,
+    }
+
+
+_RPC_HANDLERS: Dict[str, Callable[[MemoryStore, Dict[str, Any]], Any]] = {
+    "match_signals": _rpc_match_signals,
+    "match_knowledge_base": _rpc_match_knowledge_base,
+    "match_signals_compact": _rpc_match_signals_compact,
+    "match_knowledge_base_compact": _rpc_match_knowledge_base_compact,
+    "set_compact_embeddings": _rpc_set_compact_embeddings,
+    "increment_usage": _rpc_increment_usage,
+    "update_workflow_nodes_batch": _rpc_update_workflow_nodes_batch,
+    "save_workflow_graph": _rpc_save_workflow_graph,
+    "claim_idempotency_key": _rpc_claim_idempotency_key,
+    "mark_idempotency_key_executed": _rpc_mark_idempotency_key_executed,
+    "purge_expired_idempotency_keys": _rpc_purge_expired_idempotency_keys,
+    "claim_evaluation_jobs": _rpc_claim_evaluation_jobs,
+    "complete_evaluation_job": _rpc_complete_evaluation_job,
+    "extend_evaluation_job_lease": _rpc_extend_evaluation_job_lease,
+    "release_evaluation_job": _rpc_release_evaluation_job,
+    "fail_evaluation_job": _rpc_fail_evaluation_job,
+    "evaluation_queue_stats": _rpc_evaluation_queue_stats,
+    "promote_shadow_workflow": _rpc_promote_shadow_workflow,
+    "shadow_decision_stats": _rpc_shadow_decision_stats,
+}
+
+
+class InMemoryClient:
+    """Drop-in replacement for the supabase Client used by PersistenceRepository."""
+
+    def __init__(self, latency_ms: Optional[float] = None):
+        self.store = MemoryStore()
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        if latency_ms is None:
+            latency_ms = float(os.environ.get("MEMORY_DB_LATENCY_MS", "0"))
+        self.latency_ms = latency_ms
+
+    def table(self, table_name: str) -> _QueryBuilder:
+        return _QueryBuilder(self, table_name)
+
+    def from_(self, table_name: str) -> _QueryBuilder:
+        return self.table(table_name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> _RpcBuilder:
+        return _RpcBuilder(self, fn, params or {})
+
+    def record(self, target: str, op: str):
+        with self._stats_lock:
+            self.stats[f"{target}.{op}"] += 1
+            self.stats["total"] += 1
+
+    def simulate_latency(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+    async def simulate_latency_async(self):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000.0)
+
+    @property
+    def query_count(self) -> int:
+        """Number of round trips a networked backend would have made"""
+        return self.stats["total"]
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats.clear()
+
+    def reset(self):
+        """Drops all data and counters"""
+        with self.store.lock:
+            self.store.tables.clear()
+        self.reset_stats()
+
+
+class _AsyncBuilder:
+    """Async view of a query/RPC builder: filters chain as before, execute() is awaited"""
+
+    def __init__(self, builder: Any):
+        self._builder = builder
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._builder else result
+        return chained
+
+    async def execute(self) -> MemoryResponse:
+        self._builder._record()
+        await self._builder._client.simulate_latency_async()
+        return self._builder._run()
+
+
+class AsyncInMemoryClient:
+    """
+    Drop-in replacement for the supabase AsyncClient used by AsyncPersistenceRepository.
+    Shares storage, counters and latency settings with the wrapped InMemoryClient, so the
+    sync and async repositories see the same data.
+    """
+
+    def __init__(self, client: InMemoryClient):
+        self._client = client
+
+    def table(self, table_name: str) -> _AsyncBuilder:
+        return _AsyncBuilder(self._client.table(table_name))
+
+    def from_(self, table_name: str) -> _AsyncBuilder:
+        return self.table(table_name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> _AsyncBuilder:
+        return _AsyncBuilder(self._client.rpc(fn, params))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
@@ -0,0 +1,23 @@
+import json
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def _ndjson_lines(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield (json.dumps(row, default=str) + "\n").encode("utf-8")
+
+
+def ndjson_response(rows: AsyncIterator[Dict[str, Any]], filename: str) -> StreamingResponse:
+    """
+    Streams rows as newline-delimited JSON while they are read, one keyset page at a time,
+    so exports of any size never hold the whole result set in the worker.
+    """
+    return StreamingResponse(
+        _ndjson_lines(rows),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
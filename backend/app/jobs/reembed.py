@@ -0,0 +1,77 @@
+"""
+Backfill for the compact embedding profile: re-embeds rows whose embedding_compact is still NULL.
+
+Usage (from backend/):
+    python -m app.jobs.reembed [--table knowledge_base|raw_signals|all] [--batch 256] [--limit N]
+
+Walks each table by id (keyset), embeds one batch per OpenAI request at the compact profile's
+dimensions and writes it back with one set_compact_embeddings call. Only NULL columns are filled,
+so the job can be stopped and re-run at any time.
+"""
+import argparse
+import os
+from typing import Any, Dict, Optional
+
+from app.core.embedding_profile import get_embedding_profile
+from app.repositories.persistence import PersistenceRepository, get_repository
+from app.services.workflow_inference import generate_embeddings
+
+REEMBED_TABLES = ("knowledge_base", "raw_signals")
+REEMBED_BATCH_SIZE = int(os.environ.get("REEMBED_BATCH_SIZE", "256"))
+
+
+def reembed_table(repo: PersistenceRepository, table: str, batch_size: int = REEMBED_BATCH_SIZE, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Returns {"scanned", "updated", "failed"} for one table"""
+    profile = get_embedding_profile("compact")
+    column = profile["column"]
+    summary = {"scanned": 0, "updated": 0, "failed": 0}
+    last_id = None
+
+    while limit is None or summary["scanned"] < limit:
+        size = batch_size if limit is None else min(batch_size, limit - summary["scanned"])
+        query = repo.db.table(table).select("id, content").is_(column, "null")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(size).execute().data or []
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        summary["scanned"] += len(rows)
+
+        vectors = generate_embeddings([r["content"] or "" for r in rows], profile)
+        # generate_embeddings answers errors with zero vectors; never persist those
+        payload = [
+            {"id": r["id"], "embedding": v}
+            for r, v in zip(rows, vectors or [])
+            if v and any(v)
+        ]
+        summary["failed"] += len(rows) - len(payload)
+        if not payload:
+            continue
+        try:
+            res = repo.db.rpc("set_compact_embeddings", {"p_table": table, "p_rows": payload}).execute()
+            summary["updated"] += res.data or 0
+        except Exception as e:
+            print(f"[DB Error] Re-embed {table} batch ending {last_id}: {e}")
+            summary["failed"] += len(payload)
+
+        print(f"[Reembed] {table}: {summary['scanned']} scanned, {summary['updated']} updated, {summary['failed']} failed", flush=True)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", choices=REEMBED_TABLES + ("all",), default="all")
+    parser.add_argument("--batch", type=int, default=REEMBED_BATCH_SIZE)
+    parser.add_argument("--limit", type=int, default=None, help="Max rows per table (for trial runs)")
+    args = parser.parse_args()
+
+    repo = get_repository()
+    tables = REEMBED_TABLES if args.table == "all" else (args.table,)
+    for table in tables:
+        summary = reembed_table(repo, table, batch_size=args.batch, limit=args.limit)
+        print(f"[Reembed] {table} done: {summary}")
+
+
+if __name__ == "__main__":
+    main()
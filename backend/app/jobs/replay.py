@@ -0,0 +1,64 @@
+"""
+Dry-run replay of a team's historical signals against a workflow version, for tuning the
+Auto-Pilot confidence threshold. Prints the report (threshold curve + per-node counts) as JSON.
+
+Usage (from backend/):
+    python -m app.jobs.replay --team <team_id> [--since 2025-12-01] [--until 2025-12-15]
+        [--workflow <workflow_id>] [--all-nodes] [--labels labels.json] [--concurrency 32] [--out report.json]
+
+labels.json maps signal ids (or source ids such as the Slack ts) to the node that should fire,
+or null where nothing should: {"slack_1734001234.000100": "3", "slack_1734001299.000200": null}
+"""
+import argparse
+import asyncio
+import json
+
+from app.services.replay import REPLAY_CONCURRENCY, REPLAY_PAGE_SIZE, REPLAY_THRESHOLDS, run_replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--team", required=True, help="Team id")
+    parser.add_argument("--since", help="ISO timestamp (inclusive)")
+    parser.add_argument("--until", help="ISO timestamp (exclusive)")
+    parser.add_argument("--workflow", help="Workflow version id (default: the active workflow)")
+    parser.add_argument("--all-nodes", action="store_true", help="Treat every node as Auto-Pilot")
+    parser.add_argument("--no-prefilter", action="store_true", help="Send every signal to the LLM")
+    parser.add_argument("--no-context", action="store_true", help="Skip the knowledge base lookup")
+    parser.add_argument("--labels", help="JSON file of expected node per signal")
+    parser.add_argument("--thresholds", help="Comma-separated thresholds", default=",".join(map(str, REPLAY_THRESHOLDS)))
+    parser.add_argument("--concurrency", type=int, default=REPLAY_CONCURRENCY)
+    parser.add_argument("--page-size", type=int, default=REPLAY_PAGE_SIZE)
+    parser.add_argument("--max-signals", type=int, default=None)
+    parser.add_argument("--out", help="Write the report here instead of stdout")
+    args = parser.parse_args()
+
+    labels = None
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+
+    async def _run():
+        try:
+            return await run_replay(
+                args.team, workflow_id=args.workflow, since=args.since, until=args.until,
+                concurrency=args.concurrency, page_size=args.page_size,
+                thresholds=[float(t) for t in args.thresholds.split(",")], labels=labels,
+                all_nodes=args.all_nodes, use_prefilter=not args.no_prefilter, use_context=not args.no_context,
+                max_signals=args.max_signals
+            )
+        finally:
+            from app.core.database import close_async_supabase_client
+            await close_async_supabase_client()
+
+    report = json.dumps(asyncio.run(_run()), indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report)
+        print(f"[Replay] Report written to {args.out}")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -85,6 +85,16 @@ app.include_router(knowledge.router, prefix="/knowledge", dependencies=[Depends(
 app.include_router(webhooks.router, prefix="/webhooks")
 app.include_router(health.router, prefix="")
 
+@app.on_event("shutdown")
+async def shutdown():
+    from app.core.database import close_async_supabase_client, close_supabase_client
+    from app.services.audit_writer import audit_writer
+    from app.services.trigger_engine import shadow_evaluator
+    await shadow_evaluator.drain(timeout=5)  # Let in-flight shadow decisions reach the DB
+    audit_writer.close()  # Flush buffered audit rows while the DB client is still open
+    close_supabase_client()
+    await close_async_supabase_client()
+
 @app.get("/")
 @limiter.limit("50/minute")
 def root(request: Request):
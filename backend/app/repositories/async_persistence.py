@@ -0,0 +1,174 @@
+import asyncio
+import weakref
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union
+
+from app.core.database import get_async_supabase_client
+from app.repositories.cache import AsyncKeyedLocks
+from app.repositories import persistence
+from app.repositories.persistence import (
+    EXPORT_PAGE_SIZE,
+    KEYSET_LISTINGS,
+    Backoff,
+    IngestProgress,
+    Operation,
+    RepositoryOperations,
+    T,
+    _chunked,
+    keyset_page,
+    knowledge_chunk_spans,
+    knowledge_insert_result,
+    knowledge_rows_with_ids,
+    prepare_signal_row,
+)
+
+
+class AsyncPersistenceRepository(RepositoryOperations):
+    """
+    asyncio twin of PersistenceRepository: the same methods (RepositoryOperations) and return values,
+    awaited on the async Supabase client, so one worker can keep hundreds of DB calls in flight
+    without a thread each. Shares the per-worker workflow/team/idempotency caches with the sync
+    repository. Bound to the event loop it was created on; get one with get_async_repository().
+    """
+
+    def __init__(self, db: Any):
+        super().__init__(db)
+        self._team_locks = AsyncKeyedLocks()
+
+    async def _drive(self, operation: Operation[T]) -> T:
+        """Runs an operation on this event loop; a list of requests is sent concurrently"""
+        response, error = None, None
+        while True:
+            try:
+                request = operation.throw(error) if error is not None else operation.send(response)
+            except StopIteration as done:
+                return done.value
+            response, error = None, None
+            try:
+                if isinstance(request, Backoff):
+                    await asyncio.sleep(request.seconds)
+                elif isinstance(request, list):
+                    response = list(await asyncio.gather(*(r.execute() for r in request)))
+                else:
+                    response = await request.execute()
+            except Exception as e:
+                error = e
+
+    # --- TEAMS ---
+    async def get_or_create_team(self, team_name: str, owner_id: str) -> str:
+        """Ensures a team exists and returns its UUID"""
+        team_id = self.team_cache.get(owner_id)
+        if team_id:
+            return team_id
+
+        async with self._team_locks.hold(owner_id) as waited:
+            return await self._resolve_team(team_name, owner_id, waited)
+
+    # --- RAW SIGNALS ---
+    async def ingest_signals(
+        self,
+        team_id: str,
+        signals: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        collect_ids: bool = False,
+        on_chunk: Optional[Callable[[List[str]], Any]] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Streams raw signals in bounded chunks (see PersistenceRepository.ingest_signals).
+        Also accepts an async iterable; on_chunk may be a coroutine function.
+        """
+        chunk_size = chunk_size or persistence.SIGNAL_INGEST_CHUNK_SIZE
+        concurrency = max(1, concurrency or persistence.SIGNAL_INGEST_CONCURRENCY)
+        want_ids = collect_ids or on_chunk is not None
+        progress = IngestProgress(collect_ids)
+
+        async def _drain(window: List[List[Dict[str, Any]]]):
+            results = await asyncio.gather(*(self._upsert_signal_chunk(team_id, rows, want_ids) for rows in window))
+            for chunk_result in results:
+                chunk_ids = progress.add(chunk_result)
+                if on_chunk is not None:
+                    outcome = on_chunk(chunk_ids)
+                    if asyncio.iscoroutine(outcome):
+                        await outcome
+
+        try:
+            window: List[List[Dict[str, Any]]] = []
+            async for batch in _achunked(signals, chunk_size):
+                window.append([prepare_signal_row(team_id, s) for s in batch])
+                if len(window) >= concurrency:
+                    await _drain(window)
+                    window = []
+            if window:
+                await _drain(window)
+        except Exception as e:
+            print(f"[DB Error] Ingest Signals (after {progress.summary['chunks']} chunks): {e}")
+            raise e
+
+        return progress.result()
+
+    # --- KEYSET LISTINGS ---
+    async def iter_listing(self, listing: str, team_id: str, page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[Dict]:
+        """Async generator over every row of a listing, one page in memory at a time"""
+        sort_column = KEYSET_LISTINGS[listing][1]
+        cursor = None
+        while True:
+            res = await self._listing_query(listing, team_id, page_size, cursor).execute()
+            page = keyset_page(res.data or [], sort_column, page_size)
+            for item in page["items"]:
+                yield item
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+
+    # --- KNOWLEDGE BASE ---
+    async def bulk_insert_knowledge(
+        self,
+        rows: List[Dict],
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Parallel, retried knowledge_base writes (see PersistenceRepository.bulk_insert_knowledge)"""
+        if not rows:
+            return knowledge_insert_result([], [])
+        semaphore = asyncio.Semaphore(max(1, concurrency or persistence.KNOWLEDGE_INSERT_CONCURRENCY))
+
+        rows = knowledge_rows_with_ids(rows)
+        spans = knowledge_chunk_spans(rows, chunk_size or persistence.KNOWLEDGE_INSERT_CHUNK_SIZE)
+
+        async def _bounded(start: int, end: int):
+            async with semaphore:
+                return await self._insert_knowledge_chunk(rows[start:end])
+
+        outcomes = await asyncio.gather(*(_bounded(start, end) for start, end in spans))
+        return knowledge_insert_result(spans, outcomes)
+
+
+async def _achunked(items: Union[Iterable[Any], AsyncIterable[Any]], size: int):
+    """Async generator of lists of up to `size` items from a sync or async iterable"""
+    if not hasattr(items, "__aiter__"):
+        for batch in _chunked(items, size):
+            yield batch
+        return
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- SHARED INSTANCE (one per event loop) ---
+_repositories: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncPersistenceRepository]" = weakref.WeakKeyDictionary()
+
+async def get_async_repository() -> AsyncPersistenceRepository:
+    """
+    Returns the async repository for the running event loop.
+    Use as a FastAPI dependency: `repo: AsyncPersistenceRepository = Depends(get_async_repository)`.
+    """
+    loop = asyncio.get_running_loop()
+    repo = _repositories.get(loop)
+    if repo is None:
+        repo = _repositories.setdefault(loop, AsyncPersistenceRepository(await get_async_supabase_client()))
+    return repo
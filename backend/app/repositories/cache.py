@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with optional per-entry TTL and hit/miss counters"""
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None, record: bool = True) -> Any:
+        """Looks up a key; record=False skips the hit/miss counters (for re-checks)"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += record
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += record
+                return default
+            self._data.move_to_end(key)
+            self.hits += record
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def pop(self, key: Hashable) -> bool:
+        with self._lock:
+            if self._data.pop(key, _MISSING) is _MISSING:
+                return False
+            self.invalidations += 1
+            return True
+
+    def items(self):
+        """Snapshot of live (key, value) pairs, without touching LRU order or counters"""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (v, exp) in self._data.items() if exp is None or exp > now]
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class KeyedLocks:
+    """Per-key locks that are discarded once no thread holds or waits on them"""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: Hashable) -> Iterator[bool]:
+        """Yields True if another thread held the key when we arrived (i.e. we waited on it)"""
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            contended = entry[1] > 1
+        try:
+            with entry[0]:
+                yield contended
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class AsyncKeyedLocks:
+    """asyncio counterpart of KeyedLocks, for one event loop"""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, List[Any]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[bool]:
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        contended = entry[1] > 1
+        try:
+            async with entry[0]:
+                yield contended
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+
+class TeamCache:
+    """
+    owner_id -> team_id cache for get_or_create_team.
+    Concurrent first requests for one owner are collapsed into a single lookup/insert.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._cache = LRUCache(maxsize=maxsize)
+        self.locks = KeyedLocks()
+        self._lock = threading.Lock()
+        self.creates = 0
+        self.coalesced = 0
+
+    def get(self, owner_id: str, record: bool = True) -> Optional[str]:
+        return self._cache.get(owner_id, record=record)
+
+    def set(self, owner_id: str, team_id: str):
+        self._cache.set(owner_id, team_id)
+
+    def record_create(self):
+        with self._lock:
+            self.creates += 1
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "creates": self.creates, "coalesced": self.coalesced}
+
+
+def graph_version(graph: Dict[str, Any]) -> str:
+    """Content hash of a workflow graph; changes whenever any node, edge or flag changes"""
+    canonical = json.dumps(
+        [graph.get("workflow_id"), graph.get("title"), graph.get("nodes"), graph.get("edges")],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+class WorkflowCache:
+    """
+    Per-team cache of the assembled active workflow graph.
+    Entries carry (workflow_id, version); write paths invalidate them, the TTL
+    bounds staleness from writes made by other workers.
+    Cached graphs are shared between callers and must be treated as read-only.
+    Listeners registered with add_listener() hear about every write as (team_id, workflow_id);
+    either may be None, both None means "anything may have changed".
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 30.0):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._listeners: List[Callable[[Optional[str], Optional[str]], None]] = []
+
+    def add_listener(self, listener: Callable[[Optional[str], Optional[str]], None]):
+        self._listeners.append(listener)
+
+    def _notify(self, team_id: Optional[str], workflow_id: Optional[str]):
+        for listener in self._listeners:
+            try:
+                listener(team_id, workflow_id)
+            except Exception as e:
+                print(f"[Cache] Workflow listener error: {e}")
+
+    @property
+    def generation(self) -> int:
+        """Read before loading from the DB and pass to put(), so a load racing a write is dropped"""
+        return self._generation
+
+    def get(self, team_id: str, default: Any = _MISSING) -> Any:
+        """Returns the cached graph, None for 'team has no active workflow', or `default` on a miss"""
+        return self._cache.get(team_id, default)
+
+    def is_miss(self, value: Any) -> bool:
+        return value is _MISSING
+
+    def put(self, team_id: str, graph: Optional[Dict[str, Any]], generation: int):
+        if graph is not None:
+            graph["version"] = graph_version(graph)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._cache.set(team_id, graph)
+
+    def _bump(self):
+        with self._lock:
+            self._generation += 1
+
+    def invalidate_team(self, team_id: str):
+        self._bump()
+        self._cache.pop(team_id)
+        self._notify(team_id, None)
+
+    def invalidate_workflow(self, workflow_id: str):
+        self._bump()
+        for team_id, graph in self._cache.items():
+            if graph and graph.get("workflow_id") == workflow_id:
+                self._cache.pop(team_id)
+        self._notify(None, workflow_id)
+
+    def patch_nodes(self, step_id: str, fields: Dict[str, Any], workflow_id: Optional[str] = None):
+        """
+        Applies a node write to cached graphs instead of dropping them (copy-on-write,
+        so graphs already handed out are not mutated). Scoped to workflow_id when given.
+        """
+        self._bump()
+        with self._lock:
+            for team_id, graph in self._cache.items():
+                if not graph or (workflow_id and graph.get("workflow_id") != workflow_id):
+                    continue
+                if not any(n.get("id") == step_id for n in graph.get("nodes", [])):
+                    continue
+                patched = {**graph, "nodes": [
+                    {**n, **fields} if n.get("id") == step_id else n for n in graph["nodes"]
+                ]}
+                patched["version"] = graph_version(patched)
+                self._cache.set(team_id, patched)
+        self._notify(None, workflow_id)
+
+    def clear(self):
+        self._bump()
+        self._cache.clear()
+        self._notify(None, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
@@ -1,121 +1,453 @@
+import base64
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
-from uuid import UUID
+from itertools import islice
+from typing import Callable, Deque, Generator, Iterable, Iterator, List, Dict, Any, Optional, Tuple, TypeVar
+from uuid import UUID, uuid4
 from app.core.database import get_supabase_client
+from app.core.embedding_profile import embedding_fields, get_embedding_profile
+from app.repositories.cache import LRUCache, TeamCache, WorkflowCache
 
-class PersistenceRepository:
-    def __init__(self):
-        self.db = get_supabase_client()
-        if not self.db:
+T = TypeVar("T")
+
+# Workflow row with its nodes and edges embedded (PostgREST resource embedding via
+# the workflow_id foreign keys), so a whole graph is fetched in one round trip.
+WORKFLOW_GRAPH_SELECT = "*, workflow_nodes(*), workflow_edges(*)"
+
+# Node columns the editor may change through update_workflow_nodes_batch
+BATCH_NODE_FIELDS = ("label", "description", "auto_run_enabled", "metadata")
+
+# Per-worker cache of active workflow graphs (hot path of every evaluate_signal)
+workflow_cache = WorkflowCache(
+    maxsize=int(os.environ.get("WORKFLOW_CACHE_SIZE", "512")),
+    ttl=float(os.environ.get("WORKFLOW_CACHE_TTL", "30")),
+)
+# Per-worker cache of shadow (candidate) workflow graphs, None for teams without one. Follows every
+# write to workflow_cache, so node edits and saves drop the candidate graph as well.
+shadow_workflow_cache = WorkflowCache(
+    maxsize=int(os.environ.get("WORKFLOW_CACHE_SIZE", "512")),
+    ttl=float(os.environ.get("WORKFLOW_CACHE_TTL", "30")),
+)
+
+def _follow_workflow_writes(team_id: Optional[str], workflow_id: Optional[str]):
+    if team_id is None and workflow_id is None:
+        shadow_workflow_cache.clear()
+    if team_id is not None:
+        shadow_workflow_cache.invalidate_team(team_id)
+    if workflow_id is not None:
+        shadow_workflow_cache.invalidate_workflow(workflow_id)
+
+workflow_cache.add_listener(_follow_workflow_writes)
+# owner_id -> team_id (teams never change owner, so entries only leave by LRU eviction)
+team_cache = TeamCache(maxsize=int(os.environ.get("TEAM_CACHE_SIZE", "4096")))
+# Streaming signal import: rows per upsert request, and requests in flight at once
+SIGNAL_INGEST_CHUNK_SIZE = int(os.environ.get("SIGNAL_INGEST_CHUNK_SIZE", "500"))
+SIGNAL_INGEST_CONCURRENCY = int(os.environ.get("SIGNAL_INGEST_CONCURRENCY", "4"))
+# Knowledge-base backfills: rows per request, parallel requests, retries per chunk (exponential backoff, seconds)
+KNOWLEDGE_INSERT_CHUNK_SIZE = int(os.environ.get("KNOWLEDGE_INSERT_CHUNK_SIZE", "100"))
+KNOWLEDGE_INSERT_CONCURRENCY = int(os.environ.get("KNOWLEDGE_INSERT_CONCURRENCY", "4"))
+KNOWLEDGE_INSERT_RETRIES = int(os.environ.get("KNOWLEDGE_INSERT_RETRIES", "3"))
+KNOWLEDGE_INSERT_BACKOFF = float(os.environ.get("KNOWLEDGE_INSERT_BACKOFF", "0.5"))
+# (team_id, idempotency_key) pairs this worker has already claimed
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+idempotency_cache = LRUCache(maxsize=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000")), ttl=IDEMPOTENCY_TTL_SECONDS)
+
+_TRANSIENT_MARKERS = ("timeout", "timed out", "connection", "temporarily", "429", "502", "503", "504")
+
+def _is_transient_error(error: Exception) -> bool:
+    """Network/pool errors and 429/5xx gateway responses are worth retrying; constraint errors are not"""
+    name = type(error).__name__
+    if any(part in name for part in ("Timeout", "Connect", "Transport", "RemoteProtocol", "PoolTimeout")):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+def _chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yields lists of up to `size` items without materializing the iterable"""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def node_auto_run_enabled(node: Dict[str, Any]) -> bool:
+    """Per-node Auto-Run flag of an assembled graph node (column, or metadata.auto_pilot for backward compatibility)"""
+    return bool(node.get("auto_run_enabled") or (node.get("data") or {}).get("auto_pilot"))
+
+# Keyset-paginated listings: name -> (table, sort column, selected columns).
+# Pages are ordered by (sort column, id) descending and resumed from an opaque cursor.
+KEYSET_LISTINGS: Dict[str, Tuple[str, str, str]] = {
+    "knowledge": ("knowledge_base", "created_at", "id, content, metadata, created_at"),
+    "workflows": ("workflows", "created_at", "id, title, created_at, is_active"),
+    "inference_runs": ("inference_runs", "started_at", "id, trigger_type, status, model_config, started_at, completed_at"),
+    "signals": ("raw_signals", "occurred_at", "id, source, external_id, content, metadata, occurred_at"),
+    "shadow_decisions": ("shadow_decisions", "created_at", "*"),
+}
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "200"))
+EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "500"))
+
+def encode_cursor(sort_value: Any, row_id: str) -> str:
+    raw = json.dumps([sort_value, row_id], default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (sort timestamp, row id) of a cursor, both re-serialized from their parsed values: the cursor comes
+    from the client and ends up in a PostgREST filter string. Raises ValueError (a 400) for anything
+    other than an ISO timestamp and a UUID.
+    """
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(sort_value).isoformat(), str(UUID(row_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def keyset_query(query: Any, sort_column: str, limit: int, cursor: Optional[str]) -> Any:
+    """Applies (sort_column, id) DESC ordering, the cursor predicate and limit+1 (to detect a next page)"""
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.or_(
+            f'{sort_column}.lt."{sort_value}",'
+            f'and({sort_column}.eq."{sort_value}",id.lt."{row_id}")'
+        )
+    return query.order(sort_column, desc=True).order("id", desc=True).limit(limit + 1)
+
+def keyset_page(rows: List[Dict], sort_column: str, limit: int) -> Dict[str, Any]:
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and items:
+        next_cursor = encode_cursor(items[-1][sort_column], items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}
+
+def signals_range_columns(with_embedding: bool) -> str:
+    """Columns of a signals page, plus the active profile's embedding column when requested"""
+    columns = KEYSET_LISTINGS["signals"][2]
+    return f"{columns}, {get_embedding_profile()['column']}" if with_embedding else columns
+
+def signals_range_query(query: Any, since: Optional[str], until: Optional[str]) -> Any:
+    """occurred_at in [since, until); either bound may be open"""
+    if since:
+        query = query.gte("occurred_at", since)
+    if until:
+        query = query.lt("occurred_at", until)
+    return query
+
+def clamp_page_size(limit: Optional[int], default: int) -> int:
+    return max(1, min(limit or default, MAX_PAGE_SIZE))
+
+def assemble_workflow_graph(workflow: Dict, node_rows: List[Dict], edge_rows: List[Dict]) -> Dict[str, Any]:
+    """Builds the React Flow graph served to the editor and the trigger engine from DB rows"""
+    nodes = []
+    for row in node_rows:
+        nodes.append({
+            "id": row["step_id"],
+            "type": row["type"],
+            "auto_run_enabled": bool(row.get("auto_run_enabled")),
+            "data": {
+                "label": row["label"],
+                "description": row["description"],
+                "actor": row["actor"],
+                **(row["metadata"] or {})
+            }
+        })
+
+    edges = []
+    for row in edge_rows:
+        edges.append({
+            "source": row["source_step_id"],
+            "target": row["target_step_id"],
+            "label": row["label"]
+        })
+        
+    return {
+        "workflow_id": workflow["id"],
+        "team_id": workflow["team_id"],
+        "title": workflow["title"],
+        "created_at": workflow["created_at"],
+        "is_active": workflow["is_active"],
+        "nodes": nodes,
+        "edges": edges
+    }
+
+def prepare_signal_row(team_id: str, s: Dict[str, Any]) -> Dict[str, Any]:
+    """raw_signals row for an incoming signal"""
+    return {
+        "team_id": team_id,
+        "source": s.get("source", "manual"),
+        "external_id": s.get("id"), # Slack ts or Jira id
+        "actor": s.get("actor", "unknown"),
+        "content": s.get("text", ""),
+        "metadata": s.get("metadata", {}),
+        **embedding_fields(s.get("embedding")), # Support for Vector Search (active embedding profile)
+        "occurred_at": s.get("timestamp") or datetime.now(timezone.utc).isoformat()
+    }
+
+def batch_node_payload(nodes_data: List[Dict]) -> List[Optional[Dict[str, Any]]]:
+    """update_workflow_nodes_batch elements, aligned with nodes_data (None where nothing to write)"""
+    payload = []
+    for node in nodes_data:
+        fields = {f: node[f] for f in BATCH_NODE_FIELDS if f in node}
+        # Assuming FE sends full metadata state including position, so metadata is overwritten, not merged.
+        payload.append({"id": node["id"], **fields} if fields else None)
+    return payload
+
+def batch_node_results(nodes_data: List[Dict], payload: List[Optional[Dict]], rows: List[Dict]) -> List[Dict[str, Any]]:
+    # RPC rows come back in input order, one per element sent
+    rows_iter = iter(rows)
+    return [
+        {"id": node["id"], "updated": bool(next(rows_iter)["updated"]) if p else False}
+        for node, p in zip(nodes_data, payload)
+    ]
+
+def signal_chunk_ids(rows: List[Dict], new_rows: List[Dict], existing_rows: List[Dict]) -> List[str]:
+    """Ids for a chunk of prepared signal rows, in input order and de-duplicated"""
+    by_key = {(r["source"], r["external_id"]): r["id"] for r in existing_rows}
+    by_key.update({(r["source"], r["external_id"]): r["id"] for r in new_rows if r.get("external_id") is not None})
+    # Rows without an external_id are always new and have no natural key
+    unkeyed = iter(r["id"] for r in new_rows if r.get("external_id") is None)
+    chunk_ids, seen = [], set()
+    for r in rows:
+        row_id = next(unkeyed, None) if r["external_id"] is None else by_key.get((r["source"], r["external_id"]))
+        if row_id and row_id not in seen:
+            seen.add(row_id)
+            chunk_ids.append(row_id)
+    return chunk_ids
+
+def missing_signal_keys(rows: List[Dict], new_rows: List[Dict]) -> Dict[str, List[str]]:
+    """source -> external_ids of chunk rows that already existed (not returned by the insert)"""
+    inserted = {(r["source"], r["external_id"]) for r in new_rows}
+    missing: Dict[str, List[str]] = {}
+    for r in rows:
+        if r["external_id"] is not None and (r["source"], r["external_id"]) not in inserted:
+            missing.setdefault(r["source"], []).append(r["external_id"])
+    return missing
+
+def knowledge_rows_with_ids(rows: List[Dict]) -> List[Dict]:
+    """Rows for bulk_insert_knowledge: rows without an "id" are copied with a new one, the caller's dicts are left alone"""
+    return [row if "id" in row else {**row, "id": str(uuid4())} for row in rows]
+
+def knowledge_chunk_spans(rows: List[Dict], chunk_size: int) -> List[Tuple[int, int]]:
+    """Half-open index ranges of the chunks bulk_insert_knowledge sends"""
+    return [(i, min(i + chunk_size, len(rows))) for i in range(0, len(rows), chunk_size)]
+
+def knowledge_insert_result(spans: List[Tuple[int, int]], outcomes: List[Tuple[int, Optional[Exception]]]) -> Dict[str, Any]:
+    """bulk_insert_knowledge summary from each chunk's (inserted, error), adjacent committed ranges merged"""
+    result: Dict[str, Any] = {"inserted": 0, "committed": [], "failed": []}
+    for (start, end), (inserted, error) in zip(spans, outcomes):
+        if error is None:
+            result["inserted"] += inserted
+            if result["committed"] and result["committed"][-1][1] == start:
+                result["committed"][-1][1] = end
+            else:
+                result["committed"].append([start, end])
+        else:
+            result["failed"].append({"start": start, "end": end, "error": str(error)})
+            print(f"[DB Error] Bulk KB rows {start}-{end}: {error}")
+    return result
+
+class IngestProgress:
+    """Running totals of an ingest_signals call"""
+
+    def __init__(self, collect_ids: bool):
+        self.summary: Dict[str, Any] = {"inserted": 0, "duplicates": 0, "chunks": 0}
+        self.ids: Optional[List[str]] = [] if collect_ids else None
+
+    def add(self, chunk_result: Tuple[int, int, List[str]]) -> List[str]:
+        """Counts one chunk's (inserted, duplicates, ids); returns its ids"""
+        inserted, duplicates, chunk_ids = chunk_result
+        self.summary["inserted"] += inserted
+        self.summary["duplicates"] += duplicates
+        self.summary["chunks"] += 1
+        if self.ids is not None:
+            self.ids.extend(chunk_ids)
+        return chunk_ids
+
+    def result(self) -> Dict[str, Any]:
+        return {**self.summary, "ids": self.ids} if self.ids is not None else self.summary
+
+
+class Backoff:
+    """Yielded by a repository operation to wait before its next request (retries)"""
+    __slots__ = ("seconds",)
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+# A repository operation is a generator that yields PostgREST requests (query/RPC builders, not yet
+# executed), lists of independent requests or a Backoff, and is sent each response in turn; an error
+# raised by a request is thrown back in at the yield. Its return value is the method's result.
+Operation = Generator[Any, Any, T]
+
+class db_operation:
+    """
+    Marks a RepositoryOperations method written as an Operation. Accessed on a repository it becomes
+    a plain method run by that repository's _drive(): blocking on PersistenceRepository, a coroutine
+    on AsyncPersistenceRepository.
+    """
+
+    def __init__(self, fn: Callable[..., Operation]):
+        self.fn = fn
+        functools.update_wrapper(self, fn)
+
+    def __get__(self, repo: Any, owner: Any = None) -> Any:
+        if repo is None:
+            return self
+        fn = self.fn
+
+        @functools.wraps(fn)
+        def bound(*args: Any, **kwargs: Any) -> Any:
+            return repo._drive(fn(repo, *args, **kwargs))
+        return bound
+
+
+class RepositoryOperations:
+    """
+    Queries, caching, result shaping and error handling shared by PersistenceRepository and
+    AsyncPersistenceRepository. Subclasses only provide _drive() (how requests are executed) and the
+    few methods whose concurrency differs (team locks, chunked ingest/bulk inserts, listing iterators).
+    Plain generator helpers (no @db_operation) are composed with `yield from`.
+    """
+
+    def __init__(self, db: Any):
+        if not db:
             raise Exception("Database connection not initialized. Check SUPABASE_URL and SUPABASE_SERVICE_KEY.")
+        self.db = db
+        self.workflow_cache = workflow_cache
+        self.shadow_workflow_cache = shadow_workflow_cache
+        self.team_cache = team_cache
+        self.idempotency_cache = idempotency_cache
 
     # --- TEAMS ---
-    def get_or_create_team(self, team_name: str, owner_id: str) -> str:
-        """Ensures a team exists and returns its UUID"""
+    @db_operation
+    def _resolve_team(self, team_name: str, owner_id: str, waited: bool) -> Operation[str]:
+        """get_or_create_team once the owner's lock is held"""
+        team_id = self.team_cache.get(owner_id, record=False)
+        if team_id:
+            if waited:
+                self.team_cache.record_coalesced()
+            return team_id
+
         # Check existing
-        res = self.db.table("teams").select("id").eq("owner_id", owner_id).execute()
+        res = yield self.db.table("teams").select("id").eq("owner_id", owner_id)
         if res.data:
-            return res.data[0]["id"]
-        
-        # Create new
-        data = {
-            "name": team_name,
-            "owner_id": owner_id,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        res = self.db.table("teams").insert(data).execute()
-        return res.data[0]["id"]
+            team_id = res.data[0]["id"]
+        else:
+            # Create new
+            data = {
+                "name": team_name,
+                "owner_id": owner_id,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+            res = yield self.db.table("teams").insert(data)
+            team_id = res.data[0]["id"]
+            self.team_cache.record_create()
+
+        self.team_cache.set(owner_id, team_id)
+        return team_id
 
-    def get_team_auto_pilot_status(self, team_id: str) -> bool:
+    @db_operation
+    def get_team_auto_pilot_status(self, team_id: str) -> Operation[bool]:
         """Check if Auto-Pilot is globally enabled for a team"""
         try:
-            res = self.db.table("teams").select("auto_pilot_enabled").eq("id", team_id).single().execute()
+            res = yield self.db.table("teams").select("auto_pilot_enabled").eq("id", team_id).single()
             return res.data.get("auto_pilot_enabled", True) if res.data else True
         except Exception as e:
             print(f"[DB Error] Get Auto-Pilot Status: {e}")
             return True  # Fail-open for safety (allow execution if check fails)
 
-    def set_team_auto_pilot_status(self, team_id: str, enabled: bool) -> bool:
+    @db_operation
+    def set_team_auto_pilot_status(self, team_id: str, enabled: bool) -> Operation[bool]:
         """Toggle global Auto-Pilot kill switch for a team"""
         try:
-            self.db.table("teams").update({"auto_pilot_enabled": enabled}).eq("id", team_id).execute()
+            yield self.db.table("teams").update({"auto_pilot_enabled": enabled}).eq("id", team_id)
             return True
         except Exception as e:
             print(f"[DB Error] Set Auto-Pilot Status: {e}")
             return False
 
-    def get_node_auto_run_status(self, node_id: str) -> bool:
-        """Check if a specific node has Auto-Run enabled"""
+    @db_operation
+    def get_node_auto_run_status(self, workflow_id: str, node_id: str) -> Operation[bool]:
+        """Check if a specific node of a workflow has Auto-Run enabled"""
         try:
-            res = self.db.table("workflow_nodes").select("auto_run_enabled, metadata").eq("step_id", node_id).single().execute()
-            if not res.data:
+            res = yield self.db.table("workflow_nodes").select("auto_run_enabled, metadata")\
+                .eq("workflow_id", workflow_id)\
+                .eq("step_id", node_id)\
+                .maybe_single()
+            if not res or not res.data:
                 return False
             # Check both the column and metadata.auto_pilot for backward compatibility
-            return res.data.get("auto_run_enabled", False) or res.data.get("metadata", {}).get("auto_pilot", False)
+            return res.data.get("auto_run_enabled", False) or (res.data.get("metadata") or {}).get("auto_pilot", False)
         except Exception as e:
             print(f"[DB Error] Get Node Auto-Run: {e}")
             return False
 
-    def set_node_auto_run_status(self, node_id: str, enabled: bool) -> bool:
-        """Toggle Auto-Run for a specific workflow node"""
+    @db_operation
+    def set_node_auto_run_status(self, workflow_id: str, node_id: str, enabled: bool) -> Operation[bool]:
+        """Toggle Auto-Run for a specific workflow node. Returns False if the node does not exist."""
         try:
-            self.db.table("workflow_nodes").update({"auto_run_enabled": enabled}).eq("step_id", node_id).execute()
+            res = yield self.db.table("workflow_nodes").update({"auto_run_enabled": enabled})\
+                .eq("workflow_id", workflow_id)\
+                .eq("step_id", node_id)
+            if not res.data:
+                return False
+            self.workflow_cache.patch_nodes(node_id, {"auto_run_enabled": enabled}, workflow_id=workflow_id)
             return True
         except Exception as e:
             print(f"[DB Error] Set Node Auto-Run: {e}")
             return False
 
     # --- INTEGRATIONS ---
-    def get_team_integrations(self, team_id: str) -> List[Dict]:
+    @db_operation
+    def get_team_integrations(self, team_id: str) -> Operation[List[Dict]]:
         """Fetch all configured integrations (Slack channels, Jira projects) for a team"""
         try:
-            res = self.db.table("channel_configs").select("*").eq("team_id", team_id).execute()
+            res = yield self.db.table("channel_configs").select("*").eq("team_id", team_id)
             return res.data
         except Exception as e:
             print(f"[DB Error] Get Integrations: {e}")
             return []
 
     # --- RAW SIGNALS ---
-    def ingest_signals(self, team_id: str, signals: List[Dict[str, Any]]) -> List[str]:
+    @db_operation
+    def _upsert_signal_chunk(self, team_id: str, rows: List[Dict[str, Any]], want_ids: bool) -> Operation[Tuple[int, int, List[str]]]:
         """
-        Batch insert raw signals.
-        Returns list of inserted Signal IDs.
+        One INSERT ... ON CONFLICT DO NOTHING; only new rows come back.
+        Ids of pre-existing rows are looked up (one query per source) only when asked for.
         """
-        if not signals:
-            return []
+        res = yield self.db.table("raw_signals").upsert(
+            rows, on_conflict="team_id,source,external_id", ignore_duplicates=True
+        )
+        new_rows = res.data or []
+        duplicates = len(rows) - len(new_rows)
+        if not want_ids:
+            return len(new_rows), duplicates, []
 
-        prepared_rows = []
-        for s in signals:
-            prepared_rows.append({
-                "team_id": team_id,
-                "source": s.get("source", "manual"),
-                "external_id": s.get("id"), # Slack ts or Jira id
-                "actor": s.get("actor", "unknown"),
-                "content": s.get("text", ""),
-                "metadata": s.get("metadata", {}),
-                "embedding": s.get("embedding"), # Support for Vector Search
-                "occurred_at": s.get("timestamp") or datetime.now(timezone.utc).isoformat()
-            })
-
-        # Upsert to handle duplicates safely
-        try:
-            # We use upsert. If we want to detect strictly if it's new, we'd need 'ignoreDuplicates' or SQL insert.
-            # But the requirement calls for checking idempotency at the trigger level too.
-            # So upsert is fine for the data lake.
-            res = self.db.table("raw_signals").upsert(prepared_rows, on_conflict="team_id,source,external_id").execute()
-            return [row["id"] for row in res.data]
-        except Exception as e:
-            print(f"[DB Error] Ingest Signals: {e}")
-            raise e
+        lookups = [
+            self.db.table("raw_signals").select("id, source, external_id")
+                .eq("team_id", team_id).eq("source", source).in_("external_id", external_ids)
+            for source, external_ids in missing_signal_keys(rows, new_rows).items()
+        ]
+        responses = (yield lookups) if lookups else []
+        existing_rows = [r for res in responses for r in (res.data or [])]
+        return len(new_rows), duplicates, signal_chunk_ids(rows, new_rows, existing_rows)
 
-    def get_signal_by_id(self, signal_id: str) -> Optional[Dict]:
+    @db_operation
+    def get_signal_by_id(self, signal_id: str) -> Operation[Optional[Dict]]:
         """Fetch a specific signal by its UUID or external ID"""
         try:
             # Try by DB ID first
-            res = self.db.table("raw_signals").select("*").eq("id", signal_id).maybe_single().execute()
+            res = yield self.db.table("raw_signals").select("*").eq("id", signal_id).maybe_single()
             if not res.data:
                 # Try by external ID (imperfect if multiples, but fallback)
-                res = self.db.table("raw_signals").select("*").eq("external_id", signal_id).limit(1).execute()
+                res = yield self.db.table("raw_signals").select("*").eq("external_id", signal_id).limit(1)
                 if not res.data: return None
                 return res.data[0]
             return res.data
@@ -123,321 +455,579 @@ class PersistenceRepository:
             print(f"[DB Error] Get Signal: {e}")
             return None
 
-    def check_idempotency_key(self, team_id: str, idempotency_key: str) -> bool:
+    @db_operation
+    def claim_idempotency_key(self, team_id: str, idempotency_key: str, ttl_seconds: Optional[int] = None) -> Operation[bool]:
         """
-        Checks if a specific idempotency key (hash) has already been processed for Auto-Pilot.
-        Returns True if duplicate exists.
+        Atomically claims an idempotency key (hash) for Auto-Pilot before evaluation starts.
+        Returns True if this caller claimed it, False if it is a duplicate.
+        A per-worker LRU of recently claimed keys rejects Slack retries without a round trip.
         """
+        ttl_seconds = ttl_seconds or IDEMPOTENCY_TTL_SECONDS
+        cache_key = (team_id, idempotency_key)
+        if self.idempotency_cache.get(cache_key):
+            return False
+
         try:
-            # We look for a successful or processing run with this key in metadata
-            # or we create a dedicated idempotency table.
-            # For simplicity, we query 'inference_runs' model_config->idempotency_key
-            # Note: JSON filtering in Supabase: model_config->>'idempotency_key'
-            
-            res = self.db.table("inference_runs").select("id")\
-                .eq("team_id", team_id)\
-                .eq("trigger_type", "auto_pilot_evaluation")\
-                .eq("model_config->>idempotency_key", idempotency_key)\
-                .limit(1).execute()
-                
-            return len(res.data) > 0
+            res = yield self.db.rpc("claim_idempotency_key", {
+                "p_team_id": team_id,
+                "p_key": idempotency_key,
+                "p_ttl_seconds": ttl_seconds
+            })
+            claimed = bool(res.data)
         except Exception as e:
-            print(f"[DB Error] Idempotency Check: {e}")
-            return False
+            print(f"[DB Error] Idempotency Claim: {e}")
+            return True  # Fail-open: evaluate rather than drop the signal
+
+        self.idempotency_cache.set(cache_key, True, ttl=ttl_seconds)
+        return claimed
 
-    def search_signals(self, team_id: str, vector: List[float], limit: int = 5, threshold: float = 0.7) -> List[Dict]:
+    @db_operation
+    def idempotency_key_executed(self, team_id: str, idempotency_key: str) -> Operation[bool]:
+        """True if an earlier attempt already reached execution for this key (see mark_idempotency_key_executed)"""
+        try:
+            res = yield self.db.table("idempotency_keys").select("executed_at")\
+                .eq("team_id", team_id).eq("key", idempotency_key).limit(1)
+            return bool(res.data and res.data[0].get("executed_at"))
+        except Exception as e:
+            print(f"[DB Error] Idempotency Lookup: {e}")
+            return False  # The execution mark still guards the automation
+
+    @db_operation
+    def mark_idempotency_key_executed(self, team_id: str, idempotency_key: str, ttl_seconds: Optional[int] = None) -> Operation[bool]:
+        """
+        Atomically marks the key as executed right before its automation runs.
+        Returns True if this caller set the mark, False if an earlier attempt (or another worker
+        holding the same job after a lost lease) already did and the automation must not run again.
+        """
+        try:
+            res = yield self.db.rpc("mark_idempotency_key_executed", {
+                "p_team_id": team_id,
+                "p_key": idempotency_key,
+                "p_ttl_seconds": ttl_seconds or IDEMPOTENCY_TTL_SECONDS
+            })
+            return bool(res.data)
+        except Exception as e:
+            print(f"[DB Error] Idempotency Execution Mark: {e}")
+            return True  # Fail-open, as the claim does
+
+    @db_operation
+    def search_signals(self, team_id: str, vector: List[float], limit: int = 5, threshold: float = 0.7) -> Operation[List[Dict]]:
         """
         RAG: Search for similar signals using Vector Similarity.
-        Requires 'match_signals' DB function.
+        Requires the active embedding profile's match_signals[_compact] DB function.
         """
         try:
-            res = self.db.rpc("match_signals", {
+            res = yield self.db.rpc(get_embedding_profile()["signals_rpc"], {
                 "query_embedding": vector,
                 "match_threshold": threshold,
                 "match_count": limit,
                 "filter_team_id": team_id
-            }).execute()
+            })
             return res.data
         except Exception as e:
             print(f"[DB Error] Vector Search: {e}")
             return []
 
+    # --- USAGE ---
+    @db_operation
+    def increment_usage(self, team_id: str) -> Operation[None]:
+        """Counts one executed automation against the team's plan"""
+        yield self.db.rpc("increment_usage", {"team_id_input": team_id})
+
     # --- INFERENCE RUNS ---
-    def create_inference_run(self, team_id: str, trigger_type: str, config: Dict = {}) -> str:
+    @db_operation
+    def create_inference_run(self, team_id: str, trigger_type: str, config: Optional[Dict] = None) -> Operation[str]:
         """Starts a new Audit Log entry. Returns Run ID."""
         data = {
             "team_id": team_id,
             "trigger_type": trigger_type,
             "status": "processing",
-            "model_config": config,
+            "model_config": config or {},
             "started_at": datetime.now(timezone.utc).isoformat()
         }
-        res = self.db.table("inference_runs").insert(data).execute()
+        res = yield self.db.table("inference_runs").insert(data)
         return res.data[0]["id"]
 
-    def complete_inference_run(self, run_id: str, status: str = "completed"):
-        """Updates the status of the run."""
-        self.db.table("inference_runs").update({
+    @db_operation
+    def complete_inference_run(self, run_id: str, status: str = "completed", model_config: Optional[Dict] = None) -> Operation[None]:
+        """Updates the status of the run (and replaces its model_config when given)."""
+        update = {
             "status": status,
             "completed_at": datetime.now(timezone.utc).isoformat()
-        }).eq("id", run_id).execute()
+        }
+        if model_config is not None:
+            update["model_config"] = model_config
+        yield self.db.table("inference_runs").update(update).eq("id", run_id)
+
+    @db_operation
+    def get_inference_run(self, run_id: str, team_id: str) -> Operation[Optional[Dict]]:
+        try:
+            res = yield self.db.table("inference_runs").select("*").eq("id", run_id).eq("team_id", team_id).maybe_single()
+            return res.data if res else None
+        except Exception as e:
+            print(f"[DB Error] Get Inference Run: {e}")
+            return None
+
+    @db_operation
+    def get_inference_runs(self, team_id: str, limit: int = 50, cursor: Optional[str] = None) -> Operation[Dict[str, Any]]:
+        """Page of audit runs (Auto-Pilot decisions, inferences), newest first: {"items", "next_cursor"}"""
+        return (yield from self._keyset_page("inference_runs", team_id, clamp_page_size(limit, 50), cursor))
+
+    @db_operation
+    def get_signals_in_range(self, team_id: str, since: Optional[str] = None, until: Optional[str] = None,
+                             limit: int = EXPORT_PAGE_SIZE, cursor: Optional[str] = None, with_embedding: bool = False) -> Operation[Dict[str, Any]]:
+        """
+        Page of raw_signals with occurred_at in [since, until), newest first: {"items", "next_cursor"}.
+        Raises ValueError for a bad cursor; DB errors propagate (a replay must not silently stop short).
+        """
+        query = self.db.table("raw_signals").select(signals_range_columns(with_embedding)).eq("team_id", team_id)
+        res = yield keyset_query(signals_range_query(query, since, until), "occurred_at", limit, cursor)
+        return keyset_page(res.data or [], "occurred_at", limit)
+
+    # --- KEYSET LISTINGS ---
+    def _listing_query(self, listing: str, team_id: str, limit: int, cursor: Optional[str]) -> Any:
+        """One page request of a KEYSET_LISTINGS listing; raises ValueError for a bad cursor"""
+        table, sort_column, columns = KEYSET_LISTINGS[listing]
+        return keyset_query(self.db.table(table).select(columns).eq("team_id", team_id), sort_column, limit, cursor)
+
+    def _keyset_page(self, listing: str, team_id: str, limit: int, cursor: Optional[str] = None) -> Operation[Dict[str, Any]]:
+        """Raises ValueError for a bad cursor; DB errors yield an empty page"""
+        query = self._listing_query(listing, team_id, limit, cursor)
+        try:
+            res = yield query
+            return keyset_page(res.data or [], KEYSET_LISTINGS[listing][1], limit)
+        except Exception as e:
+            print(f"[DB Error] List {listing}: {e}")
+            return {"items": [], "next_cursor": None}
 
     # --- JOIN TABLE ---
-    def link_signals_to_run(self, run_id: str, signal_ids: List[str]):
+    @db_operation
+    def link_signals_to_run(self, run_id: str, signal_ids: List[str]) -> Operation[None]:
         """Populates the inference_run_signals join table."""
         if not signal_ids:
             return
-        
+
         rows = [{"inference_run_id": run_id, "signal_id": s_id} for s_id in signal_ids]
-        self.db.table("inference_run_signals").insert(rows).execute()
+        yield self.db.table("inference_run_signals").insert(rows)
 
     # --- WORKFLOWS ---
-    def save_workflow(self, team_id: str, run_id: str, workflow_graph: Dict) -> str:
+    @db_operation
+    def save_workflow(self, team_id: str, run_id: str, workflow_graph: Dict, activate: bool = True) -> Operation[str]:
         """
-        Saves the workflow and its nodes/edges.
-        This handles the Write Transaction logic (Active flag management).
+        Saves the workflow and its nodes/edges and makes it the active one
+        (activate=False: the team's shadow workflow instead, the active one is left alone).
+        Runs as the save_workflow_graph stored procedure: one network call, one transaction,
+        serialized per team. Raises on failure, in which case nothing was written.
         """
-        # 1. Create Workflow Record
-        workflow_data = {
-            "team_id": team_id,
-            "inference_run_id": run_id,
-            "title": workflow_graph.get("title", "Generated Workflow"),
-            "is_active": False # Default to false, allow user to 'Activate' later? Or True for MVP? 
-                               # Requirement: "Rollback...". Let's set True for now and handle the Unique Constraint logic.
-        }
-        
-        # De-activate previous active workflow (Manual logic because partial index prevents insert if we don't unset first)
-        # Ideally this should be a stored proc.
-        # For Phase 1 Code: We will fetch the current active one, set it false, then insert new one as true.
-        # This is a race condition risk but acceptable for MVP Phase 1.
-        
         try:
-            # Unset active
-            self.db.table("workflows").update({"is_active": False}).eq("team_id", team_id).eq("is_active", True).execute()
-            
-            # Insert new as Active
-            workflow_data["is_active"] = True
-            w_res = self.db.table("workflows").insert(workflow_data).execute()
-            workflow_id = w_res.data[0]["id"]
-            
-            # 2. Insert Nodes
-            nodes = workflow_graph.get("nodes", [])
-            if nodes:
-                node_rows = []
-                for n in nodes:
-                    node_rows.append({
-                        "workflow_id": workflow_id,
-                        "step_id": n["id"],
-                        "label": n["data"].get("label", "Untitled"),
-                        "type": n.get("type", "process"),
-                        "description": n["data"].get("description", ""),
-                        "actor": n["data"].get("actor", ""),
-                        "metadata": n["data"]
-                    })
-                self.db.table("workflow_nodes").insert(node_rows).execute()
-                
-            # 3. Insert Edges
-            edges = workflow_graph.get("edges", [])
-            if edges:
-                edge_rows = []
-                for e in edges:
-                    edge_rows.append({
-                        "workflow_id": workflow_id,
-                        "source_step_id": e["source"],
-                        "target_step_id": e["target"],
-                        "label": e.get("label", ""),
-                        "condition": "" 
-                    })
-                self.db.table("workflow_edges").insert(edge_rows).execute()
-            
-            return workflow_id
-            
+            res = yield self.db.rpc("save_workflow_graph", {
+                "p_team_id": team_id,
+                "p_inference_run_id": run_id,
+                "p_title": workflow_graph.get("title", "Generated Workflow"),
+                "p_nodes": workflow_graph.get("nodes", []),
+                "p_edges": workflow_graph.get("edges", []),
+                "p_activate": activate
+            })
+            if not res.data:
+                raise Exception("save_workflow_graph returned no workflow id")
+            return res.data
         except Exception as e:
             print(f"[DB Error] Save Workflow Failed: {e}")
-            # If workflow was created, we might want to delete it?
-            # Or reliance on 'inference_run' status=failed is enough.
-    def _assemble_workflow_graph(self, workflow: Dict) -> Dict:
-        """Helper to reconstruct graph from DB row"""
+            raise e
+        finally:
+            (self.workflow_cache if activate else self.shadow_workflow_cache).invalidate_team(team_id)
+
+    def _assemble_workflow_graph(self, workflow: Dict) -> Operation[Dict]:
+        """
+        Helper to reconstruct graph from DB row.
+        Uses nodes/edges embedded by WORKFLOW_GRAPH_SELECT; falls back to fetching them.
+        """
         wf_id = workflow["id"]
-        
-        # Get Nodes
-        n_res = self.db.table("workflow_nodes").select("*").eq("workflow_id", wf_id).execute()
-        nodes = []
-        for row in n_res.data:
-            nodes.append({
-                "id": row["step_id"],
-                "type": row["type"],
-                "data": {
-                    "label": row["label"],
-                    "description": row["description"],
-                    "actor": row["actor"],
-                    **row["metadata"]
-                }
-            })
-            
-        # Get Edges
-        e_res = self.db.table("workflow_edges").select("*").eq("workflow_id", wf_id).execute()
-        edges = []
-        for row in e_res.data:
-            edges.append({
-                "source": row["source_step_id"],
-                "target": row["target_step_id"],
-                "label": row["label"]
-            })
-            
-        return {
-            "workflow_id": wf_id,
-            "team_id": workflow["team_id"],
-            "title": workflow["title"],
-            "created_at": workflow["created_at"],
-            "is_active": workflow["is_active"],
-            "nodes": nodes,
-            "edges": edges
-        }
+        node_rows = workflow.get("workflow_nodes")
+        edge_rows = workflow.get("workflow_edges")
+        if node_rows is None or edge_rows is None:
+            node_res, edge_res = yield [
+                self.db.table("workflow_nodes").select("*").eq("workflow_id", wf_id),
+                self.db.table("workflow_edges").select("*").eq("workflow_id", wf_id)
+            ]
+            node_rows = node_res.data if node_rows is None else node_rows
+            edge_rows = edge_res.data if edge_rows is None else edge_rows
 
-    def update_node_metadata(self, node_id: str, metadata_update: Dict) -> bool:
-        """Updates the metadata of a specific node (e.g. toggling auto-pilot)"""
+        return assemble_workflow_graph(workflow, node_rows, edge_rows)
+
+    @db_operation
+    def update_node_metadata(self, workflow_id: str, node_id: str, metadata_update: Dict) -> Operation[bool]:
+        """Updates the metadata of a specific workflow node (e.g. toggling auto-pilot)"""
         try:
             # 1. Fetch current metadata
-            res = self.db.table("workflow_nodes").select("metadata").eq("step_id", node_id).single().execute()
-            if not res.data:
+            res = yield self.db.table("workflow_nodes").select("metadata")\
+                .eq("workflow_id", workflow_id)\
+                .eq("step_id", node_id)\
+                .maybe_single()
+            if not res or not res.data:
                 return False
-            
+
             current_meta = res.data["metadata"] or {}
             # 2. Merge updates
             updated_meta = {**current_meta, **metadata_update}
-            
+
             # 3. Save
-            self.db.table("workflow_nodes").update({"metadata": updated_meta}).eq("step_id", node_id).execute()
+            yield self.db.table("workflow_nodes").update({"metadata": updated_meta})\
+                .eq("workflow_id", workflow_id)\
+                .eq("step_id", node_id)
+            self.workflow_cache.invalidate_workflow(workflow_id)
             return True
         except Exception as e:
             print(f"[DB Error] Update Node: {e}")
             return False
 
-    def update_workflow_nodes_batch(self, workflow_id: str, nodes_data: List[Dict]) -> bool:
+    @db_operation
+    def update_workflow_nodes_batch(self, workflow_id: str, nodes_data: List[Dict]) -> Operation[List[Dict[str, Any]]]:
         """
-        Updates multiple nodes for a given workflow.
+        Updates multiple nodes for a given workflow in one round trip and one transaction
+        (update_workflow_nodes_batch RPC). Only the fields present on each node are written.
         nodes_data expects: [{ "id": "step_id", "label": "...", "metadata": {...}, "auto_run_enabled": bool, ... }]
+        Returns per-node results: [{ "id": "step_id", "updated": bool }]
         """
+        payload = batch_node_payload(nodes_data)
         try:
-            for node in nodes_data:
-                # Prepare update payload
-                update_payload = {}
-                if "label" in node: update_payload["label"] = node["label"]
-                if "description" in node: update_payload["description"] = node["description"]
-                if "auto_run_enabled" in node: update_payload["auto_run_enabled"] = node["auto_run_enabled"]
-                if "metadata" in node: 
-                    # Identify if existing metadata needs merging or valid overwrite
-                    # For safety, fetch and merge if partial update, but if FE sends full object, overwrite is faster.
-                    # Assuming FE sends full metadata state including position.
-                    update_payload["metadata"] = node["metadata"]
-                
-                if update_payload:
-                    self.db.table("workflow_nodes")\
-                        .update(update_payload)\
-                        .eq("workflow_id", workflow_id)\
-                        .eq("step_id", node["id"])\
-                        .execute()
-            return True
+            rows = []
+            to_send = [p for p in payload if p]
+            if to_send:
+                res = yield self.db.rpc("update_workflow_nodes_batch", {
+                    "p_workflow_id": workflow_id,
+                    "p_nodes": to_send
+                })
+                rows = res.data or []
+            return batch_node_results(nodes_data, payload, rows)
         except Exception as e:
             print(f"[DB Error] Batch Update Nodes: {e}")
             raise e
+        finally:
+            self.workflow_cache.invalidate_workflow(workflow_id)
 
-    def get_active_workflow(self, team_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieves the currently active workflow graph."""
+    @db_operation
+    def get_active_workflow(self, team_id: str) -> Operation[Optional[Dict[str, Any]]]:
+        """
+        Retrieves the currently active workflow graph.
+        Served from the workflow cache when fresh; the returned graph is shared, treat it as read-only.
+        """
+        cached = self.workflow_cache.get(team_id)
+        if not self.workflow_cache.is_miss(cached):
+            return cached
+
+        generation = self.workflow_cache.generation
         try:
-            w_res = self.db.table("workflows").select("*")\
+            w_res = yield self.db.table("workflows").select(WORKFLOW_GRAPH_SELECT)\
                 .eq("team_id", team_id)\
                 .eq("is_active", True)\
-                .maybe_single()\
-                .execute()
-            
-            if not w_res.data: return None
-            return self._assemble_workflow_graph(w_res.data)
+                .maybe_single()
+
+            graph = (yield from self._assemble_workflow_graph(w_res.data)) if w_res and w_res.data else None
+            self.workflow_cache.put(team_id, graph, generation)
+            return graph
         except Exception as e:
             print(f"[DB Error] Get Active Workflow: {e}")
             return None
 
-    def get_workflow_history(self, team_id: str, limit: int = 20) -> List[Dict]:
-        """Fetch list of workflow summaries"""
+    # --- SHADOW WORKFLOWS ---
+    @db_operation
+    def get_shadow_workflow(self, team_id: str) -> Operation[Optional[Dict[str, Any]]]:
+        """The team's shadow (candidate) workflow graph or None, cached like the active one (read-only)"""
+        cached = self.shadow_workflow_cache.get(team_id)
+        if not self.shadow_workflow_cache.is_miss(cached):
+            return cached
+
+        generation = self.shadow_workflow_cache.generation
         try:
-            res = self.db.table("workflows")\
-                .select("id, title, created_at, is_active")\
-                .eq("team_id", team_id)\
-                .order("created_at", desc=True)\
-                .limit(limit)\
-                .execute()
-            return res.data
+            t_res = yield self.db.table("teams").select("shadow_workflow_id").eq("id", team_id).maybe_single()
+            workflow_id = t_res.data.get("shadow_workflow_id") if t_res and t_res.data else None
+            graph = None
+            if workflow_id:
+                w_res = yield self.db.table("workflows").select(WORKFLOW_GRAPH_SELECT)\
+                    .eq("id", workflow_id)\
+                    .eq("team_id", team_id)\
+                    .maybe_single()
+                graph = (yield from self._assemble_workflow_graph(w_res.data)) if w_res and w_res.data else None
+            self.shadow_workflow_cache.put(team_id, graph, generation)
+            return graph
         except Exception as e:
-            print(f"[DB Error] History: {e}")
-            return []
+            print(f"[DB Error] Get Shadow Workflow: {e}")
+            return None
 
-    def get_workflow_by_id(self, workflow_id: str, team_id: str) -> Optional[Dict]:
+    @db_operation
+    def set_shadow_workflow(self, team_id: str, workflow_id: Optional[str]) -> Operation[bool]:
+        """Starts shadow mode for an existing version (None ends it)"""
+        try:
+            yield self.db.table("teams").update({"shadow_workflow_id": workflow_id}).eq("id", team_id)
+            return True
+        except Exception as e:
+            print(f"[DB Error] Set Shadow Workflow: {e}")
+            return False
+        finally:
+            self.shadow_workflow_cache.invalidate_team(team_id)
+
+    @db_operation
+    def promote_shadow_workflow(self, team_id: str) -> Operation[Optional[str]]:
+        """Makes the shadow workflow the active one (promote_shadow_workflow RPC); returns its id, None if there was none"""
+        try:
+            res = yield self.db.rpc("promote_shadow_workflow", {"p_team_id": team_id})
+            return res.data or None
+        except Exception as e:
+            print(f"[DB Error] Promote Shadow Workflow: {e}")
+            raise e
+        finally:
+            self.workflow_cache.invalidate_team(team_id)
+
+    @db_operation
+    def record_shadow_decision(self, row: Dict[str, Any]) -> Operation[bool]:
+        try:
+            yield self.db.table("shadow_decisions").insert(row)
+            return True
+        except Exception as e:
+            print(f"[DB Error] Record Shadow Decision: {e}")
+            return False
+
+    @db_operation
+    def get_shadow_decisions(self, team_id: str, shadow_workflow_id: str, limit: int = 50,
+                             cursor: Optional[str] = None, differs_only: bool = True) -> Operation[Dict[str, Any]]:
+        """Page of side-by-side decisions for one candidate, newest first: {"items", "next_cursor"}"""
+        table, sort_column, columns = KEYSET_LISTINGS["shadow_decisions"]
+        limit = clamp_page_size(limit, 50)
+        query = self.db.table(table).select(columns).eq("team_id", team_id).eq("shadow_workflow_id", shadow_workflow_id)
+        if differs_only:
+            query = query.eq("differs", True)
+        query = keyset_query(query, sort_column, limit, cursor)
+        try:
+            res = yield query
+            return keyset_page(res.data or [], sort_column, limit)
+        except Exception as e:
+            print(f"[DB Error] List shadow_decisions: {e}")
+            return {"items": [], "next_cursor": None}
+
+    @db_operation
+    def get_shadow_decision_stats(self, team_id: str, shadow_workflow_id: str) -> Operation[Dict[str, Any]]:
+        try:
+            res = yield self.db.rpc("shadow_decision_stats", {
+                "p_team_id": team_id,
+                "p_shadow_workflow_id": shadow_workflow_id
+            })
+            return res.data or {}
+        except Exception as e:
+            print(f"[DB Error] Shadow Decision Stats: {e}")
+            return {}
+
+    @db_operation
+    def get_workflow_history(self, team_id: str, limit: int = 20, cursor: Optional[str] = None) -> Operation[Dict[str, Any]]:
+        """Page of workflow summaries, newest first: {"items", "next_cursor"}"""
+        return (yield from self._keyset_page("workflows", team_id, clamp_page_size(limit, 20), cursor))
+
+    @db_operation
+    def get_workflow_by_id(self, workflow_id: str, team_id: str) -> Operation[Optional[Dict]]:
         """Fetch specific workflow version"""
         try:
             # Enforce team ownership
-            w_res = self.db.table("workflows").select("*").eq("id", workflow_id).eq("team_id", team_id).maybe_single().execute()
+            w_res = yield self.db.table("workflows").select(WORKFLOW_GRAPH_SELECT).eq("id", workflow_id).eq("team_id", team_id).maybe_single()
             if not w_res.data: return None
-            return self._assemble_workflow_graph(w_res.data)
+            return (yield from self._assemble_workflow_graph(w_res.data))
         except Exception as e:
             print(f"[DB Error] Get By ID: {e}")
             return None
 
     # --- KNOWLEDGE BASE ---
-    def add_knowledge_item(self, team_id: str, content: str, embedding: List[float], metadata: Dict) -> str:
+    @db_operation
+    def add_knowledge_item(self, team_id: str, content: str, embedding: List[float], metadata: Dict) -> Operation[str]:
         data = {
             "team_id": team_id,
             "content": content,
-            "embedding": embedding,
+            **embedding_fields(embedding),
             "metadata": metadata,
             "created_at": datetime.now(timezone.utc).isoformat()
         }
-        res = self.db.table("knowledge_base").insert(data).execute()
+        res = yield self.db.table("knowledge_base").insert(data)
         return res.data[0]["id"]
 
-    def search_knowledge_base(self, team_id: str, query_embedding: List[float], limit: int = 5, threshold: float = 0.7) -> List[Dict]:
+    @db_operation
+    def search_knowledge_base(self, team_id: str, query_embedding: List[float], limit: int = 5, threshold: float = 0.7) -> Operation[List[Dict]]:
         try:
-             res = self.db.rpc("match_knowledge_base", {
+            res = yield self.db.rpc(get_embedding_profile()["knowledge_rpc"], {
                 "query_embedding": query_embedding,
                 "match_threshold": threshold,
                 "match_count": limit,
                 "filter_team_id": team_id
-            }).execute()
-             return res.data
+            })
+            return res.data
         except Exception as e:
             print(f"[DB Error] KB Search: {e}")
             return []
 
-    def get_knowledge_items(self, team_id: str) -> List[Dict]:
-        try:
-            res = self.db.table("knowledge_base")\
-                .select("id, content, metadata, created_at")\
-                .eq("team_id", team_id)\
-                .order("created_at", desc=True)\
-                .execute()
-            return res.data
-        except Exception as e:
-            print(f"[DB Error] Get KB: {e}")
-            return []
-            
-    def delete_knowledge_item(self, item_id: str, team_id: str) -> bool:
+    @db_operation
+    def get_knowledge_items(self, team_id: str, limit: int = 50, cursor: Optional[str] = None) -> Operation[Dict[str, Any]]:
+        """Page of knowledge items (without embeddings), newest first: {"items", "next_cursor"}"""
+        return (yield from self._keyset_page("knowledge", team_id, clamp_page_size(limit, 50), cursor))
+
+    @db_operation
+    def delete_knowledge_item(self, item_id: str, team_id: str) -> Operation[bool]:
         try:
-            self.db.table("knowledge_base").delete().eq("id", item_id).eq("team_id", team_id).execute()
+            yield self.db.table("knowledge_base").delete().eq("id", item_id).eq("team_id", team_id)
             return True
-        except Exception as e:
+        except Exception:
             return False
 
-    def bulk_insert_knowledge(self, rows: List[Dict]) -> int:
-        if not rows: return 0
+    @db_operation
+    def _insert_knowledge_chunk(self, chunk: List[Dict]) -> Operation[Tuple[int, Optional[Exception]]]:
+        """Returns (new rows, None) on success or (0, last error); never raises"""
+        attempt = 0
+        while True:
+            try:
+                res = yield self.db.table("knowledge_base").upsert(chunk, on_conflict="id", ignore_duplicates=True)
+                return len(res.data or []), None
+            except Exception as e:
+                if attempt >= KNOWLEDGE_INSERT_RETRIES or not _is_transient_error(e):
+                    return 0, e
+            yield Backoff(KNOWLEDGE_INSERT_BACKOFF * (2 ** attempt) + random.uniform(0, KNOWLEDGE_INSERT_BACKOFF))
+            attempt += 1
+
+
+class PersistenceRepository(RepositoryOperations):
+    """Blocking repository on the pooled Supabase client (see RepositoryOperations for the queries)"""
+
+    def __init__(self):
+        super().__init__(get_supabase_client())
+
+    def _drive(self, operation: Operation[T]) -> T:
+        """Runs an operation, executing its requests one after the other in this thread"""
+        response, error = None, None
+        while True:
+            try:
+                request = operation.throw(error) if error is not None else operation.send(response)
+            except StopIteration as done:
+                return done.value
+            response, error = None, None
+            try:
+                if isinstance(request, Backoff):
+                    time.sleep(request.seconds)
+                elif isinstance(request, list):
+                    response = [r.execute() for r in request]
+                else:
+                    response = request.execute()
+            except Exception as e:
+                error = e
+
+    # --- TEAMS ---
+    def get_or_create_team(self, team_name: str, owner_id: str) -> str:
+        """Ensures a team exists and returns its UUID"""
+        team_id = self.team_cache.get(owner_id)
+        if team_id:
+            return team_id
+
+        # Collapse concurrent resolutions for the same owner so a burst of first
+        # requests issues one lookup and at most one insert.
+        with self.team_cache.locks.hold(owner_id) as waited:
+            return self._resolve_team(team_name, owner_id, waited)
+
+    # --- RAW SIGNALS ---
+    def ingest_signals(
+        self,
+        team_id: str,
+        signals: Iterable[Dict[str, Any]],
+        collect_ids: bool = False,
+        on_chunk: Optional[Callable[[List[str]], None]] = None,
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Streams raw signals into the data lake in bounded chunks.
+        `signals` may be any iterable (generator, CSV reader); at most `concurrency` chunks are
+        held in memory at once. Existing (team_id, source, external_id) rows are left untouched.
+        Returns {"inserted", "duplicates", "chunks"}, plus "ids" (new and existing) when collect_ids=True.
+        on_chunk(ids) is called in the caller's thread with each chunk's ids, in input order.
+        """
+        chunk_size = chunk_size or SIGNAL_INGEST_CHUNK_SIZE
+        concurrency = max(1, concurrency or SIGNAL_INGEST_CONCURRENCY)
+        want_ids = collect_ids or on_chunk is not None
+        progress = IngestProgress(collect_ids)
+
+        def _drain(chunk_result: Tuple[int, int, List[str]]):
+            chunk_ids = progress.add(chunk_result)
+            if on_chunk is not None:
+                on_chunk(chunk_ids)
+
+        chunks = (
+            [prepare_signal_row(team_id, s) for s in batch]
+            for batch in _chunked(signals, chunk_size)
+        )
         try:
-            # Chunking for safety
-            chunk_size = 100
-            total = 0
-            for i in range(0, len(rows), chunk_size):
-                chunk = rows[i:i + chunk_size]
-                self.db.table("knowledge_base").insert(chunk).execute()
-                total += len(chunk)
-            return total
+            if concurrency == 1:
+                for rows in chunks:
+                    _drain(self._upsert_signal_chunk(team_id, rows, want_ids))
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ingest") as pool:
+                    in_flight: Deque[Future] = deque()
+                    for rows in chunks:
+                        in_flight.append(pool.submit(self._upsert_signal_chunk, team_id, rows, want_ids))
+                        if len(in_flight) >= concurrency:
+                            _drain(in_flight.popleft().result())
+                    while in_flight:
+                        _drain(in_flight.popleft().result())
         except Exception as e:
-            print(f"[DB Error] Bulk KB: {e}")
-            return 0
+            print(f"[DB Error] Ingest Signals (after {progress.summary['chunks']} chunks): {e}")
+            raise e
+
+        return progress.result()
+
+    # --- KEYSET LISTINGS ---
+    def iter_listing(self, listing: str, team_id: str, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Dict]:
+        """Yields every row of a listing page by page (exports); memory stays bounded by page_size"""
+        sort_column = KEYSET_LISTINGS[listing][1]
+        cursor = None
+        while True:
+            res = self._listing_query(listing, team_id, page_size, cursor).execute()
+            page = keyset_page(res.data or [], sort_column, page_size)
+            yield from page["items"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+
+    # --- KNOWLEDGE BASE ---
+    def bulk_insert_knowledge(
+        self,
+        rows: List[Dict],
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Writes knowledge_base rows in parallel chunks; each chunk is retried with backoff on
+        transient errors and fails independently of the others.
+        Rows without an "id" are sent with a generated one (on a copy), so a retried chunk whose first
+        attempt did commit is a no-op rather than a duplicate; give rows ids to make resuming a failed
+        range idempotent as well.
+        Returns {"inserted": <new rows>, "committed": [[start, end], ...], "failed": [{"start", "end", "error"}, ...]}
+        with half-open index ranges into `rows`.
+        """
+        if not rows:
+            return knowledge_insert_result([], [])
+        concurrency = max(1, concurrency or KNOWLEDGE_INSERT_CONCURRENCY)
+
+        rows = knowledge_rows_with_ids(rows)
+        spans = knowledge_chunk_spans(rows, chunk_size or KNOWLEDGE_INSERT_CHUNK_SIZE)
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(spans)), thread_name_prefix="kb-insert") as pool:
+            outcomes = list(pool.map(lambda span: self._insert_knowledge_chunk(rows[span[0]:span[1]]), spans))
+        return knowledge_insert_result(spans, outcomes)
+
+# --- SHARED INSTANCE ---
+_repository: Optional[PersistenceRepository] = None
+_repository_lock = threading.Lock()
+
+def get_repository() -> PersistenceRepository:
+    """
+    Returns the process-wide repository (one per gunicorn worker).
+    Use as a FastAPI dependency: `repo: PersistenceRepository = Depends(get_repository)`.
+    """
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = PersistenceRepository()
+    return _repository
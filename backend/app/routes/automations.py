@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 from app.dependencies.auth import get_current_user
+from app.repositories.async_persistence import AsyncPersistenceRepository, get_async_repository
+from app.core.streaming import ndjson_response
+from app.services.replay import REPLAY_THRESHOLDS, get_replay, start_replay
 
 # BOOT TRACE
 print("[BOOT] Loading Automations Router Module...", flush=True)
@@ -26,6 +30,65 @@ def trigger_automation(
     return res
 
 @router.get("/history")
-def get_history(limit: int = 20, current_user: dict = Depends(get_current_user)):
-    # Stubbed history for now
-    return {"history": []}
+@router.get("/{team_id}/history")
+async def get_history(
+    team_id: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """Auto-Pilot audit log (inference_runs), newest first, keyset-paged via next_cursor"""
+    user_id = current_user.get("sub")
+    real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+
+    if format == "ndjson":
+        return ndjson_response(repo.iter_listing("inference_runs", real_team_id), "automation_history.ndjson")
+    try:
+        page = await repo.get_inference_runs(real_team_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"history": page["items"], "next_cursor": page["next_cursor"]}
+
+
+class ReplayRequest(BaseModel):
+    since: Optional[datetime] = None      # occurred_at in [since, until); invalid timestamps are a 422
+    until: Optional[datetime] = None
+    workflow_id: Optional[str] = None     # Defaults to the active workflow
+    thresholds: List[float] = list(REPLAY_THRESHOLDS)
+    labels: Optional[Dict[str, Optional[str]]] = None  # signal id / external id -> expected node id (None = no action)
+    all_nodes: bool = False               # Treat every node as Auto-Pilot (for versions not yet enabled)
+    use_prefilter: bool = True
+    use_context: bool = True
+    concurrency: Optional[int] = None
+    max_signals: Optional[int] = None
+
+@router.post("/replay")
+async def replay_signals(
+    payload: ReplayRequest,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """Dry-run replay of historical signals (threshold tuning); poll GET /replay/{run_id} for the report"""
+    user_id = current_user.get("sub")
+    real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+    if payload.workflow_id and not await repo.get_workflow_by_id(payload.workflow_id, real_team_id):
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    options = payload.model_dump(exclude_none=True, mode="json")  # datetimes back to ISO strings for the query
+    run_id = await start_replay(real_team_id, **options)
+    return {"run_id": run_id, "status": "processing"}
+
+@router.get("/replay/{run_id}")
+async def get_replay_report(
+    run_id: str,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    user_id = current_user.get("sub")
+    real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+    run = await get_replay(run_id, real_team_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return run
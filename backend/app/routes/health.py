@@ -1,5 +1,14 @@
 from fastapi import APIRouter
-from app.repositories.persistence import PersistenceRepository
+from fastapi.responses import PlainTextResponse
+from app.repositories.persistence import get_repository, idempotency_cache, team_cache, workflow_cache
+from app.core.database import get_pool_stats
+from app.services.audit_writer import audit_writer
+from app.services.prefilter import prefilter
+from app.services.trigger_engine import batch_evaluator, shadow_evaluator
+from app.services.decision_cache import decision_cache
+from app.services.work_queue import get_work_queue
+from app.services.fair_scheduler import evaluation_scheduler
+from app.services.tracing import stage_metrics
 
 router = APIRouter(tags=["health"])
 
@@ -11,8 +20,38 @@ def health_check():
 def health_db():
     """Diagnostic endpoint to check DB connectivity"""
     try:
-        repo = PersistenceRepository()
+        repo = get_repository()
         res = repo.db.table("teams").select("count", count="exact").limit(1).execute()
         return {"status": "ok", "db": "connected", "teams_count": res.count}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+@router.get("/metrics")
+async def metrics():
+    """Per-worker runtime metrics (connection pool, caches, audit buffer, trigger pre-filter, LLM batching, decision cache, per-team evaluation scheduling, trigger stage latency, shadow evaluation) and queue depth"""
+    queue = get_work_queue()
+    queue_stats = {"backend": "inline"}
+    if queue is not None:
+        try:
+            queue_stats = await queue.stats()
+        except Exception as e:
+            queue_stats = {"backend": queue.name, "error": str(e)}
+    return {
+        "db_pool": get_pool_stats(),
+        "workflow_cache": workflow_cache.stats(),
+        "team_cache": team_cache.stats(),
+        "idempotency_cache": idempotency_cache.stats(),
+        "audit_writer": audit_writer.stats(),
+        "prefilter": prefilter.stats(),
+        "llm_batching": batch_evaluator.stats(),
+        "decision_cache": decision_cache.stats(),
+        "work_queue": queue_stats,
+        "evaluation_scheduler": evaluation_scheduler.stats(),
+        "trigger_stages": stage_metrics.stats(),
+        "shadow": shadow_evaluator.stats(),
+    }
+
+@router.get("/metrics/prometheus", response_class=PlainTextResponse)
+def metrics_prometheus():
+    """Trigger pipeline stage latency histograms for Prometheus scraping (per worker)"""
+    return stage_metrics.prometheus()
@@ -3,7 +3,7 @@ from pydantic import BaseModel
 from typing import Dict, Any, List
 from app.dependencies.auth import get_current_user
 from app.services.integration_clients import fetch_slack_events, fetch_jira_issues
-from app.repositories.persistence import PersistenceRepository
+from app.repositories.persistence import PersistenceRepository, get_repository
 
 # BOOT TRACE
 print("[BOOT] Loading Integrations Router...", flush=True)
@@ -27,9 +27,11 @@ def get_integrations_status(current_user: dict = Depends(get_current_user)):
     return {"slack": "active", "jira": "active"}
 
 @router.get("/debug_slack")
-def debug_slack(current_user: dict = Depends(get_current_user)):
+def debug_slack(
+    current_user: dict = Depends(get_current_user),
+    repo: PersistenceRepository = Depends(get_repository)
+):
     """Debug endpoint to verify DB configs and Slack connectivity"""
-    repo = PersistenceRepository()
     user_id = current_user.get("sub")
     team_id = repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
     configs = repo.get_team_integrations(team_id)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
 from app.services.rag_service import RAGService
 from app.dependencies.auth import get_current_user
+from app.repositories.async_persistence import AsyncPersistenceRepository, get_async_repository
+from app.core.streaming import ndjson_response
 from typing import Optional
 import io
 
@@ -50,11 +52,28 @@ async def upload_knowledge(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{team_id}/knowledge")
-def list_knowledge(team_id: str, current_user: dict = Depends(get_current_user)):
-    service = RAGService()
+async def list_knowledge(
+    team_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """
+    One page of KB items, newest first; pass next_cursor back as ?cursor= for the next page.
+    ?format=ndjson streams the whole knowledge base instead.
+    """
     user_id = current_user.get("sub")
-    real_team_id = service.repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
-    return {"success": True, "documents": service.list_documents(real_team_id)}
+    real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+
+    if format == "ndjson":
+        return ndjson_response(repo.iter_listing("knowledge", real_team_id), "knowledge.ndjson")
+    try:
+        page = await repo.get_knowledge_items(real_team_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "documents": page["items"], "next_cursor": page["next_cursor"]}
 
 @router.delete("/{team_id}/knowledge/{doc_id}")
 def delete_knowledge(team_id: str, doc_id: str, current_user: dict = Depends(get_current_user)):
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from app.dependencies.auth import get_current_user
-from app.repositories.persistence import PersistenceRepository
+from app.repositories.persistence import get_repository
 
 router = APIRouter(tags=["usage"])
 
@@ -8,7 +8,7 @@ router = APIRouter(tags=["usage"])
 def get_team_usage(current_user: dict = Depends(get_current_user)):
     """Get current team usage and limits"""
     try:
-        repo = PersistenceRepository()
+        repo = get_repository()
         user_id = current_user.get("sub")
         team_id = repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
         
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Header
 from app.services.integration_clients import _classify_signal
-from app.repositories.persistence import PersistenceRepository
-from app.services.trigger_engine import evaluate_signal
+from app.repositories.async_persistence import get_async_repository
+from app.services.trigger_engine import EvaluationError, run_evaluation
+from app.services.work_queue import get_work_queue
+from app.services.fair_scheduler import SchedulerOverloaded, evaluation_scheduler
+from app.services.audit_writer import audit_writer
+import asyncio
 import os
 import json
 import hmac
@@ -26,11 +30,11 @@ async def process_slack_event(event: dict, slack_team_id: str):
         if event.get("bot_id"):
              return 
              
-        repo = PersistenceRepository()
+        repo = await get_async_repository()
         
         # Resolve Team ID (MVP Strategy: Pick the first available team in DB)
         # In a real SaaS, we would look up the team that installed the Slack App via slack_team_id.
-        team_res = repo.db.table("teams").select("id").limit(1).execute()
+        team_res = await repo.db.table("teams").select("id").limit(1).execute()
         if not team_res.data:
             print("❌ [Webhook] No teams found in DB. Dropping signal.")
             return
@@ -59,45 +63,68 @@ async def process_slack_event(event: dict, slack_team_id: str):
         }
         
         # Insert (idempotent due to unique constraint on team_id+source+external_id)
-        try:
-            repo.ingest_signals(target_team_id, [new_signal])
-            print(f"✅ [Webhook] Ingested signal from {actor}: {text[:30]}... → Team {target_team_id}")
-        except Exception as ingest_error:
-            # If duplicate, this is expected (Slack retries)
-            if "duplicate" in str(ingest_error).lower() or "unique" in str(ingest_error).lower():
-                print(f"ℹ️ [Webhook] Duplicate signal detected (Slack retry). Skipping. Event: {ts}")
-                return  # Don't trigger evaluation again
-            else:
-                raise  # Re-raise if it's a different error
+        ingest = await repo.ingest_signals(target_team_id, [new_signal], concurrency=1)
+        if not ingest["inserted"]:
+            # Already stored: this is a Slack retry
+            print(f"ℹ️ [Webhook] Duplicate signal detected (Slack retry). Skipping. Event: {ts}")
+            return  # Don't trigger evaluation again
+        print(f"✅ [Webhook] Ingested signal from {actor}: {text[:30]}... → Team {target_team_id}")
         
-        # Trigger Auto-Pilot Evaluation (with timeout protection)
-        try:
-            # Timeout protection: If evaluation takes > 25 seconds, it will be killed
-            # (Render has 30s timeout, we need buffer for response)
-            import asyncio
-            await asyncio.wait_for(
-                asyncio.to_thread(evaluate_signal, target_team_id, new_signal),
-                timeout=25.0
-            )
-            
-            elapsed = time.time() - start_time
-            print(f"⏱️ [Webhook] Processed in {elapsed:.2f}s")
-            
-        except asyncio.TimeoutError:
-            print(f"⚠️ [Webhook] Evaluation timeout after 25s. Signal logged but not evaluated. Event: {ts}")
-            # Signal is already in DB, evaluation can be retried manually via replay endpoint
-            
-        except Exception as eval_error:
-            print(f"❌ [Webhook] Evaluation failed: {eval_error}. Signal logged but not evaluated.")
-            # Signal is in DB, can be replayed later
+        # Trigger Auto-Pilot Evaluation
+        queue = get_work_queue()
+        if queue is not None:
+            # Durable path: a worker pool (python -m app.worker) evaluates with retries and dead-lettering
+            try:
+                await queue.enqueue(
+                    "evaluate_signal",
+                    {"team_id": target_team_id, "signal": new_signal},
+                    team_id=target_team_id,
+                    dedupe_key=f"{target_team_id}:slack:{new_signal['id']}"
+                )
+                print(f"📥 [Webhook] Queued evaluation for {new_signal['id']}")
+            except Exception as queue_error:
+                print(f"❌ [Webhook] Enqueue failed: {queue_error}. Signal logged but not evaluated.")
+        else:
+            try:
+                # Fair scheduling: per-team concurrency cap, so one noisy channel can't starve other teams.
+                # Timeout protection: the stages before execution are cut off after 25 seconds
+                # (Render has 30s timeout, we need buffer for response); an automation that has
+                # started is never cancelled halfway, see run_evaluation
+                await evaluation_scheduler.run(target_team_id, lambda: run_evaluation(
+                    target_team_id, new_signal, timeout=25.0
+                ))
+                
+                elapsed = time.time() - start_time
+                print(f"⏱️ [Webhook] Processed in {elapsed:.2f}s")
+                
+            except SchedulerOverloaded as shed:
+                # Load shedding: the signal stays ingested, evaluation is deferred (replayable from the audit log)
+                print(f"⚠️ [Webhook] Evaluation deferred ({shed}). Event: {ts}")
+                audit_writer.finish(audit_writer.start(target_team_id, "auto_pilot_deferred", {
+                    "signal_id": new_signal["id"],
+                    "source": new_signal["source"],
+                    "signal_text": text[:500],
+                    "reason": "team_backlog_full"
+                }), "skipped")
+                
+            except asyncio.TimeoutError:
+                print(f"⚠️ [Webhook] Evaluation timeout after 25s. Signal logged but not evaluated. Event: {ts}")
+                # Signal is already in DB, evaluation can be retried manually via replay endpoint
+
+            except EvaluationError as eval_error:
+                # Transient (e.g. LLM rate limit); there is no retry on the inline path
+                print(f"⚠️ [Webhook] Evaluation failed transiently: {eval_error}. Signal logged but not evaluated. Event: {ts}")
+                
+            except Exception as eval_error:
+                print(f"❌ [Webhook] Evaluation failed: {eval_error}. Signal logged but not evaluated.")
+                # Signal is in DB, can be replayed later
         
         # Phase K: Real-time Knowledge Capture
         try:
             if len(text) > 15:
                 from app.services.rag_service import RAGService
                 rag = RAGService()
-                await asyncio.to_thread(
-                    rag.add_document, 
+                await rag.add_document_async(
                     target_team_id, 
                     f"Slack #{channel} ({actor}): {text}", 
                     {
@@ -3,8 +3,10 @@ from app.models.workflow import WorkflowGraph
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from app.dependencies.auth import get_current_user
-from app.repositories.persistence import PersistenceRepository
+from app.repositories.async_persistence import AsyncPersistenceRepository, get_async_repository
+from app.core.streaming import ndjson_response
 from app.services.workflow_inference import infer_workflow, generate_sop_document, query_similar_events
+from app.services.shadow import get_shadow_report
 
 # BOOT TRACE
 print("[BOOT] Loading Workflows Router...", flush=True)
@@ -19,26 +21,25 @@ class WorkflowNodeBatchUpdate(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 @router.get("/{team_id}/workflows")
-def get_workflows(
+async def get_workflows(
     team_id: str, 
     response: Response,
     current_user: dict = Depends(get_current_user), 
-    workflow_id: Optional[str] = None
+    workflow_id: Optional[str] = None,
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
 ):
     """
     Get active inferred workflow or specific version for the authenticated user's team.
     """
     try:
-        repo = PersistenceRepository()
-        
         # Resolve Team from User (Single Tenant MVP)
         user_id = current_user.get("sub")
-        real_team_id = repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+        real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
         
         if workflow_id:
-            workflow_graph = repo.get_workflow_by_id(workflow_id, real_team_id)
+            workflow_graph = await repo.get_workflow_by_id(workflow_id, real_team_id)
         else:
-            workflow_graph = repo.get_active_workflow(real_team_id)
+            workflow_graph = await repo.get_active_workflow(real_team_id)
         
         response.headers["Cache-Control"] = "private, max-age=30"
         
@@ -60,25 +61,141 @@ def get_workflows(
         raise HTTPException(status_code=500, detail=f"Error fetching workflows: {str(e)}")
 
 @router.post("/{team_id}/infer")
-def run_inference(team_id: str, current_user: dict = Depends(get_current_user)):
-    """Trigger AI inference to generate workflow from events"""
+def run_inference(team_id: str, shadow: bool = False, current_user: dict = Depends(get_current_user)):
+    """Trigger AI inference to generate workflow from events (?shadow=true: save as the shadow workflow, not active)"""
     try:
         user_id = current_user.get("sub")
-        workflow = infer_workflow(team_id, user_id)
+        workflow = infer_workflow(team_id, user_id, shadow=shadow)
         return {"success": True, "workflow": workflow}
     except Exception as e:
         print(f"Inference Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.put("/{team_id}/{workflow_id}/nodes")
+async def update_workflow_nodes(
+    team_id: str,
+    workflow_id: str,
+    nodes: List[WorkflowNodeBatchUpdate],
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """
+    Editor save: applies all node edits in one round trip (update_workflow_nodes_batch).
+    Only the fields sent for a node are written.
+    """
+    try:
+        user_id = current_user.get("sub")
+        real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+        active = await repo.get_active_workflow(real_team_id)
+        if not (active and active["workflow_id"] == workflow_id) and not await repo.get_workflow_by_id(workflow_id, real_team_id):
+            raise HTTPException(status_code=404, detail="Workflow not found")
+
+        results = await repo.update_workflow_nodes_batch(workflow_id, [n.model_dump(exclude_unset=True) for n in nodes])
+        return {
+            "success": True,
+            "workflow_id": workflow_id,
+            "updated": sum(1 for r in results if r["updated"]),
+            "nodes": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Workflow Node Update Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{team_id}/{workflow_id}/shadow")
+async def start_shadow(
+    team_id: str,
+    workflow_id: str,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """Evaluates incoming signals against this version too (shadow mode), replacing any previous candidate"""
+    user_id = current_user.get("sub")
+    real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+    workflow = await repo.get_workflow_by_id(workflow_id, real_team_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    if workflow.get("is_active"):
+        raise HTTPException(status_code=400, detail="Workflow is already active")
+    if not await repo.set_shadow_workflow(real_team_id, workflow_id):
+        raise HTTPException(status_code=500, detail="Failed to start shadow mode")
+    return {"success": True, "shadow_workflow_id": workflow_id}
+
+@router.delete("/{team_id}/shadow")
+async def stop_shadow(
+    team_id: str,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """Ends shadow mode; recorded decisions stay available through ?workflow_id= on the report"""
+    user_id = current_user.get("sub")
+    real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+    if not await repo.set_shadow_workflow(real_team_id, None):
+        raise HTTPException(status_code=500, detail="Failed to stop shadow mode")
+    return {"success": True}
+
+@router.post("/{team_id}/shadow/promote")
+async def promote_shadow(
+    team_id: str,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """Makes the shadow workflow the active one"""
+    try:
+        user_id = current_user.get("sub")
+        real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+        workflow_id = await repo.promote_shadow_workflow(real_team_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not workflow_id:
+        raise HTTPException(status_code=404, detail="No shadow workflow")
+    return {"success": True, "workflow_id": workflow_id}
+
+@router.get("/{team_id}/shadow/report")
+async def shadow_report(
+    team_id: str,
+    workflow_id: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    all: bool = False,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """
+    Diff report of the shadow workflow (or an earlier candidate, ?workflow_id=) against the active one:
+    counts, plus the signals that would have fired differently, newest first (?all=true: every decision).
+    """
+    try:
+        user_id = current_user.get("sub")
+        real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+        report = await get_shadow_report(real_team_id, workflow_id, limit, cursor, differs_only=not all)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report is None:
+        raise HTTPException(status_code=404, detail="No shadow workflow")
+    return report
+
 @router.get("/{team_id}/history")
-def get_history(team_id: str, limit: int = 10, current_user: dict = Depends(get_current_user)):
+async def get_history(
+    team_id: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repo: AsyncPersistenceRepository = Depends(get_async_repository)
+):
+    """Workflow versions, newest first, keyset-paged via next_cursor (?format=ndjson streams all)"""
     try:
-        repo = PersistenceRepository()
         user_id = current_user.get("sub")
-        real_team_id = repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
-        
-        history = repo.get_workflow_history(real_team_id, limit)
-        return {"history": history}
+        real_team_id = await repo.get_or_create_team(f"Team {user_id[:4]}", user_id)
+
+        if format == "ndjson":
+            return ndjson_response(repo.iter_listing("workflows", real_team_id), "workflow_history.ndjson")
+        page = await repo.get_workflow_history(real_team_id, limit, cursor)
+        return {"history": page["items"], "next_cursor": page["next_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
          raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,163 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.repositories.persistence import get_repository
+from app.services.tracing import stage_metrics
+
+# Columns written for every row, so each flush is one uniform bulk upsert
+AUDIT_COLUMNS = ("id", "team_id", "trigger_type", "status", "model_config", "started_at", "completed_at")
+TERMINAL_STATUSES = ("completed", "failed", "skipped")
+
+AUDIT_FLUSH_SIZE = int(os.environ.get("AUDIT_FLUSH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_MAX_BUFFER = int(os.environ.get("AUDIT_MAX_BUFFER", "10000"))
+
+
+class AuditWriter:
+    """
+    Write-behind buffer for inference_runs audit rows.
+    start() hands out a client-generated run id without touching the DB; finish() merges into the
+    buffered row, so a run that starts and ends between two flushes is written once.
+    A background thread upserts dirty rows when AUDIT_FLUSH_SIZE are pending or every
+    AUDIT_FLUSH_INTERVAL seconds; close() flushes what is left on shutdown.
+    """
+
+    def __init__(self, flush_size: int = AUDIT_FLUSH_SIZE, interval: float = AUDIT_FLUSH_INTERVAL, max_buffer: int = AUDIT_MAX_BUFFER):
+        self.flush_size = flush_size
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self._runs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # run_id -> full row (open or dirty)
+        self._dirty: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.stats_counters = {"started": 0, "finished": 0, "coalesced": 0, "flushes": 0, "rows_written": 0, "failed_flushes": 0, "dropped": 0}
+
+    # --- Producer side (evaluation path, no I/O) ---
+    def start(self, team_id: str, trigger_type: str, model_config: Optional[Dict] = None, status: str = "processing") -> str:
+        run_id = str(uuid.uuid4())
+        row = {
+            "id": run_id,
+            "team_id": team_id,
+            "trigger_type": trigger_type,
+            "status": status,
+            "model_config": dict(model_config or {}),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "completed_at": None
+        }
+        with self._lock:
+            self._runs[run_id] = row
+            self._mark_dirty(run_id)
+            self.stats_counters["started"] += 1
+        self._ensure_thread()
+        return run_id
+
+    def finish(self, run_id: str, status: str, model_config: Optional[Dict] = None, **fields: Any):
+        """Sets the terminal status; model_config keys are merged into the started config (only deltas needed)"""
+        with self._lock:
+            row = self._runs.get(run_id)
+            if row is None:
+                print(f"[Audit] Unknown or already evicted run {run_id}; finish dropped")
+                self.stats_counters["dropped"] += 1
+                return
+            if run_id in self._dirty:
+                self.stats_counters["coalesced"] += 1
+            row.update(fields)
+            row["status"] = status
+            row["completed_at"] = datetime.now(timezone.utc).isoformat()
+            if model_config:
+                row["model_config"] = {**row["model_config"], **model_config}
+            self._mark_dirty(run_id)
+            self.stats_counters["finished"] += 1
+
+    def _mark_dirty(self, run_id: str):
+        self._dirty[run_id] = None
+        self._dirty.move_to_end(run_id)
+        if len(self._dirty) >= self.flush_size:
+            self._wakeup.set()
+        while len(self._runs) > self.max_buffer:
+            # DB unreachable for long enough to fill the buffer: shed the oldest record
+            oldest, _ = self._runs.popitem(last=False)
+            self._dirty.pop(oldest, None)
+            self.stats_counters["dropped"] += 1
+
+    # --- Flushing ---
+    def flush(self) -> int:
+        """Writes all dirty rows in one upsert per AUDIT_FLUSH_SIZE batch. Returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch_ids = list(self._dirty)
+                rows = [{c: self._runs[r][c] for c in AUDIT_COLUMNS} for r in batch_ids]
+                self._dirty.clear()
+            if not rows:
+                return 0
+
+            written: List[str] = []
+            start = time.perf_counter()
+            try:
+                repo = get_repository()
+                for i in range(0, len(rows), self.flush_size):
+                    chunk = rows[i:i + self.flush_size]
+                    repo.db.table("inference_runs").upsert(chunk, on_conflict="id").execute()
+                    written.extend(r["id"] for r in chunk)
+            except Exception as e:
+                print(f"[DB Error] Audit Flush ({len(rows) - len(written)} rows re-queued): {e}")
+                self.stats_counters["failed_flushes"] += 1
+            # Off the request path, but the DB write the audit stage of an evaluation stands for
+            stage_metrics.observe("audit_flush", (time.perf_counter() - start) * 1000)
+
+            with self._lock:
+                self.stats_counters["flushes"] += 1
+                self.stats_counters["rows_written"] += len(written)
+                written_ids = set(written)
+                for run_id, row in zip(batch_ids, rows):
+                    current = self._runs.get(run_id)
+                    if current is None:
+                        continue
+                    if run_id not in written_ids:
+                        self._dirty.setdefault(run_id, None)
+                    elif current["status"] in TERMINAL_STATUSES and run_id not in self._dirty:
+                        # Written in its final state; nothing else will touch it
+                        del self._runs[run_id]
+            return len(written)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[Audit] Flush loop error: {e}")
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def close(self):
+        """Stops the background thread and flushes everything still buffered"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats_counters, "buffered": len(self._runs), "dirty": len(self._dirty)}
+
+
+audit_writer = AuditWriter()
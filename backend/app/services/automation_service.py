@@ -1,4 +1,4 @@
-from app.repositories.persistence import PersistenceRepository
+from app.repositories.persistence import get_repository
 
 # BOOT TRACE
 print("[BOOT] Loading automation_service body...", flush=True)
@@ -6,7 +6,7 @@ print("[BOOT] Loading automation_service body...", flush=True)
 def run_automation_logic(team_id, action, params):
     print(f"Auto Service executing: {team_id} {action}")
     try:
-        repo = PersistenceRepository()
+        repo = get_repository()
         # Just verifying DB access
         # Ensure we don't crash loop
         return {"success": True, "message": "Automation Service Active (DB Connected)", "team": team_id}
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+LLM_BATCH_WINDOW_MS = float(os.environ.get("LLM_BATCH_WINDOW_MS", "50"))
+LLM_BATCH_MAX_SIZE = int(os.environ.get("LLM_BATCH_MAX_SIZE", "10"))
+
+Decision = Tuple[Optional[Dict], float, str]
+BatchMatchFn = Callable[[List[Tuple[str, str]], list], List[Decision]]
+
+
+class _Batch:
+    __slots__ = ("nodes", "items", "futures", "timer")
+
+    def __init__(self, nodes: list):
+        self.nodes = nodes
+        self.items: List[Tuple[str, str]] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class BatchEvaluator:
+    """
+    Micro-batches LLM trigger matches on the async evaluation path.
+    Signals for the same (team, workflow, candidate nodes) arriving within window_ms of the first
+    one, up to max_size, are decided by a single match_fn call (one structured prompt); each caller
+    gets back its own (matched_node, confidence, reasoning). A lone signal still goes out after
+    the window as a normal single-signal request. window_ms <= 0 or max_size <= 1 disables batching.
+    """
+
+    def __init__(self, match_fn: BatchMatchFn, window_ms: float = LLM_BATCH_WINDOW_MS, max_size: int = LLM_BATCH_MAX_SIZE):
+        self.match_fn = match_fn
+        self.window = window_ms / 1000.0
+        self.max_size = max_size
+        self._open: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, _Batch]]" = weakref.WeakKeyDictionary()
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self.counters = {"signals": 0, "batches": 0, "max_batch": 0, "failed_batches": 0}
+
+    async def match(self, team_id: str, workflow_id: str, signal_text: str, nodes: list, context_text: str = "") -> Decision:
+        if self.window <= 0 or self.max_size <= 1:
+            return (await asyncio.to_thread(self.match_fn, [(signal_text, context_text)], nodes))[0]
+
+        loop = asyncio.get_running_loop()
+        open_batches = self._open.get(loop)
+        if open_batches is None:
+            open_batches = self._open.setdefault(loop, {})
+        # Nodes are part of the key so a batch never mixes two versions of the same workflow
+        key = (team_id, workflow_id, tuple((n.get("id"), repr(n.get("data"))) for n in nodes))
+        batch = open_batches.get(key)
+        if batch is None:
+            batch = open_batches[key] = _Batch(nodes)
+            batch.timer = loop.call_later(self.window, self._dispatch, open_batches, key, batch)
+
+        future = loop.create_future()
+        batch.items.append((signal_text, context_text))
+        batch.futures.append(future)
+        if len(batch.items) >= self.max_size:
+            batch.timer.cancel()
+            self._dispatch(open_batches, key, batch)
+        return await future
+
+    def _dispatch(self, open_batches: Dict[Tuple, _Batch], key: Tuple, batch: _Batch):
+        if open_batches.get(key) is batch:
+            del open_batches[key]
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _Batch):
+        size = len(batch.items)
+        error: Optional[Exception] = None
+        try:
+            results = await asyncio.to_thread(self.match_fn, batch.items, batch.nodes)
+            if len(results) != size:
+                raise ValueError(f"match_fn returned {len(results)} decisions for {size} signals")
+        except Exception as e:
+            # Every caller gets the original exception, so it can tell a rate limit from a bad request
+            print(f"[Batch Evaluator] Batch of {size} failed: {e}")
+            error, results = e, [None] * size
+            with self._lock:
+                self.counters["failed_batches"] += 1
+
+        with self._lock:
+            self.counters["signals"] += size
+            self.counters["batches"] += 1
+            self.counters["max_batch"] = max(self.counters["max_batch"], size)
+        for future, result in zip(batch.futures, results):
+            if future.done():  # The caller may have been cancelled
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "window_ms": self.window * 1000.0,
+            "max_size": self.max_size,
+            "avg_batch": round(counters["signals"] / counters["batches"], 2) if counters["batches"] else 0.0,
+            "in_flight": len(self._tasks),
+        }
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.repositories.cache import LRUCache
+from app.repositories.persistence import node_auto_run_enabled, workflow_cache
+
+DECISION_CACHE_ENABLED = os.environ.get("DECISION_CACHE_ENABLED", "true").lower() == "true"
+DECISION_CACHE_SIZE = int(os.environ.get("DECISION_CACHE_SIZE", "5000"))
+DECISION_CACHE_TTL = float(os.environ.get("DECISION_CACHE_TTL", "600"))
+
+# Volatile parts of alert text that should not make two otherwise identical signals distinct.
+# Short numbers (status codes, ports) are kept: "502 on login" and "504 on login" differ.
+_NORMALIZERS = (
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"<@[A-Z0-9]+>|<#[A-Z0-9|a-z_-]+>"), "<mention>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I), "<id>"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[t ]?[\d:.]*z?\b", re.I), "<time>"),
+    (re.compile(r"\b\d{1,2}:\d{2}(:\d{2})?\b"), "<time>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{7,}\b", re.I), "<id>"),
+    (re.compile(r"\b\d{4,}\b"), "<n>"),
+)
+_WHITESPACE = re.compile(r"\s+")
+
+Decision = Tuple[Optional[Dict], float, str]
+
+
+def normalize_signal_text(text: str) -> str:
+    """'Deploy FAILED: build 48213 https://ci/x' -> 'deploy failed: build <n> <url>'"""
+    text = (text or "").strip()
+    for pattern, placeholder in _NORMALIZERS:
+        text = pattern.sub(placeholder, text)
+    return _WHITESPACE.sub(" ", text.lower()).strip(" .!?")
+
+
+class DecisionCache:
+    """
+    LRU + TTL cache of LLM trigger decisions.
+    Key: (team, active workflow id) plus a digest of the workflow version, the auto-pilot node set,
+    the normalized signal text and the retrieved context, so any change to what the LLM would see
+    misses. Entries for a workflow are also dropped as soon as WorkflowCache reports a write.
+    Only decisions are stored: LLM errors are raised by decide_async and never reach the cache.
+    """
+
+    def __init__(self, maxsize: int = DECISION_CACHE_SIZE, ttl: float = DECISION_CACHE_TTL, enabled: bool = DECISION_CACHE_ENABLED):
+        self.enabled = enabled
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def key(self, team_id: str, workflow: Dict[str, Any], signal_text: str, context_text: str) -> Tuple[str, str, str]:
+        nodes = sorted(
+            [n.get("id"), (n.get("data") or {}).get("label"), (n.get("data") or {}).get("description")]
+            for n in workflow.get("nodes", []) if node_auto_run_enabled(n)
+        )
+        digest = hashlib.sha256(json.dumps([
+            workflow.get("version"),
+            nodes,
+            normalize_signal_text(signal_text),
+            hashlib.sha256((context_text or "").encode("utf-8")).hexdigest()
+        ], default=str).encode("utf-8")).hexdigest()
+        return team_id, workflow.get("workflow_id"), digest
+
+    def get(self, key: Tuple[str, str, str], nodes: List[Dict[str, Any]]) -> Optional[Decision]:
+        """Cached (matched_node, confidence, reasoning), resolved against the current nodes; None on a miss"""
+        if not self.enabled:
+            return None
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        node_id, confidence, reasoning = entry
+        matched_node = next((n for n in nodes if n.get("id") == node_id), None) if node_id else None
+        return matched_node, confidence, reasoning
+
+    def set(self, key: Tuple[str, str, str], decision: Decision):
+        matched_node, confidence, reasoning = decision
+        if not self.enabled:
+            return
+        self._cache.set(key, (matched_node.get("id") if matched_node else None, confidence, reasoning))
+
+    def invalidate(self, team_id: Optional[str] = None, workflow_id: Optional[str] = None):
+        """WorkflowCache listener: drops the entries of a team / workflow (everything if both are None)"""
+        if team_id is None and workflow_id is None:
+            self._cache.clear()
+            return
+        for key, _ in self._cache.items():
+            if key[0] == team_id or key[1] == workflow_id:
+                self._cache.pop(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "enabled": self.enabled}
+
+
+decision_cache = DecisionCache()
+workflow_cache.add_listener(decision_cache.invalidate)
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+SCHEDULER_MAX_CONCURRENCY = int(os.environ.get("SCHEDULER_MAX_CONCURRENCY", "16"))
+SCHEDULER_TEAM_CONCURRENCY = int(os.environ.get("SCHEDULER_TEAM_CONCURRENCY", "2"))
+# Waiting evaluations per team before new ones are shed (deferred)
+SCHEDULER_TEAM_MAX_BACKLOG = int(os.environ.get("SCHEDULER_TEAM_MAX_BACKLOG", "50"))
+# "team_id=weight,team_id=weight"; teams not listed weigh 1
+SCHEDULER_TEAM_WEIGHTS = os.environ.get("SCHEDULER_TEAM_WEIGHTS", "")
+
+# Recent waits kept per team for the wait-time percentiles
+_WAIT_SAMPLES = 200
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for part in spec.split(","):
+        team_id, _, weight = part.strip().partition("=")
+        if team_id and weight:
+            weights[team_id] = float(weight)
+    return weights
+
+
+class SchedulerOverloaded(Exception):
+    """The team's backlog is full; the evaluation was not queued"""
+
+
+class _Item:
+    __slots__ = ("fn", "future", "enqueued_at", "task")
+
+    def __init__(self, fn: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.fn = fn
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+
+class _Team:
+    __slots__ = ("queue", "running", "vtag", "waits", "counters")
+
+    def __init__(self):
+        self.queue: Deque[_Item] = deque()
+        self.running = 0
+        self.vtag = 0.0
+        self.waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "shed": 0}
+
+
+class FairScheduler:
+    """
+    Admission control in front of Auto-Pilot evaluation (one instance per event loop).
+    At most max_concurrency evaluations run at once and at most team_concurrency per team.
+    When a slot frees up the next team is picked by weighted fair queuing (start-time fair
+    queuing: each dispatch advances the team's virtual clock by 1/weight and the team with the
+    lowest clock goes next), so a team flooding the scheduler only delays itself.
+    A team with max_backlog evaluations already waiting gets SchedulerOverloaded instead.
+    """
+
+    def __init__(self, max_concurrency: int = SCHEDULER_MAX_CONCURRENCY, team_concurrency: int = SCHEDULER_TEAM_CONCURRENCY,
+                 max_backlog: int = SCHEDULER_TEAM_MAX_BACKLOG, weights: Optional[Dict[str, float]] = None):
+        self.max_concurrency = max_concurrency
+        self.team_concurrency = team_concurrency
+        self.max_backlog = max_backlog
+        self.weights = parse_weights(SCHEDULER_TEAM_WEIGHTS) if weights is None else dict(weights)
+        self._teams: Dict[str, _Team] = {}
+        self._running = 0
+        self._vtime = 0.0
+
+    def set_weight(self, team_id: str, weight: float):
+        self.weights[team_id] = weight
+
+    def backlog(self, team_id: str) -> int:
+        team = self._teams.get(team_id)
+        return len(team.queue) if team else 0
+
+    async def run(self, team_id: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Runs fn() once the team gets a slot; raises SchedulerOverloaded if its backlog is full"""
+        team = self._teams.get(team_id)
+        if team is None:
+            team = self._teams[team_id] = _Team()
+        if len(team.queue) >= self.max_backlog:
+            team.counters["shed"] += 1
+            raise SchedulerOverloaded(f"team {team_id} has {len(team.queue)} evaluations waiting")
+
+        if not team.queue and team.running == 0:
+            # Idle teams rejoin at the current virtual time: no credit for having been quiet
+            team.vtag = max(team.vtag, self._vtime)
+        item = _Item(fn, asyncio.get_running_loop().create_future())
+        team.queue.append(item)
+        team.counters["submitted"] += 1
+        self._dispatch()
+        try:
+            return await item.future
+        except asyncio.CancelledError:
+            if item.task is not None:
+                item.task.cancel()
+            raise
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            team_id, team = self._next_team()
+            if team is None:
+                return
+            item = team.queue.popleft()
+            if item.future.cancelled():
+                continue
+            self._vtime = team.vtag
+            team.vtag += 1.0 / max(self.weights.get(team_id, 1.0), 1e-6)
+            team.running += 1
+            self._running += 1
+            team.waits.append(time.monotonic() - item.enqueued_at)
+            item.task = item.future.get_loop().create_task(self._execute(team, item))
+
+    def _next_team(self):
+        best_id, best = None, None
+        for team_id, team in self._teams.items():
+            if team.queue and team.running < self.team_concurrency and (best is None or team.vtag < best.vtag):
+                best_id, best = team_id, team
+        return best_id, best
+
+    async def _execute(self, team: _Team, item: _Item):
+        try:
+            result = await item.fn()
+            team.counters["completed"] += 1
+            if not item.future.done():
+                item.future.set_result(result)
+        except BaseException as e:
+            team.counters["failed"] += 1
+            if not item.future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    item.future.cancel()
+                else:
+                    item.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            team.running -= 1
+            self._running -= 1
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        teams = {}
+        for team_id, team in self._teams.items():
+            waits = sorted(team.waits)
+            teams[team_id] = {
+                **team.counters,
+                "queued": len(team.queue),
+                "running": team.running,
+                "weight": self.weights.get(team_id, 1.0),
+                "oldest_wait_ms": round((now - team.queue[0].enqueued_at) * 1000, 1) if team.queue else 0.0,
+                "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+            }
+        return {
+            "running": self._running,
+            "queued": sum(len(t.queue) for t in self._teams.values()),
+            "max_concurrency": self.max_concurrency,
+            "team_concurrency": self.team_concurrency,
+            "max_backlog": self.max_backlog,
+            "teams": teams,
+        }
+
+
+evaluation_scheduler = FairScheduler()
@@ -2,7 +2,7 @@ import os
 import requests
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
-from app.repositories.persistence import PersistenceRepository
+from app.repositories.persistence import get_repository
 
 # LAZY LOADING PATTERN:
 # All heavy external libraries (slack_sdk, jira, google) must be imported INSIDE the function.
@@ -82,7 +82,7 @@ def fetch_all_events(team_id: str) -> List[Dict]:
     """
     events = []
     try:
-        repo = PersistenceRepository()
+        repo = get_repository()
         configs = repo.get_team_integrations(team_id)
         
         print(f"[Integrations] Found {len(configs)} configs for team {team_id}")
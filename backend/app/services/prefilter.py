@@ -0,0 +1,199 @@
+import hashlib
+import math
+import os
+import random
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from operator import mul
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.embedding_profile import get_embedding_profile
+from app.repositories.cache import LRUCache
+from app.repositories.persistence import node_auto_run_enabled
+from app.services.audit_writer import audit_writer
+from app.services.workflow_inference import generate_embeddings
+
+PREFILTER_ENABLED = os.environ.get("PREFILTER_ENABLED", "true").lower() == "true"
+# A signal reaches the LLM if its best node scores at least this much (embedding cosine or keyword overlap)
+PREFILTER_MIN_SCORE = float(os.environ.get("PREFILTER_MIN_SCORE", "0.3"))
+# Share of skipped signals re-checked by the LLM in the background to measure false negatives
+PREFILTER_AUDIT_RATE = float(os.environ.get("PREFILTER_AUDIT_RATE", "0.02"))
+PREFILTER_AUDIT_SAMPLES = int(os.environ.get("PREFILTER_AUDIT_SAMPLES", "50"))
+NODE_PROFILE_CACHE_SIZE = int(os.environ.get("NODE_PROFILE_CACHE_SIZE", "2048"))
+
+# Shared keywords needed for a full keyword score
+KEYWORD_SATURATION = 4
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can could do does for from has have hey hi how i if in into is it its "
+    "just let me my no not of on or our please so some that the their them then there these they this to "
+    "up us was we were what when where which who will with would you your".split()
+)
+
+
+def keywords(text: str) -> Set[str]:
+    """Lower-cased content words with plural/verb suffixes trimmed ("tickets" -> "ticket")"""
+    words = set()
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if len(token) < 3 or token in _STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "es", "s"):
+            if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                token = token[:-len(suffix)]
+                break
+        words.add(token)
+    return words
+
+
+def node_text(node: Dict[str, Any]) -> str:
+    data = node.get("data") or {}
+    return f"{data.get('label') or ''}. {data.get('description') or ''}".strip(". ")
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return sum(map(mul, a, b)) / norm if norm else 0.0
+
+
+class SignalPrefilter:
+    """
+    Local relevance screen in front of the LLM trigger match.
+    Each auto-pilot node gets a cached profile (keywords + embedding of its label and description,
+    keyed by content fingerprint so edits re-profile automatically). A signal whose best node scores
+    below min_score is answered as "no match" without calling the LLM or the RAG lookup.
+    If the signal embedding is unavailable the screen fails open.
+    A sample of skipped signals is re-checked by the LLM off the request path; matches it would
+    have executed are counted as false negatives and written to the audit log.
+    """
+
+    def __init__(self, min_score: float = PREFILTER_MIN_SCORE, audit_rate: float = PREFILTER_AUDIT_RATE, enabled: bool = PREFILTER_ENABLED):
+        self.min_score = min_score
+        self.audit_rate = audit_rate
+        self.enabled = enabled
+        self.profiles = LRUCache(maxsize=NODE_PROFILE_CACHE_SIZE)
+        self.false_negative_samples: Deque[Dict[str, Any]] = deque(maxlen=PREFILTER_AUDIT_SAMPLES)
+        self._lock = threading.Lock()
+        self._audit_pool: Optional[ThreadPoolExecutor] = None
+        self.counters = {"checked": 0, "passed": 0, "skipped": 0, "fail_open": 0, "audited": 0, "false_negatives": 0}
+
+    # --- Node profiles ---
+    def node_profiles(self, nodes: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(node, {"keywords", "vector"}) for each node; missing profiles are embedded in one request"""
+        profile = get_embedding_profile()
+        keyed = []
+        for node in nodes:
+            text = node_text(node)
+            keyed.append((node, text, (profile["name"], hashlib.sha256(text.encode("utf-8")).hexdigest())))
+
+        missing = {key: text for _, text, key in keyed if self.profiles.get(key) is None}
+        if missing:
+            vectors = generate_embeddings(list(missing.values()), profile) or []
+            for (key, text), vector in zip(missing.items(), vectors):
+                self.profiles.set(key, {"keywords": keywords(text), "vector": vector if vector and any(vector) else None})
+        # Profiles are re-read rather than taken from `missing`, so a racing writer is harmless
+        return [(node, self.profiles.get(key, record=False) or {"keywords": keywords(text), "vector": None}) for node, text, key in keyed]
+
+    # --- Screening ---
+    def check(self, signal_text: str, nodes: List[Dict[str, Any]], signal_vector: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Returns {"passed", "reason", "score", "node_id", "vector"}.
+        "vector" is the signal embedding (reusable for the RAG lookup), None if it was not computed.
+        """
+        candidates = [n for n in nodes if node_auto_run_enabled(n)]
+        if not candidates:
+            return {"passed": False, "reason": "no_auto_pilot_nodes", "score": 0.0, "node_id": None, "vector": signal_vector}
+        if not self.enabled:
+            return {"passed": True, "reason": "disabled", "score": None, "node_id": None, "vector": signal_vector}
+
+        if signal_vector is None:
+            vectors = generate_embeddings([signal_text])
+            signal_vector = vectors[0] if vectors else None
+        if not signal_vector or not any(signal_vector):
+            with self._lock:
+                self.counters["checked"] += 1
+                self.counters["fail_open"] += 1
+            return {"passed": True, "reason": "embedding_unavailable", "score": None, "node_id": None, "vector": None}
+
+        signal_keywords = keywords(signal_text)
+        best_score, best_node = 0.0, None
+        for node, profile in self.node_profiles(candidates):
+            keyword_score = 0.0
+            if profile["keywords"]:
+                keyword_score = min(1.0, len(signal_keywords & profile["keywords"]) / min(len(profile["keywords"]), KEYWORD_SATURATION))
+            embedding_score = _cosine(signal_vector, profile["vector"]) if profile["vector"] else 0.0
+            score = max(keyword_score, embedding_score)
+            if score > best_score:
+                best_score, best_node = score, node
+
+        passed = best_score >= self.min_score
+        with self._lock:
+            self.counters["checked"] += 1
+            self.counters["passed" if passed else "skipped"] += 1
+        return {
+            "passed": passed,
+            "reason": "above_floor" if passed else "below_floor",
+            "score": round(best_score, 4),
+            "node_id": best_node.get("id") if best_node else None,
+            "vector": signal_vector
+        }
+
+    # --- False-negative audit ---
+    def maybe_audit(self, team_id: str, signal_text: str, nodes: List[Dict[str, Any]], screen: Dict[str, Any],
+                    match_fn: Callable[[str, list, str], Tuple[Optional[Dict], float, str]], threshold: float):
+        """Samples a skipped signal for a background LLM re-check (record only, never executes)"""
+        if screen["reason"] != "below_floor" or random.random() >= self.audit_rate:
+            return
+        if self._audit_pool is None:
+            with self._lock:
+                if self._audit_pool is None:
+                    self._audit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefilter-audit")
+        self._audit_pool.submit(self._audit, team_id, signal_text, nodes, screen, match_fn, threshold)
+
+    def _audit(self, team_id: str, signal_text: str, nodes: List[Dict[str, Any]], screen: Dict[str, Any],
+               match_fn: Callable[[str, list, str], Tuple[Optional[Dict], float, str]], threshold: float):
+        try:
+            matched_node, confidence, reasoning = match_fn(signal_text, nodes, "")
+        except Exception as e:
+            print(f"[Prefilter] Audit error: {e}")
+            return
+        missed = matched_node is not None and confidence >= threshold
+        with self._lock:
+            self.counters["audited"] += 1
+            if missed:
+                self.counters["false_negatives"] += 1
+        if not missed:
+            return
+
+        sample = {
+            "signal_text": signal_text[:500],
+            "prefilter_score": screen["score"],
+            "prefilter_node_id": screen["node_id"],
+            "llm_node_id": matched_node.get("id"),
+            "llm_node": (matched_node.get("data") or {}).get("label"),
+            "llm_confidence": confidence,
+            "reasoning": reasoning,
+            "min_score": self.min_score
+        }
+        self.false_negative_samples.append(sample)
+        print(f"[Prefilter] False negative: score {screen['score']} but LLM matched '{sample['llm_node']}' ({confidence})")
+        audit_writer.finish(audit_writer.start(team_id, "prefilter_false_negative", sample), "completed")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            samples = list(self.false_negative_samples)
+        screened = counters["passed"] + counters["skipped"]
+        return {
+            **counters,
+            "enabled": self.enabled,
+            "min_score": self.min_score,
+            "skip_rate": round(counters["skipped"] / screened, 4) if screened else 0.0,
+            "false_negative_rate": round(counters["false_negatives"] / counters["audited"], 4) if counters["audited"] else 0.0,
+            "node_profiles": self.profiles.stats(),
+            "false_negative_samples": samples
+        }
+
+
+prefilter = SignalPrefilter()
@@ -1,41 +1,60 @@
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from app.core.embedding_profile import embedding_fields, get_embedding_profile
 from app.services.workflow_inference import generate_embeddings
-from app.repositories.persistence import PersistenceRepository
-from typing import List, Dict, Optional
+from app.repositories.persistence import PersistenceRepository, get_repository
+from app.repositories.async_persistence import get_async_repository
+from typing import Any, List, Dict, Optional
 
 from datetime import datetime, timezone
 
+# Inputs per embeddings request during batch ingest
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "256"))
+_KNOWLEDGE_ID_NAMESPACE = uuid.UUID("6f1c7d0e-3b1a-4c59-9a57-1d2f0b8e4a11")
+
+def knowledge_item_id(team_id: str, content: str, metadata: Dict) -> str:
+    """Deterministic knowledge_base id: the same document ingested twice maps to the same row"""
+    digest = hashlib.sha256(
+        json.dumps([team_id, content, metadata], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return str(uuid.uuid5(_KNOWLEDGE_ID_NAMESPACE, digest))
+
 class RAGService:
-    def __init__(self):
-        self.repo = PersistenceRepository()
+    def __init__(self, repo: Optional[PersistenceRepository] = None):
+        self.repo = repo or get_repository()
 
-    def add_documents_batch(self, team_id: str, items: List[Dict]) -> int:
+    def add_documents_batch(self, team_id: str, items: List[Dict]) -> Dict[str, Any]:
         """
         Batch ingest items.
         items: [{ "content": str, "metadata": dict }, ...]
+        Row ids are derived from (team, content, metadata), so re-running a backfill never duplicates.
+        Transient errors are already retried per chunk; chunks that still failed are reported as
+        index ranges into `items` so the caller can resubmit just that slice.
+        Returns {"inserted", "committed": [[start, end], ...], "failed": [{"start", "end", "error"}, ...]}
         """
-        if not items: return 0
-        
-        texts = [i["content"] for i in items]
-        # In case texts is huge, generate_embeddings might need chunking too.
-        # But our loop below handles 100 rows.
-        # Let's hope generate_embeddings handles list of reasonable size or we should chunk here.
-        
-        vectors = generate_embeddings(texts)
-        
-        if not vectors or len(vectors) != len(items):
-             # Fallback/Error?
-             return 0
+        if not items:
+            return {"inserted": 0, "committed": [], "failed": []}
 
+        profile = get_embedding_profile()
         rows = []
-        for idx, item in enumerate(items):
-            rows.append({
-                "team_id": team_id,
-                "content": item["content"],
-                "embedding": vectors[idx],
-                "metadata": item["metadata"],
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
-            
+        for offset in range(0, len(items), EMBEDDING_BATCH_SIZE):
+            batch = items[offset:offset + EMBEDDING_BATCH_SIZE]
+            vectors = generate_embeddings([i["content"] for i in batch], profile)
+            if not vectors or len(vectors) != len(batch):
+                raise Exception(f"Failed to generate embeddings for items {offset}-{offset + len(batch)}")
+            for item, vector in zip(batch, vectors):
+                rows.append({
+                    "id": knowledge_item_id(team_id, item["content"], item.get("metadata") or {}),
+                    "team_id": team_id,
+                    "content": item["content"],
+                    **embedding_fields(vector, profile),
+                    "metadata": item.get("metadata") or {},
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                })
+
         return self.repo.bulk_insert_knowledge(rows)
 
     def add_document(self, team_id: str, content: str, metadata: Dict = {}) -> str:
@@ -53,19 +72,41 @@ class RAGService:
             
         return self.repo.add_knowledge_item(team_id, content, vectors[0], metadata)
 
-    def search_context(self, team_id: str, query: str, limit: int = 3) -> List[Dict]:
+    def search_context(self, team_id: str, query: str, limit: int = 3, query_vector: Optional[List[float]] = None) -> List[Dict]:
         """
         Retrieve relevant context for a query.
+        Pass query_vector when the query was already embedded (e.g. by the trigger pre-filter).
         """
-        vectors = generate_embeddings([query])
+        vectors = [query_vector] if query_vector else generate_embeddings([query])
         if not vectors:
             return []
             
         return self.repo.search_knowledge_base(team_id, vectors[0], limit=limit)
 
-    def list_documents(self, team_id: str) -> List[Dict]:
-        """List all KB items for a team"""
-        return self.repo.get_knowledge_items(team_id)
+    async def add_document_async(self, team_id: str, content: str, metadata: Optional[Dict] = None) -> str:
+        """add_document on the async repository (the embeddings call runs in a worker thread)"""
+        if not content:
+            raise ValueError("Content cannot be empty")
+
+        vectors = await asyncio.to_thread(generate_embeddings, [content])
+        if not vectors:
+            raise Exception("Failed to generate embedding")
+
+        repo = await get_async_repository()
+        return await repo.add_knowledge_item(team_id, content, vectors[0], metadata or {})
+
+    async def search_context_async(self, team_id: str, query: str, limit: int = 3, query_vector: Optional[List[float]] = None) -> List[Dict]:
+        """search_context on the async repository"""
+        vectors = [query_vector] if query_vector else await asyncio.to_thread(generate_embeddings, [query])
+        if not vectors:
+            return []
+
+        repo = await get_async_repository()
+        return await repo.search_knowledge_base(team_id, vectors[0], limit=limit)
+
+    def list_documents(self, team_id: str, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """One page of KB items for a team: {"items", "next_cursor"}"""
+        return self.repo.get_knowledge_items(team_id, limit=limit, cursor=cursor)
 
     def delete_document(self, team_id: str, doc_id: str) -> bool:
         """Remove a document"""
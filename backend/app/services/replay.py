@@ -0,0 +1,275 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.embedding_profile import get_embedding_profile
+from app.repositories.async_persistence import get_async_repository
+from app.services.prefilter import SignalPrefilter, prefilter
+from app.services.rag_service import RAGService
+from app.services.trigger_engine import THRESHOLD, _format_context, decide_async
+from app.services.workflow_inference import generate_embeddings
+
+REPLAY_CONCURRENCY = int(os.environ.get("REPLAY_CONCURRENCY", "32"))
+REPLAY_PAGE_SIZE = int(os.environ.get("REPLAY_PAGE_SIZE", "200"))
+REPLAY_THRESHOLDS = (0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.99)
+
+# Below this an evaluation is noise and never audited (same cut-off as the live path)
+NOISE_CONFIDENCE = 0.1
+
+
+def _as_vector(value: Any) -> Optional[List[float]]:
+    """pgvector/halfvec columns come back from PostgREST as '[0.1,0.2,...]' strings"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return [float(x) for x in value] if value and any(value) else None
+
+
+def _replay_nodes(workflow: Dict[str, Any], all_nodes: bool) -> List[Dict[str, Any]]:
+    """The workflow's nodes; all_nodes=True treats every node as Auto-Pilot (candidate versions)"""
+    if not all_nodes:
+        return workflow["nodes"]
+    return [{**n, "auto_run_enabled": True} for n in workflow["nodes"]]
+
+
+def threshold_curve(decisions: List[Dict[str, Any]], thresholds: Sequence[float],
+                    labels: Optional[Dict[str, Optional[str]]] = None) -> List[Dict[str, Any]]:
+    """
+    One row per threshold: how many signals would fire and coverage (fired / evaluated).
+    With labels ({signal id or external id: expected node id, or None for "should not fire"})
+    also precision (fired on the labelled node / fired among labelled signals) and recall
+    (labelled positives fired on the right node / labelled positives). Without labels,
+    mean_confidence of the fired decisions is the only (self-reported) quality signal.
+    """
+    total = len(decisions)
+    labelled = [(d, labels[d["label_key"]]) for d in decisions if labels and d["label_key"] is not None]
+    positives = sum(1 for _, expected in labelled if expected)
+    curve = []
+    for threshold in sorted(thresholds):
+        fired = [d for d in decisions if d["node_id"] and d["confidence"] >= threshold]
+        row = {
+            "threshold": threshold,
+            "fired": len(fired),
+            "coverage": round(len(fired) / total, 4) if total else 0.0,
+            "mean_confidence": round(sum(d["confidence"] for d in fired) / len(fired), 4) if fired else None,
+            "precision": None,
+            "recall": None,
+        }
+        if labelled:
+            fired_labelled = [(d, e) for d, e in labelled if d["node_id"] and d["confidence"] >= threshold]
+            correct = sum(1 for d, e in fired_labelled if e == d["node_id"])
+            row["precision"] = round(correct / len(fired_labelled), 4) if fired_labelled else None
+            row["recall"] = round(correct / positives, 4) if positives else None
+        curve.append(row)
+    return curve
+
+
+def node_counts(decisions: List[Dict[str, Any]], nodes: List[Dict[str, Any]], threshold: float) -> Dict[str, Dict[str, Any]]:
+    """Per node: matches (any confidence above noise), fired at the threshold, average confidence"""
+    counts = {
+        n.get("id"): {"label": (n.get("data") or {}).get("label"), "matches": 0, "fired": 0, "confidence_sum": 0.0}
+        for n in nodes
+    }
+    for d in decisions:
+        entry = counts.get(d["node_id"])
+        if entry is None:
+            continue
+        entry["matches"] += 1
+        entry["confidence_sum"] += d["confidence"]
+        if d["confidence"] >= threshold:
+            entry["fired"] += 1
+    for entry in counts.values():
+        total = entry.pop("confidence_sum")
+        entry["avg_confidence"] = round(total / entry["matches"], 4) if entry["matches"] else None
+    return counts
+
+
+class ReplayEngine:
+    """
+    Dry-run replay of a team's historical raw_signals against one workflow version.
+    Signals are streamed page by page over a keyset range (the next page is fetched while the
+    current one is evaluated), stored embeddings are reused and missing ones are embedded one
+    request per page, and up to `concurrency` signals are decided at once through the same
+    decision cache and LLM micro-batching as live traffic. Nothing is executed or audited;
+    only the decisions are kept, to build the threshold curve and per-node counts.
+    """
+
+    def __init__(self, team_id: str, workflow_id: Optional[str] = None, since: Optional[str] = None,
+                 until: Optional[str] = None, concurrency: int = REPLAY_CONCURRENCY, page_size: int = REPLAY_PAGE_SIZE,
+                 thresholds: Sequence[float] = REPLAY_THRESHOLDS, labels: Optional[Dict[str, Optional[str]]] = None,
+                 all_nodes: bool = False, use_prefilter: bool = True, use_context: bool = True,
+                 max_signals: Optional[int] = None):
+        self.team_id = team_id
+        self.workflow_id = workflow_id
+        self.since = since
+        self.until = until
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.thresholds = tuple(thresholds)
+        self.labels = labels or {}
+        self.all_nodes = all_nodes
+        self.use_prefilter = use_prefilter
+        self.use_context = use_context
+        self.max_signals = max_signals
+        # Private screen: no false-negative audits, and live /metrics counters stay untouched
+        self.prefilter = SignalPrefilter(min_score=prefilter.min_score, audit_rate=0.0, enabled=prefilter.enabled)
+        self.decisions: List[Dict[str, Any]] = []
+        self.progress = {"signals": 0, "prefiltered": 0, "noise": 0, "errors": 0, "cache_hits": 0, "embedded": 0}
+        self._started = time.monotonic()
+
+    async def _fetch(self, repo, cursor: Optional[str]) -> Dict[str, Any]:
+        return await repo.get_signals_in_range(
+            self.team_id, self.since, self.until, limit=self.page_size, cursor=cursor, with_embedding=True
+        )
+
+    async def _vectors(self, rows: List[Dict[str, Any]], column: str) -> List[Optional[List[float]]]:
+        vectors = [_as_vector(r.get(column)) for r in rows]
+        missing = [i for i, v in enumerate(vectors) if v is None and rows[i].get("content")]
+        if missing:
+            embedded = await asyncio.to_thread(generate_embeddings, [rows[i]["content"] for i in missing]) or []
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector if vector and any(vector) else None
+            self.progress["embedded"] += len(missing)
+        return vectors
+
+    def _label_key(self, row: Dict[str, Any]) -> Optional[str]:
+        """Labels may name a signal by its id or by its source id (Slack ts, Jira key)"""
+        for key in (row["id"], row.get("external_id")):
+            if key in self.labels:
+                return key
+        return None
+
+    async def _evaluate(self, workflow: Dict[str, Any], row: Dict[str, Any], vector: Optional[List[float]]):
+        text = row.get("content") or ""
+        decision = {
+            "signal_id": row["id"],
+            "label_key": self._label_key(row),
+            "node_id": None,
+            "confidence": 0.0,
+        }
+        try:
+            if self.use_prefilter:
+                screen = await asyncio.to_thread(self.prefilter.check, text, workflow["nodes"], vector or [])
+                if not screen["passed"]:
+                    self.progress["prefiltered"] += 1
+                    self.decisions.append(decision)
+                    return
+            context_docs = []
+            if self.use_context and vector is not None:
+                context_docs = await RAGService().search_context_async(self.team_id, text, limit=3, query_vector=vector)
+            matched_node, confidence, reasoning, cached = await decide_async(
+                self.team_id, workflow, text, _format_context(context_docs)
+            )
+        except Exception as e:
+            print(f"[Replay] Signal {row['id']} failed: {e}")
+            self.progress["errors"] += 1
+            return
+        self.progress["cache_hits"] += int(cached)
+        if matched_node is not None and confidence > NOISE_CONFIDENCE:
+            decision.update({"node_id": matched_node.get("id"), "confidence": confidence})
+        else:
+            self.progress["noise"] += 1
+        self.decisions.append(decision)
+
+    async def run(self) -> Dict[str, Any]:
+        repo = await get_async_repository()
+        if self.workflow_id:
+            workflow = await repo.get_workflow_by_id(self.workflow_id, self.team_id)
+        else:
+            workflow = await repo.get_active_workflow(self.team_id)
+        if not workflow or not workflow.get("nodes"):
+            raise ValueError("Workflow not found" if self.workflow_id else "No active workflow")
+        workflow = {**workflow, "nodes": _replay_nodes(workflow, self.all_nodes)}
+        column = get_embedding_profile()["column"]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(row, vector):
+            async with semaphore:
+                await self._evaluate(workflow, row, vector)
+
+        next_page = asyncio.ensure_future(self._fetch(repo, None))
+        while next_page is not None:
+            page = await next_page
+            rows = page["items"]
+            if self.max_signals is not None:
+                rows = rows[:max(0, self.max_signals - self.progress["signals"])]
+            more = page["next_cursor"] and (self.max_signals is None or self.progress["signals"] + len(rows) < self.max_signals)
+            # Prefetch the next page while this one is evaluated
+            next_page = asyncio.ensure_future(self._fetch(repo, page["next_cursor"])) if more else None
+            vectors = await self._vectors(rows, column)
+            self.progress["signals"] += len(rows)
+            await asyncio.gather(*(bounded(row, vector) for row, vector in zip(rows, vectors)))
+            print(f"[Replay] {self.team_id}: {self.progress['signals']} signals replayed", flush=True)
+
+        return self.report(workflow)
+
+    def report(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        return {
+            "team_id": self.team_id,
+            "workflow_id": workflow["workflow_id"],
+            "workflow_title": workflow.get("title"),
+            "since": self.since,
+            "until": self.until,
+            "all_nodes": self.all_nodes,
+            "prefilter": self.use_prefilter,
+            "context": self.use_context,
+            **self.progress,
+            "evaluated": len(self.decisions),
+            "labelled": sum(1 for d in self.decisions if d["label_key"] is not None),
+            "elapsed_seconds": round(elapsed, 2),
+            "signals_per_second": round(self.progress["signals"] / elapsed, 2) if elapsed else None,
+            "current_threshold": THRESHOLD,
+            "curve": threshold_curve(self.decisions, self.thresholds, self.labels),
+            "nodes": node_counts(self.decisions, workflow["nodes"], THRESHOLD),
+        }
+
+
+async def run_replay(team_id: str, **options: Any) -> Dict[str, Any]:
+    """Replays a team's signals and returns the report (see ReplayEngine for the options)"""
+    return await ReplayEngine(team_id, **options).run()
+
+
+# Replays started through the API run as background tasks of this worker; the report is stored
+# on their inference_runs row (trigger_type "replay") so any worker can serve it.
+_running: Dict[str, ReplayEngine] = {}
+_tasks: set = set()
+
+
+async def start_replay(team_id: str, **options: Any) -> str:
+    """Starts a background replay and returns its run id"""
+    engine = ReplayEngine(team_id, **options)
+    repo = await get_async_repository()
+    config = {k: v for k, v in options.items() if k != "labels"}
+    config["labelled_signals"] = len(options.get("labels") or {})
+    run_id = await repo.create_inference_run(team_id, "replay", config)
+    _running[run_id] = engine
+
+    async def _run():
+        try:
+            report = await engine.run()
+            await repo.complete_inference_run(run_id, "completed", {**config, "report": report})
+        except Exception as e:
+            print(f"[Replay] Run {run_id} failed: {e}")
+            await repo.complete_inference_run(run_id, "failed", {**config, "error": str(e)})
+        finally:
+            _running.pop(run_id, None)
+
+    task = asyncio.ensure_future(_run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return run_id
+
+
+async def get_replay(run_id: str, team_id: str) -> Optional[Dict[str, Any]]:
+    """The replay's run row, with live progress while it is still running on this worker"""
+    repo = await get_async_repository()
+    run = await repo.get_inference_run(run_id, team_id)
+    if not run or run.get("trigger_type") != "replay":
+        return None
+    engine = _running.get(run_id)
+    if engine is not None:
+        run["progress"] = dict(engine.progress)
+    return run
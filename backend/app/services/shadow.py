@@ -0,0 +1,190 @@
+import asyncio
+import os
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.repositories.async_persistence import get_async_repository
+from app.services.prefilter import SignalPrefilter, prefilter
+
+SHADOW_ENABLED = os.environ.get("SHADOW_ENABLED", "true").lower() == "true"
+# Shadow evaluations deciding at once per worker (they queue behind this, never behind live traffic)
+SHADOW_CONCURRENCY = int(os.environ.get("SHADOW_CONCURRENCY", "4"))
+# Shadow evaluations waiting or running per worker before new ones are dropped
+SHADOW_MAX_PENDING = int(os.environ.get("SHADOW_MAX_PENDING", "200"))
+
+# Below this an evaluation is noise (same cut-off as the live path)
+NOISE_CONFIDENCE = 0.1
+
+DecideFn = Callable[[str, Dict[str, Any], str, str], Awaitable[Tuple[Optional[Dict], float, str, bool]]]
+
+
+def decision_outcome(matched_node: Optional[Dict], confidence: float, threshold: float) -> str:
+    """noise | below_threshold | fired ("prefiltered" is set by the caller)"""
+    if (confidence or 0.0) <= NOISE_CONFIDENCE:
+        return "noise"
+    if matched_node is not None and confidence >= threshold:
+        return "fired"
+    return "below_threshold"
+
+
+def decision_side(matched_node: Optional[Dict], confidence: float, outcome: str) -> Dict[str, Any]:
+    """One version's half of a shadow_decisions row"""
+    node = matched_node if outcome not in ("noise", "prefiltered") else None
+    return {
+        "outcome": outcome,
+        "node_id": node.get("id") if node else None,
+        "node_label": (node.get("data") or {}).get("label") if node else None,
+        "confidence": float(confidence or 0.0),
+    }
+
+
+def decisions_differ(active: Dict[str, Any], shadow: Dict[str, Any]) -> bool:
+    """
+    True if only one version would fire, or both would fire different nodes. Nodes are compared
+    by label: step ids are renumbered between versions, and the label is what the action is planned from.
+    """
+    active_fired, shadow_fired = active["outcome"] == "fired", shadow["outcome"] == "fired"
+    if active_fired != shadow_fired:
+        return True
+    return active_fired and active["node_label"] != shadow["node_label"]
+
+
+def shadow_decision_row(team_id: str, signal: Dict[str, Any], active_workflow_id: str, shadow_workflow_id: str,
+                        active: Dict[str, Any], shadow: Dict[str, Any], cached: bool) -> Dict[str, Any]:
+    return {
+        "team_id": team_id,
+        "active_workflow_id": active_workflow_id,
+        "shadow_workflow_id": shadow_workflow_id,
+        "source": signal.get("source"),
+        "external_id": str(signal["id"]) if signal.get("id") is not None else None,
+        "signal_text": (signal.get("text") or "")[:2000],
+        **{f"active_{k}": v for k, v in active.items()},
+        **{f"shadow_{k}": v for k, v in shadow.items()},
+        "shadow_cached": cached,
+        "differs": decisions_differ(active, shadow),
+    }
+
+
+class ShadowEvaluator:
+    """
+    Evaluates live signals against a team's shadow (candidate) workflow as well as the active one.
+    The primary evaluation hands over its decision together with the signal embedding and the RAG
+    context it already fetched; the shadow side runs as a background task after the primary is
+    decided, so it adds nothing to the live path. It screens with the same pre-filter settings and
+    decides through the same decide function (decision cache + LLM micro-batching), then stores both
+    decisions side by side in shadow_decisions. Nothing is ever executed for the candidate.
+    Only nodes with Auto-Run enabled on the candidate are considered, as on the active workflow.
+    Beyond max_pending in-flight shadow evaluations new ones are dropped and counted.
+    """
+
+    def __init__(self, decide: DecideFn, threshold: float, concurrency: int = SHADOW_CONCURRENCY,
+                 max_pending: int = SHADOW_MAX_PENDING, enabled: bool = SHADOW_ENABLED):
+        self.decide = decide
+        self.threshold = threshold
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max_pending
+        self.enabled = enabled
+        # Private screen: no false-negative audits, live /metrics counters stay untouched.
+        # Node profiles are keyed by content, so the embeddings are shared with the live pre-filter.
+        self.prefilter = SignalPrefilter(min_score=prefilter.min_score, audit_rate=0.0, enabled=prefilter.enabled)
+        self.prefilter.profiles = prefilter.profiles
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._tasks: Set[asyncio.Task] = set()
+        self.counters = {"submitted": 0, "recorded": 0, "differs": 0, "dropped": 0, "errors": 0, "cache_hits": 0}
+
+    async def workflow_for(self, repo, team_id: str) -> Optional[Dict[str, Any]]:
+        """The team's shadow workflow, None when it has none or shadow mode is off (served from cache)"""
+        if not self.enabled:
+            return None
+        return await repo.get_shadow_workflow(team_id)
+
+    def submit(self, team_id: str, signal: Dict[str, Any], active_workflow: Dict[str, Any],
+               shadow_workflow: Optional[Dict[str, Any]], active: Dict[str, Any],
+               vector: Optional[List[float]], context_text: str) -> bool:
+        """Schedules the shadow evaluation of a signal the active workflow just decided; never blocks"""
+        if not shadow_workflow or shadow_workflow["workflow_id"] == active_workflow["workflow_id"]:
+            return False  # No candidate, or it was just promoted and the cache has not caught up
+        if len(self._tasks) >= self.max_pending:
+            self.counters["dropped"] += 1
+            return False
+        self.counters["submitted"] += 1
+        task = asyncio.ensure_future(self._evaluate(
+            team_id, signal, active_workflow["workflow_id"], shadow_workflow, active, vector, context_text
+        ))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    async def _evaluate(self, team_id: str, signal: Dict[str, Any], active_workflow_id: str, shadow_workflow: Dict[str, Any],
+                        active: Dict[str, Any], vector: Optional[List[float]], context_text: str):
+        signal_text = signal.get("text", "")
+        async with self._semaphore():
+            try:
+                # [] = embedding unavailable, the screen fails open (as on the live path)
+                screen = await asyncio.to_thread(self.prefilter.check, signal_text, shadow_workflow["nodes"], vector or [])
+                cached = False
+                if not screen["passed"]:
+                    shadow = decision_side(None, 0.0, "prefiltered")
+                else:
+                    matched_node, confidence, reasoning, cached = await self.decide(
+                        team_id, shadow_workflow, signal_text, context_text
+                    )
+                    shadow = decision_side(matched_node, confidence, decision_outcome(matched_node, confidence, self.threshold))
+                row = shadow_decision_row(team_id, signal, active_workflow_id, shadow_workflow["workflow_id"], active, shadow, cached)
+                repo = await get_async_repository()
+                if not await repo.record_shadow_decision(row):
+                    self.counters["errors"] += 1
+                    return
+            except Exception as e:
+                print(f"[Shadow] Evaluation failed for team {team_id}: {e}")
+                self.counters["errors"] += 1
+                return
+        self.counters["recorded"] += 1
+        self.counters["cache_hits"] += int(cached)
+        self.counters["differs"] += int(row["differs"])
+        if row["differs"]:
+            print(f"[Shadow] Team {team_id}: active {active['outcome']} ({active['node_label']}) "
+                  f"vs shadow {shadow['outcome']} ({shadow['node_label']})")
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Waits for in-flight shadow evaluations (shutdown); whatever is left after timeout is abandoned"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "enabled": self.enabled, "pending": len(self._tasks), "max_pending": self.max_pending}
+
+
+async def get_shadow_report(team_id: str, shadow_workflow_id: Optional[str] = None, limit: int = 50,
+                            cursor: Optional[str] = None, differs_only: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Diff report for a candidate (default: the current shadow workflow): counts of how the two versions
+    compared, plus a keyset page of the signals that would have fired differently (all with differs_only=False).
+    None if no candidate was given and the team has no shadow workflow.
+    """
+    repo = await get_async_repository()
+    workflow = None
+    if shadow_workflow_id is None:
+        workflow = await repo.get_shadow_workflow(team_id)
+        if not workflow:
+            return None
+        shadow_workflow_id = workflow["workflow_id"]
+    stats, page = await asyncio.gather(
+        repo.get_shadow_decision_stats(team_id, shadow_workflow_id),
+        repo.get_shadow_decisions(team_id, shadow_workflow_id, limit, cursor, differs_only)
+    )
+    return {
+        "team_id": team_id,
+        "shadow_workflow_id": shadow_workflow_id,
+        "shadow_workflow_title": workflow.get("title") if workflow else None,
+        "stats": stats,
+        "decisions": page["items"],
+        "next_cursor": page["next_cursor"],
+    }
@@ -0,0 +1,229 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Full traces (every span with offsets and attributes) are kept for evaluations at or above this
+# latency percentile of the recent window; 100 disables tail sampling
+TRACE_SLOW_PERCENTILE = float(os.environ.get("TRACE_SLOW_PERCENTILE", "99"))
+# ... plus this share of all evaluations at random
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+# Recent evaluation latencies the percentile is computed over
+TRACE_WINDOW = int(os.environ.get("TRACE_WINDOW", "1000"))
+TRACE_SLOW_KEEP = int(os.environ.get("TRACE_SLOW_KEEP", "20"))
+
+# Histogram bucket upper bounds (ms), Prometheus-style cumulative
+STAGE_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+# Latencies needed before the percentile threshold is trusted
+_MIN_WINDOW = 100
+# The threshold is re-sorted every N evaluations, not on each one
+_THRESHOLD_REFRESH = 50
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(STAGE_BUCKETS_MS) + 1)  # Last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms: float):
+        i = 0
+        while i < len(STAGE_BUCKETS_MS) and ms > STAGE_BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the last finite bound for +Inf)"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(STAGE_BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return float(bound)
+        return float(STAGE_BUCKETS_MS[-1])
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative, buckets = 0, {}
+        for bound, n in zip(list(STAGE_BUCKETS_MS) + ["+Inf"], self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 1),
+            "avg_ms": round(self.sum / self.count, 1) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class StageMetrics:
+    """Per-stage latency histograms of the trigger pipeline, plus the slow-trace ring buffer"""
+
+    def __init__(self, slow_percentile: float = TRACE_SLOW_PERCENTILE, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.slow_percentile = slow_percentile
+        self.sample_rate = sample_rate
+        self.histograms: Dict[str, Histogram] = {}
+        self.slow_traces: Deque[Dict[str, Any]] = deque(maxlen=TRACE_SLOW_KEEP)
+        self._totals: Deque[float] = deque(maxlen=TRACE_WINDOW)
+        self._threshold: Optional[float] = None
+        self._since_refresh = 0
+        self._lock = threading.Lock()
+        self.counters = {"traces": 0, "captured_slow": 0, "captured_sampled": 0}
+
+    def observe(self, stage: str, ms: float):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(ms)
+
+    def slow_threshold_ms(self) -> Optional[float]:
+        """Latency at slow_percentile of the recent window, None until the window has enough samples"""
+        with self._lock:
+            return self._threshold
+
+    def capture_reason(self, total_ms: float) -> Optional[str]:
+        """"slow" / "sampled" if this evaluation's full trace should be kept, else None"""
+        threshold = self.slow_threshold_ms()
+        if self.slow_percentile < 100 and threshold is not None and total_ms >= threshold:
+            return "slow"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def record(self, trace: "Trace", total_ms: float):
+        with self._lock:
+            self.counters["traces"] += 1
+            self._totals.append(total_ms)
+            self._since_refresh += 1
+            if len(self._totals) >= _MIN_WINDOW and (self._threshold is None or self._since_refresh >= _THRESHOLD_REFRESH):
+                ordered = sorted(self._totals)
+                self._threshold = ordered[min(len(ordered) - 1, int(len(ordered) * self.slow_percentile / 100))]
+                self._since_refresh = 0
+            if trace.captured:
+                self.counters[f"captured_{trace.captured}"] += 1
+                self.slow_traces.append(trace.full())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                "slow_percentile": self.slow_percentile,
+                "slow_threshold_ms": round(self._threshold, 1) if self._threshold is not None else None,
+                "sample_rate": self.sample_rate,
+                "stages": {stage: h.snapshot() for stage, h in sorted(self.histograms.items())},
+                "slow_traces": list(self.slow_traces),
+            }
+
+    def prometheus(self) -> str:
+        """Histograms in the Prometheus text exposition format (seconds)"""
+        name = "livesop_trigger_stage_duration_seconds"
+        lines = [f"# HELP {name} Auto-Pilot trigger pipeline stage latency", f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(list(STAGE_BUCKETS_MS) + [None], h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound is None else f"{bound / 1000:g}"
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum / 1000:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+
+
+class Trace:
+    """
+    Timing spans of one evaluation. Stages may overlap (fanned-out steps) and may repeat
+    (durations add up). Every evaluation stores its per-stage totals in the audit row;
+    the full span list is kept only when stage_metrics decides to capture it.
+    """
+
+    def __init__(self, metrics: StageMetrics = stage_metrics, **attrs: Any):
+        self.metrics = metrics
+        self.attrs = dict(attrs)
+        self.spans: List[Dict[str, Any]] = []
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.captured: Optional[str] = None
+        self._start = time.perf_counter()
+        self._decided = False
+        self._finished = False
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    @contextmanager
+    def span(self, stage: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """with trace.span("workflow"): ...  (attributes may be added to the yielded dict)"""
+        start = time.perf_counter()
+        span = {"stage": stage, "start_ms": round((start - self._start) * 1000, 2), **attrs}
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = type(e).__name__
+            raise
+        finally:
+            span["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self.spans.append(span)
+
+    async def timed(self, stage: str, awaitable: Awaitable[T], **attrs: Any) -> T:
+        """Awaits inside a span, for use in asyncio.gather"""
+        with self.span(stage, **attrs):
+            return await awaitable
+
+    def set(self, **attrs: Any):
+        self.attrs.update(attrs)
+
+    def stage_totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span["stage"]] = round(totals.get(span["stage"], 0.0) + span["duration_ms"], 2)
+        return totals
+
+    def full(self) -> Dict[str, Any]:
+        return {
+            **self.attrs,
+            "started_at": self.started_at,
+            "total_ms": round(self.elapsed_ms(), 2),
+            "captured": self.captured,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+
+    def audit_fields(self) -> Dict[str, Any]:
+        """model_config additions for the inference_runs row: stage timings, full trace if captured"""
+        total_ms = self.elapsed_ms()
+        if not self._decided:
+            self._decided = True
+            self.captured = self.metrics.capture_reason(total_ms)
+        fields: Dict[str, Any] = {"timings": {"total_ms": round(total_ms, 2), "stages": self.stage_totals()}}
+        if self.captured:
+            fields["trace"] = self.full()
+        return fields
+
+    def finish(self):
+        """Feeds the histograms (once); call when the evaluation is over, however it ended"""
+        if self._finished:
+            return
+        self._finished = True
+        total_ms = self.elapsed_ms()
+        if not self._decided:
+            self._decided = True
+            self.captured = self.metrics.capture_reason(total_ms)
+        for stage, ms in self.stage_totals().items():
+            self.metrics.observe(stage, ms)
+        self.metrics.observe("total", total_ms)
+        self.metrics.record(self, total_ms)
@@ -1,9 +1,16 @@
+import asyncio
 import os
 import json
-from datetime import datetime, timezone
-from typing import Dict, Any, Tuple
-from app.repositories.persistence import PersistenceRepository
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+from app.repositories.persistence import node_auto_run_enabled
+from app.repositories.async_persistence import get_async_repository
 from app.services.automation_service import run_automation_logic
+from app.services.audit_writer import audit_writer
+from app.services.prefilter import prefilter
+from app.services.batch_evaluator import BatchEvaluator
+from app.services.decision_cache import decision_cache
+from app.services.shadow import ShadowEvaluator, decision_outcome, decision_side
+from app.services.tracing import Trace
 # Import OpenAI client (Assumes initialized in workflow_inference or reusable here)
 # from openai import OpenAI
 
@@ -24,6 +31,24 @@ def get_openai_client():
     return MockOpenAI()
 
 from app.services.rag_service import RAGService
+from app.services.workflow_inference import generate_embeddings
+
+def _candidate_nodes(nodes: list) -> list:
+    """Only auto-pilot nodes are offered to the LLM"""
+    return [n for n in nodes if node_auto_run_enabled(n)] # Checks both flag locations
+
+def _describe_candidates(candidates: list) -> str:
+    return "\n".join([
+        f"- Node ID: {n.get('id')} | Label: {n.get('data', {}).get('label')} | Desc: {n.get('data', {}).get('description')}" 
+        for n in candidates
+    ])
+
+def _decision_result(result: Dict[str, Any], candidates: list) -> Tuple[Dict, float, str]:
+    """Maps one LLM decision object onto (matched_node, confidence, reasoning)"""
+    if result.get("match") and (result.get("confidence") or 0.0) > 0.0:
+        matched_node = next((n for n in candidates if n.get("id") == result.get("node_id")), None)
+        return matched_node, result.get("confidence"), result.get("reasoning")
+    return None, result.get("confidence", 0.0), result.get("reasoning", "No match found")
 
 def _match_signal_to_nodes(signal_text: str, nodes: list, context_text: str = "") -> Tuple[Dict, float, str]:
     """
@@ -34,14 +59,11 @@ def _match_signal_to_nodes(signal_text: str, nodes: list, context_text: str = ""
         return None, 0.0, "No active nodes"
 
     # Filter only auto-pilot nodes
-    candidates = [n for n in nodes if n.get("data", {}).get("auto_pilot") or n.get("auto_run_enabled")] # Check both flag locations
+    candidates = _candidate_nodes(nodes)
     if not candidates:
         return None, 0.0, "No auto-pilot nodes enabled"
 
-    cand_descriptions = "\n".join([
-        f"- Node ID: {n.get('id')} | Label: {n.get('data', {}).get('label')} | Desc: {n.get('data', {}).get('description')}" 
-        for n in candidates
-    ])
+    cand_descriptions = _describe_candidates(candidates)
 
     prompt = f"""
     Analyze the incoming signal against the following workflow nodes.
@@ -72,216 +94,385 @@ def _match_signal_to_nodes(signal_text: str, nodes: list, context_text: str = ""
             response_format={"type": "json_object"}
         )
         result = json.loads(response.choices[0].message.content)
-        
-        if result.get("match") and result.get("confidence") > 0.0:
-            matched_node = next((n for n in candidates if n.get("id") == result.get("node_id")), None)
-            return matched_node, result.get("confidence"), result.get("reasoning")
-            
-        return None, result.get("confidence", 0.0), result.get("reasoning", "No match found")
+        return _decision_result(result, candidates)
         
     except Exception as e:
         print(f"[Trigger AI Error] {e}")
-        return None, 0.0, f"AI Error: {str(e)}"
+        raise
+
+def _match_signal_batch(items: List[Tuple[str, str]], nodes: list) -> List[Tuple[Dict, float, str]]:
+    """
+    Decides several signals against the same workflow's nodes in one LLM request.
+    items: [(signal_text, context_text), ...]; returns one (matched_node, confidence, reasoning) per item.
+    A signal the response leaves out is decided on its own with _match_signal_to_nodes.
+    LLM errors are raised (as _match_signal_to_nodes does), see decide_async.
+    """
+    if len(items) == 1:
+        return [_match_signal_to_nodes(items[0][0], nodes, items[0][1])]
+    candidates = _candidate_nodes(nodes or [])
+    if not candidates:
+        return [(None, 0.0, "No auto-pilot nodes enabled")] * len(items)
+
+    signal_blocks = "\n".join(
+        f"""
+    Signal {i}: "{text}"
+    Context for Signal {i}: {context if context else 'No additional context available.'}"""
+        for i, (text, context) in enumerate(items, 1)
+    )
+    prompt = f"""
+    Analyze each incoming signal independently against the following workflow nodes.
+    Determine for each signal if it explicitly triggers any of them with high confidence.
+    Use only that signal's own knowledge base context.
+    
+    Candidate Nodes:
+    {_describe_candidates(candidates)}
+    {signal_blocks}
+    
+    Respond in JSON format with exactly one decision per signal:
+    {{
+        "decisions": [
+            {{
+                "signal": 1,
+                "match": true/false,
+                "node_id": "step_id_or_null",
+                "confidence": 0.0_to_1.0,
+                "reasoning": "brief explanation citing context if relevant"
+            }}
+        ]
+    }}
+    """
+
+    try:
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4",
+            messages=[{"role": "system", "content": "You are a deterministic workflow engine."}, {"role": "user", "content": prompt}],
+            temperature=0.0,
+            response_format={"type": "json_object"}
+        )
+        decisions = {d.get("signal"): d for d in json.loads(response.choices[0].message.content).get("decisions", [])}
+    except Exception as e:
+        print(f"[Trigger AI Error] Batch of {len(items)}: {e}")
+        raise
+
+    results = []
+    for i, (text, context) in enumerate(items, 1):
+        decision = decisions.get(i)
+        if decision is None:
+            print(f"[Trigger] Batch response missing signal {i}; deciding it alone.")
+            results.append(_match_signal_to_nodes(text, nodes, context))
+        else:
+            results.append(_decision_result(decision, candidates))
+    return results
 
 import hashlib
 
+class EvaluationError(Exception):
+    """Transient evaluation failure (e.g. the LLM was rate limited); a queued job should be retried"""
+
+class LLMUnavailable(Exception):
+    """Permanent LLM failure (disabled client, bad key, bad request, unparseable answer); retrying cannot help"""
+
+# openai exception classes (matched by name: the client is optional) worth another attempt
+_RETRYABLE_LLM_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+def is_retryable_llm_error(error: Exception) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx; not auth, bad requests or a disabled client"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in _RETRYABLE_LLM_ERRORS for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+# 3. Decision Gate (Default 0.9)
+THRESHOLD = 0.9
+
+batch_evaluator = BatchEvaluator(_match_signal_batch)
+
+async def decide_async(team_id: str, workflow: Dict[str, Any], signal_text: str, context_text: str) -> Tuple[Optional[Dict], float, str, bool]:
+    """
+    LLM trigger decision for a signal against a workflow version, served from the decision cache
+    when the same (normalized) signal was decided against the same version and context; misses go
+    through the micro-batching evaluator. Returns (matched_node, confidence, reasoning, cached).
+    Retryable LLM failures raise EvaluationError, permanent ones LLMUnavailable; neither is cached.
+    """
+    key = decision_cache.key(team_id, workflow, signal_text, context_text)
+    cached = decision_cache.get(key, workflow["nodes"])
+    if cached is not None:
+        return (*cached, True)
+    # Concurrent signals for the same workflow share one LLM request (micro-batch)
+    try:
+        decision = await batch_evaluator.match(team_id, workflow["workflow_id"], signal_text, workflow["nodes"], context_text)
+    except Exception as e:
+        if is_retryable_llm_error(e):
+            raise EvaluationError(f"AI Error: {e}") from e
+        raise LLMUnavailable(f"AI Error: {type(e).__name__}: {e}") from e
+    decision_cache.set(key, decision)
+    return (*decision, False)
+
+# Candidate workflow versions in shadow mode are decided through the same cache and micro-batching
+shadow_evaluator = ShadowEvaluator(decide_async, THRESHOLD)
+
+def _idempotency_key(team_id: str, signal: Dict[str, Any]) -> str:
+    # Hash: team_id + source + external_id (if available) or text + timestamp
+    raw_key = f"{team_id}:{signal.get('source')}:{signal.get('id')}:{signal.get('text', '')}"
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+def _format_context(context_docs: List[Dict]) -> str:
+    return "\n".join([f"- {d['content'][:500]} (Source: {d['metadata'].get('filename', 'Unknown')})" for d in context_docs])
+
+def _audit_config(matched_node: Optional[Dict], confidence: float, reasoning: str, signal_text: str,
+                  dry_run: bool, idempotency_key: str, context_docs: List[Dict], screen: Optional[Dict] = None,
+                  cached: bool = False) -> Dict[str, Any]:
+    return {
+        "prefilter": {"score": screen["score"], "reason": screen["reason"]} if screen else None,
+        "decision_cache": "hit" if cached else "miss",
+        "matched_node": matched_node.get("data", {}).get("label") if matched_node else None,
+        "confidence": confidence,
+        "reasoning": reasoning,
+        "threshold": THRESHOLD,
+        "signal_text": signal_text,
+        "dry_run": dry_run,
+        "idempotency_key": idempotency_key,
+        "context_sources": [{ 
+            "title": d['metadata'].get("filename", "Unknown"), 
+            "snippet": d['content'][:150],
+            "source_type": d['metadata'].get("source", "manual"),
+            "metadata": d['metadata']
+        } for d in context_docs]
+    }
+
+def _plan_action(matched_node: Dict, signal_text: str, reasoning: str) -> Tuple[str, Dict[str, Any]]:
+    """Determine Action Params for a matched node"""
+    node_data = matched_node.get("data", {})
+    label = node_data.get("label", "").lower()
+    
+    action = "slack_notify"
+    params = {"message": f"🤖 Auto-Pilot: Executed '{node_data.get('label')}' based on your workflow rules."}
+    
+    if any(x in label for x in ["jira", "ticket", "issue"]):
+        action = "create_jira_ticket"
+        params = {
+            "summary": f"[Auto] {node_data.get('label')}",
+            "description": f"Triggered by Signal: {signal_text}\n\nReasoning: {reasoning}"
+        }
+    return action, params
+
+def _safety_gate(matched_node: Dict) -> Optional[str]:
+    """Phase B: Safety Gates. Returns the skip reason, or None if execution may proceed.
+    The team kill switch was already checked before evaluation started."""
+    # Per-Node Auto-Run Flag (from the active workflow we already hold, no extra query)
+    if not node_auto_run_enabled(matched_node):
+        node_id = matched_node.get("id")
+        print(f"[Auto-Pilot] BLOCKED: Node {node_id} has Auto-Run disabled")
+        return f"node_auto_run_disabled:{node_id}"
+    return None
+
+def _finish_run(trace: Trace, run_id: str, status: str, model_config: Optional[Dict] = None, **fields: Any):
+    """Closes the audit row with the evaluation's stage timings (and full trace if sampled)"""
+    trace.set(outcome=status)
+    with trace.span("audit"):
+        audit_writer.finish(run_id, status, {**(model_config or {}), **trace.audit_fields()}, **fields)
+
 def evaluate_signal(team_id: str, signal: Dict[str, Any], dry_run: bool = False):
     """
-    Phase 9 Hardening: Intelligent, Confidence-Gated Auto-Pilot Execution.
-    Supports dry_run and idempotency.
+    Blocking entry point for scripts and benchmarks: runs evaluate_signal_async on a private event loop
+    (including any shadow evaluation it starts). Never call it from inside a running event loop.
+    """
+    async def _run():
+        from app.core.database import close_async_supabase_client
+        try:
+            await evaluate_signal_async(team_id, signal, dry_run=dry_run)
+            await shadow_evaluator.drain()
+        finally:
+            await close_async_supabase_client()
+
+    asyncio.run(_run())
+
+async def _claimed(repo, team_id: str, idempotency_key: str, dry_run: bool, claim: bool) -> bool:
+    # If it's a dry run, we ignore idempotency (allow replay)
+    if dry_run:
+        return True
+    if not claim:
+        # A retry: the first attempt holds the key, go on unless an attempt already reached execution
+        return not await repo.idempotency_key_executed(team_id, idempotency_key)
+    return await repo.claim_idempotency_key(team_id, idempotency_key)
+
+def _embed_signal(signal_text: str) -> Optional[List[float]]:
+    """Signal embedding shared by the pre-filter and the RAG lookup (None if unavailable)"""
+    vectors = generate_embeddings([signal_text])
+    return vectors[0] if vectors and any(vectors[0]) else None
+
+async def _search_context(team_id: str, signal_text: str, vector: Optional[List[float]]) -> List[Dict]:
+    if vector is None:
+        return []  # Embedding unavailable: nothing to search with
+    try:
+        context_docs = await RAGService().search_context_async(team_id, signal_text, limit=3, query_vector=vector)
+        if context_docs:
+            print(f"[Trigger] Found {len(context_docs)} relevant KB items.")
+        return context_docs
+    except Exception as rag_err:
+        print(f"[Trigger] RAG Error: {rag_err}")
+        return []
+
+async def evaluate_signal_async(team_id: str, signal: Dict[str, Any], dry_run: bool = False):
+    """Inline (fire-and-forget) evaluation: errors are logged, never raised"""
+    try:
+        await run_evaluation(team_id, signal, dry_run=dry_run)
+    except Exception as e:
+        print(f"[Trigger Engine Error] {e}")
+
+async def run_evaluation(team_id: str, signal: Dict[str, Any], dry_run: bool = False, claim: bool = True,
+                         timeout: Optional[float] = None, before_execute: Optional[Callable[[], Awaitable[None]]] = None):
+    """
+    Runs one evaluation inside a timing trace (see _run_evaluation). timeout (seconds) bounds the
+    stages before execution only: once the automation starts, the evaluation runs to completion.
+    before_execute is awaited right before the automation runs (the worker renews its lease there);
+    if it raises, nothing is executed.
+    """
+    trace = Trace(team_id=team_id, signal_id=signal.get("id"), source=signal.get("source"), dry_run=dry_run)
+    try:
+        async with asyncio.timeout(timeout) as deadline:
+            await _run_evaluation(team_id, signal, dry_run, claim, trace, deadline, before_execute)
+    except Exception as e:
+        trace.set(outcome="error", error=str(e)[:200])
+        raise
+    finally:
+        trace.finish()
+
+async def _run_evaluation(team_id: str, signal: Dict[str, Any], dry_run: bool, claim: bool, trace: Trace,
+                          deadline: asyncio.Timeout, before_execute: Optional[Callable[[], Awaitable[None]]] = None):
+    """
+    evaluate_signal on the async repository, with independent steps fanned out:
+      1. idempotency claim | active workflow | kill switch | signal embedding   (concurrently)
+      2. pre-filter screen | RAG lookup (reusing the embedding)                 (concurrently)
+      3. decision cache / LLM match, then safety gate and execution
+    Nothing with side effects runs before the claim is known to be ours, and a team with
+    Auto-Pilot disabled returns after step 1, before any pre-filter, RAG or LLM work.
+    The OpenAI client (match + embeddings) and automations are still blocking and run in threads;
+    LLM matches that miss the decision cache go through batch_evaluator, so a burst of signals
+    costs one request per batch.
+    Raises on failures before execution (EvaluationError for retryable LLM errors) so the work
+    queue can retry; retries pass claim=False since the first attempt already holds the idempotency
+    key, and stop early if an earlier attempt already reached execution. A permanent LLM error
+    (LLMUnavailable) is logged and dropped.
+    Right before run_automation_logic the deadline is lifted and the key is atomically marked as
+    executed; only the attempt that sets the mark runs the automation, so neither a retry nor a
+    second worker holding the job after a lost lease can run it twice. From there on nothing is
+    raised. An automation that raises is audited as failed.
+    Every step runs in a trace span; stage timings are stored in the audit row's model_config.
+    If the team has a shadow workflow, the decision is then handed to shadow_evaluator with the
+    embedding and context fetched here, and the candidate is decided in the background.
     """
-    repo = PersistenceRepository()
+    repo = await get_async_repository()
+    signal_text = signal.get("text", "")
+    idempotency_key = _idempotency_key(team_id, signal)
+
+    claimed, workflow, global_enabled, vector, shadow_workflow = await asyncio.gather(
+        trace.timed("idempotency", _claimed(repo, team_id, idempotency_key, dry_run, claim)),
+        trace.timed("workflow", repo.get_active_workflow(team_id)),
+        trace.timed("kill_switch", repo.get_team_auto_pilot_status(team_id)),
+        trace.timed("embedding", asyncio.to_thread(_embed_signal, signal_text)),
+        trace.timed("shadow_workflow", shadow_evaluator.workflow_for(repo, team_id))
+    )
+    if dry_run:
+        shadow_workflow = None  # Test runs stay out of the diff report
+    if not claimed:
+        print(f"[Trigger] Duplicate event detected. Skipping. Key: {idempotency_key[:8]}")
+        trace.set(outcome="duplicate")
+        return 
+    
+    print(f"[Trigger] Evaluating signal for team {team_id} (DryRun={dry_run}): {signal_text[:30]}...")
     
+    if not workflow or not workflow.get("nodes"):
+        print("[Trigger] No active workflow.")
+        trace.set(outcome="no_workflow")
+        return
+    if not global_enabled:
+        print(f"[Auto-Pilot] BLOCKED: Global Auto-Pilot disabled for team {team_id}. Skipping evaluation.")
+        trace.set(outcome="auto_pilot_disabled")
+        return
+
+    screen, context_docs = await asyncio.gather(
+        trace.timed("prefilter", asyncio.to_thread(prefilter.check, signal_text, workflow["nodes"], vector or [])),  # [] = unavailable, fail open
+        trace.timed("rag_search", _search_context(team_id, signal_text, vector))
+    )
+    context_text = _format_context(context_docs)
+    if not screen["passed"]:
+        print(f"[Trigger] Pre-filter: no likely node ({screen['reason']}, score {screen['score']}). Skipping LLM.")
+        prefilter.maybe_audit(team_id, signal_text, workflow["nodes"], screen, _match_signal_to_nodes, THRESHOLD)
+        shadow_evaluator.submit(team_id, signal, workflow, shadow_workflow, decision_side(None, 0.0, "prefiltered"), vector, context_text)
+        trace.set(outcome="prefiltered")
+        return
+
     try:
-        signal_text = signal.get("text", "")
-        # 0. Idempotency Check
-        # Hash: team_id + source + external_id (if available) or text + timestamp
-        
-        raw_key = f"{team_id}:{signal.get('source')}:{signal.get('id')}:{signal_text}"
-        idempotency_key = hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
-        
-        # If it's a dry run, we ignore idempotency (allow replay)
-        if not dry_run:
-             if repo.check_idempotency_key(team_id, idempotency_key):
-                 print(f"[Trigger] Duplicate event detected. Skipping. Key: {idempotency_key[:8]}")
-                 return 
-        
-        print(f"[Trigger] Evaluating signal for team {team_id} (DryRun={dry_run}): {signal_text[:30]}...")
+        with trace.span("llm_match") as span:
+            matched_node, confidence, reasoning, cached = await decide_async(team_id, workflow, signal_text, context_text)
+            span["cached"] = cached
+    except LLMUnavailable as e:
+        print(f"[Trigger] LLM unavailable, evaluation dropped: {e}")
+        trace.set(outcome="llm_error", error=str(e)[:200])
+        return
+    shadow_evaluator.submit(
+        team_id, signal, workflow, shadow_workflow,
+        decision_side(matched_node, confidence, decision_outcome(matched_node, confidence, THRESHOLD)), vector, context_text
+    )
+    should_execute = (matched_node is not None) and (confidence >= THRESHOLD)
+    if confidence <= 0.1:
+        trace.set(outcome="noise")
+        return # Ignore noise
+
+    with trace.span("audit"):
+        run_id = audit_writer.start(team_id, "auto_pilot_evaluation", _audit_config(
+            matched_node, confidence, reasoning, signal_text, dry_run, idempotency_key, context_docs, screen, cached
+        ))
+    trace.set(run_id=run_id)
+
+    if should_execute:
+        skip_reason = _safety_gate(matched_node)
+        if skip_reason:
+            _finish_run(trace, run_id, "skipped", {"skip_reason": skip_reason})
+            return
         
-        # 1. Fetch Workflow
-        workflow = repo.get_active_workflow(team_id)
-        if not workflow or not workflow.get("nodes"):
-            print("[Trigger] No active workflow.")
+        if dry_run:
+            _finish_run(trace, run_id, "completed", {
+                "execution_result": {"success": True, "message": "Dry Run: Logic Validated.", "simulated": True}
+            })
+            print("[Auto-Pilot] Dry Run Passed. Action would be executed.")
             return
 
-        # 1.5 Fetch Context (RAG)
-        context_docs = []
-        context_text = ""
-        try:
-            rag = RAGService()
-            context_docs = rag.search_context(team_id, signal_text, limit=3)
-            if context_docs:
-                context_text = "\n".join([f"- {d['content'][:500]} (Source: {d['metadata'].get('filename', 'Unknown')})" for d in context_docs])
-                print(f"[Trigger] Found {len(context_docs)} relevant KB items.")
-        except Exception as rag_err:
-             print(f"[Trigger] RAG Error: {rag_err}")
-
-        # 2. Intelligent Match
-        matched_node, confidence, reasoning = _match_signal_to_nodes(
-            signal_text, 
-            workflow["nodes"],
-            context_text
-        )
-        
-        # 3. Decision Gate (Default 0.9)
-        THRESHOLD = 0.9
-        should_execute = (matched_node is not None) and (confidence >= THRESHOLD)
-        
-        status = "skipped"
-        if should_execute:
-            status = "executing"
-        elif matched_node:
-            status = "rejected_low_confidence"
-            
-        # 4. Audit Log (START)
-        run_entry = {
-            "team_id": team_id,
-            "trigger_type": "auto_pilot_evaluation", 
-            "status": "processing",
-            "model_config": {
-                "matched_node": matched_node.get("data", {}).get("label") if matched_node else None,
-                "confidence": confidence,
-                "reasoning": reasoning,
-                "threshold": THRESHOLD,
-                "signal_text": signal_text,
-                "dry_run": dry_run,
-                "idempotency_key": idempotency_key,
-                "context_sources": [{ 
-                    "title": d['metadata'].get("filename", "Unknown"), 
-                    "snippet": d['content'][:150],
-                    "source_type": d['metadata'].get("source", "manual"),
-                    "metadata": d['metadata']
-                } for d in context_docs]
-            },
-            "started_at": datetime.now(timezone.utc).isoformat()
-        }
-        
-        if confidence > 0.1:
-            res = repo.db.table("inference_runs").insert(run_entry).execute()
-            run_id = res.data[0]["id"]
-        else:
-            return # Ignore noise
-
-        # 5. Execution (If Passed)
-        if should_execute:
-            # Phase B: Safety Gates
-            # Check 1: Global Kill Switch
-            global_enabled = repo.get_team_auto_pilot_status(team_id)
-            if not global_enabled:
-                print(f"[Auto-Pilot] BLOCKED: Global Auto-Pilot disabled for team {team_id}")
-                repo.db.table("inference_runs").update({
-                    "status": "skipped",
-                    "completed_at": datetime.now(timezone.utc).isoformat(),
-                    "model_config": {
-                         "matched_node": matched_node.get("data", {}).get("label"),
-                         "confidence": confidence,
-                         "reasoning": reasoning,
-                         "threshold": THRESHOLD,
-                         "signal_text": signal_text,
-                         "dry_run": dry_run,
-                         "idempotency_key": idempotency_key,
-                         "skip_reason": "global_auto_pilot_disabled"
-                    }
-                }).eq("id", run_id).execute()
-                return
-            
-            # Check 2: Per-Node Auto-Run Flag
-            node_id = matched_node.get("id")
-            node_enabled = repo.get_node_auto_run_status(node_id)
-            if not node_enabled:
-                print(f"[Auto-Pilot] BLOCKED: Node {node_id} has Auto-Run disabled")
-                repo.db.table("inference_runs").update({
-                    "status": "skipped",
-                    "completed_at": datetime.now(timezone.utc).isoformat(),
-                    "model_config": {
-                         "matched_node": matched_node.get("data", {}).get("label"),
-                         "confidence": confidence,
-                         "reasoning": reasoning,
-                         "threshold": THRESHOLD,
-                         "signal_text": signal_text,
-                         "dry_run": dry_run,
-                         "idempotency_key": idempotency_key,
-                         "skip_reason": f"node_auto_run_disabled:{node_id}"
-                    }
-                }).eq("id", run_id).execute()
-                return
-            
-            # Recheck Dry Run
-            if dry_run:
-                # Log simulated success
-                repo.db.table("inference_runs").update({
-                    "status": "completed", # "completed" implies success for the *run* (which was a dry-run check)
-                    "completed_at": datetime.now(timezone.utc).isoformat(),
-                    "model_config": {
-                         "matched_node": matched_node.get("data", {}).get("label"),
-                         "confidence": confidence,
-                         "reasoning": reasoning,
-                         "threshold": THRESHOLD,
-                         "signal_text": signal_text,
-                         "dry_run": True,
-                         "idempotency_key": idempotency_key,
-                         "execution_result": {"success": True, "message": "Dry Run: Logic Validated.", "simulated": True}
-                    }
-                }).eq("id", run_id).execute()
-                print(f"[Auto-Pilot] Dry Run Passed. Action would be executed.")
-                return
-
-            node_data = matched_node.get("data", {})
-            label = node_data.get("label", "").lower()
-            
-            # Determine Action Params
-            action = "slack_notify"
-            params = {"message": f"🤖 Auto-Pilot: Executed '{node_data.get('label')}' based on your workflow rules."}
-            
-            if any(x in label for x in ["jira", "ticket", "issue"]):
-                action = "create_jira_ticket"
-                params = {
-                    "summary": f"[Auto] {node_data.get('label')}",
-                    "description": f"Triggered by Signal: {signal_text}\n\nReasoning: {reasoning}"
-                }
-            
-            # Execute Service
-            print(f"[Auto-Pilot] EXECUTING {action} (Conf: {confidence})")
-            result = run_automation_logic(team_id, action, params)
-            
-            # 6. Update Audit Log (COMPLETE)
-            repo.db.table("inference_runs").update({
-                "status": "completed" if result["success"] else "failed",
-                "trigger_type": action, # Update to actual action taken
-                "completed_at": datetime.now(timezone.utc).isoformat(),
-                "model_config": {
-                     "matched_node": matched_node.get("data", {}).get("label"),
-                     "confidence": confidence,
-                     "reasoning": reasoning,
-                     "threshold": THRESHOLD,
-                     "signal_text": signal_text,
-                     "dry_run": False,
-                     "idempotency_key": idempotency_key,
-                     "execution_result": result
-                }
-            }).eq("id", run_id).execute()
-            
-            # 7. Update Usage
-            if result["success"]:
-                 repo.db.rpc('increment_usage', {'team_id_input': team_id}).execute()
-                 
-        else:
-            # Mark Low Confidence
-            repo.db.table("inference_runs").update({
-                "status": "skipped",
-                "completed_at": datetime.now(timezone.utc).isoformat()
-            }).eq("id", run_id).execute()
-            print(f"[Auto-Pilot] Skipped. Confidence {confidence} < {THRESHOLD}")
+        action, params = _plan_action(matched_node, signal_text, reasoning)
+        if before_execute:
+            await before_execute()
+        deadline.reschedule(None)  # From here on the automation may have run: no timeout, no retry
+        with trace.span("execution_mark"):
+            marked = await repo.mark_idempotency_key_executed(team_id, idempotency_key)
+        if not marked:
+            print(f"[Trigger] Already executed by an earlier attempt. Skipping. Key: {idempotency_key[:8]}")
+            _finish_run(trace, run_id, "skipped", {"skip_reason": "already_executed"})
+            return
+        print(f"[Auto-Pilot] EXECUTING {action} (Conf: {confidence})")
+        with trace.span("execution", action=action):
+            try:
+                result = await asyncio.to_thread(run_automation_logic, team_id, action, params)
+            except Exception as e:
+                print(f"[Auto-Pilot] Execution error: {e}")
+                result = {"success": False, "error": str(e)}
+        if result["success"]:
+            with trace.span("usage"):
+                try:
+                    await repo.increment_usage(team_id)
+                except Exception as e:
+                    print(f"[DB Error] Increment usage for team {team_id}: {e}")
 
-    except Exception as e:
-        print(f"[Trigger Engine Error] {e}")
+        _finish_run(
+            trace,
+            run_id,
+            "completed" if result["success"] else "failed",
+            {"execution_result": result},
+            trigger_type=action
+        )
+             
+    else:
+        _finish_run(trace, run_id, "skipped")
+        print(f"[Auto-Pilot] Skipped. Confidence {confidence} < {THRESHOLD}")
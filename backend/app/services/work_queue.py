@@ -0,0 +1,340 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.repositories.async_persistence import get_async_repository
+
+# inline: evaluate in the web worker (FastAPI BackgroundTasks), no queue
+# db:     evaluation_jobs table in Supabase (see supabase/migrations/20251220_evaluation_queue.sql)
+# sqlite: local file queue, for single-host deployments and development
+WORK_QUEUE_BACKEND = os.environ.get("WORK_QUEUE_BACKEND", "inline").lower()
+WORK_QUEUE_SQLITE_PATH = os.environ.get("WORK_QUEUE_SQLITE_PATH", "evaluation_queue.sqlite3")
+WORK_QUEUE_VISIBILITY_TIMEOUT = int(os.environ.get("WORK_QUEUE_VISIBILITY_TIMEOUT", "60"))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.environ.get("WORK_QUEUE_MAX_ATTEMPTS", "5"))
+WORK_QUEUE_RETRY_BASE = float(os.environ.get("WORK_QUEUE_RETRY_BASE", "5"))
+WORK_QUEUE_RETRY_MAX = float(os.environ.get("WORK_QUEUE_RETRY_MAX", "300"))
+# Delay before a job deferred by the worker's fair scheduler is claimable again
+WORK_QUEUE_DEFER_SECONDS = int(os.environ.get("WORK_QUEUE_DEFER_SECONDS", "5"))
+
+
+def retry_delay(attempts: int) -> int:
+    """Exponential backoff after the given number of attempts, in whole seconds"""
+    return int(min(WORK_QUEUE_RETRY_MAX, WORK_QUEUE_RETRY_BASE * 2 ** max(0, attempts - 1)))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and another worker re-claimed it; this worker must stop working on it"""
+
+
+class WorkQueue:
+    """
+    Durable at-least-once job queue with leases.
+    claim() leases jobs for visibility_timeout seconds and extend_lease() renews the lease of a job
+    still being worked on; complete() deletes a job, fail() puts it back with exponential backoff or
+    dead-letters it after max_attempts. All three take the lease token from the claim and are no-ops
+    if the lease expired and another worker re-claimed the job.
+    Jobs are dicts: {id, kind, payload, attempts, max_attempts, lease_token, ...}.
+    """
+
+    name = "base"
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], team_id: Optional[str] = None,
+                      dedupe_key: Optional[str] = None, max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS) -> bool:
+        """Returns False if a job with the same dedupe_key is already queued"""
+        raise NotImplementedError
+
+    async def claim(self, worker_id: str, limit: int, visibility_timeout: int = WORK_QUEUE_VISIBILITY_TIMEOUT) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def extend_lease(self, job: Dict[str, Any], visibility_timeout: int = WORK_QUEUE_VISIBILITY_TIMEOUT) -> bool:
+        """Pushes a running job's lease out to visibility_timeout seconds from now; False if the lease was lost"""
+        raise NotImplementedError
+
+    async def complete(self, job: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    async def fail(self, job: Dict[str, Any], error: str) -> Optional[str]:
+        """Returns the job's new status ("queued" or "dead"), None if the lease was lost"""
+        raise NotImplementedError
+
+    async def release(self, job: Dict[str, Any], delay: int = WORK_QUEUE_DEFER_SECONDS) -> bool:
+        """Hands a claimed job back unrun (deferred): due again after delay seconds, attempt not counted"""
+        raise NotImplementedError
+
+    async def requeue_dead(self, limit: int = 1000) -> int:
+        """Moves dead-lettered jobs back to the queue with a fresh attempt budget"""
+        raise NotImplementedError
+
+    async def stats(self) -> Dict[str, Any]:
+        """Queue depth: queued, ready, running, dead, oldest_ready_age_seconds"""
+        raise NotImplementedError
+
+
+class DatabaseWorkQueue(WorkQueue):
+    """evaluation_jobs table; claims use the claim_evaluation_jobs RPC (FOR UPDATE SKIP LOCKED)"""
+
+    name = "db"
+
+    async def enqueue(self, kind, payload, team_id=None, dedupe_key=None, max_attempts=WORK_QUEUE_MAX_ATTEMPTS) -> bool:
+        repo = await get_async_repository()
+        now = _now().isoformat()
+        row = {
+            "team_id": team_id, "kind": kind, "payload": payload, "dedupe_key": dedupe_key,
+            "max_attempts": max_attempts, "available_at": now, "created_at": now, "updated_at": now
+        }
+        res = await repo.db.table("evaluation_jobs").upsert(row, on_conflict="dedupe_key", ignore_duplicates=True).execute()
+        return bool(res.data)
+
+    async def claim(self, worker_id, limit, visibility_timeout=WORK_QUEUE_VISIBILITY_TIMEOUT) -> List[Dict[str, Any]]:
+        repo = await get_async_repository()
+        res = await repo.db.rpc("claim_evaluation_jobs", {
+            "p_worker_id": worker_id, "p_limit": limit, "p_visibility_seconds": visibility_timeout
+        }).execute()
+        return res.data or []
+
+    async def extend_lease(self, job, visibility_timeout=WORK_QUEUE_VISIBILITY_TIMEOUT) -> bool:
+        repo = await get_async_repository()
+        res = await repo.db.rpc("extend_evaluation_job_lease", {
+            "p_id": job["id"], "p_lease_token": job["lease_token"], "p_visibility_seconds": visibility_timeout
+        }).execute()
+        return bool(res.data)
+
+    async def complete(self, job) -> bool:
+        repo = await get_async_repository()
+        res = await repo.db.rpc("complete_evaluation_job", {"p_id": job["id"], "p_lease_token": job["lease_token"]}).execute()
+        return bool(res.data)
+
+    async def fail(self, job, error) -> Optional[str]:
+        repo = await get_async_repository()
+        res = await repo.db.rpc("fail_evaluation_job", {
+            "p_id": job["id"], "p_lease_token": job["lease_token"],
+            "p_error": error[:2000], "p_retry_delay_seconds": retry_delay(job["attempts"])
+        }).execute()
+        return res.data
+
+    async def release(self, job, delay=WORK_QUEUE_DEFER_SECONDS) -> bool:
+        repo = await get_async_repository()
+        res = await repo.db.rpc("release_evaluation_job", {
+            "p_id": job["id"], "p_lease_token": job["lease_token"], "p_delay_seconds": delay
+        }).execute()
+        return bool(res.data)
+
+    async def requeue_dead(self, limit: int = 1000) -> int:
+        repo = await get_async_repository()
+        res = await repo.db.table("evaluation_jobs").select("id").eq("status", "dead").limit(limit).execute()
+        ids = [r["id"] for r in res.data or []]
+        if ids:
+            await repo.db.table("evaluation_jobs").update({
+                "status": "queued", "attempts": 0, "available_at": _now().isoformat(), "updated_at": _now().isoformat()
+            }).in_("id", ids).execute()
+        return len(ids)
+
+    async def stats(self) -> Dict[str, Any]:
+        repo = await get_async_repository()
+        res = await repo.db.rpc("evaluation_queue_stats", {}).execute()
+        return {"backend": self.name, **(res.data or {})}
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Same semantics in a local SQLite file. Claims run in BEGIN IMMEDIATE transactions, so
+    several worker processes on one host can share the file safely.
+    """
+
+    name = "sqlite"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS evaluation_jobs (
+            id TEXT PRIMARY KEY,
+            team_id TEXT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            dedupe_key TEXT UNIQUE,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at TEXT NOT NULL,
+            leased_until TEXT,
+            lease_token TEXT,
+            worker_id TEXT,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_evaluation_jobs_ready ON evaluation_jobs(status, available_at);
+    """
+
+    def __init__(self, path: str = WORK_QUEUE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self._SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _enqueue(self, kind, payload, team_id, dedupe_key, max_attempts) -> bool:
+        now = _now().isoformat()
+        cur = self._connect().execute(
+            "INSERT OR IGNORE INTO evaluation_jobs (id, team_id, kind, payload, dedupe_key, max_attempts, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), team_id, kind, json.dumps(payload, default=str), dedupe_key, max_attempts, now, now, now)
+        )
+        return cur.rowcount == 1
+
+    def _claim(self, worker_id, limit, visibility_timeout) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        now = _now().isoformat()
+        leased_until = (_now() + timedelta(seconds=visibility_timeout)).isoformat()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE evaluation_jobs SET status = 'dead', leased_until = NULL, lease_token = NULL, updated_at = ?, "
+                "last_error = COALESCE(last_error, 'lease expired') "
+                "WHERE status = 'running' AND leased_until <= ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            ids = [r["id"] for r in conn.execute(
+                "SELECT id FROM evaluation_jobs WHERE (status = 'queued' AND available_at <= ?) "
+                "OR (status = 'running' AND leased_until <= ?) ORDER BY available_at, created_at LIMIT ?",
+                (now, now, limit)
+            )]
+            jobs = []
+            for job_id in ids:
+                conn.execute(
+                    "UPDATE evaluation_jobs SET status = 'running', attempts = attempts + 1, leased_until = ?, "
+                    "lease_token = ?, worker_id = ?, updated_at = ? WHERE id = ?",
+                    (leased_until, str(uuid.uuid4()), worker_id, now, job_id)
+                )
+                jobs.append(self._job(conn.execute("SELECT * FROM evaluation_jobs WHERE id = ?", (job_id,)).fetchone()))
+            conn.execute("COMMIT")
+            return jobs
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _extend_lease(self, job, visibility_timeout) -> bool:
+        now = _now()
+        cur = self._connect().execute(
+            "UPDATE evaluation_jobs SET leased_until = ?, updated_at = ? WHERE id = ? AND lease_token = ? AND status = 'running'",
+            ((now + timedelta(seconds=visibility_timeout)).isoformat(), now.isoformat(), job["id"], job["lease_token"])
+        )
+        return cur.rowcount == 1
+
+    def _complete(self, job) -> bool:
+        cur = self._connect().execute(
+            "DELETE FROM evaluation_jobs WHERE id = ? AND lease_token = ?", (job["id"], job["lease_token"])
+        )
+        return cur.rowcount == 1
+
+    def _fail(self, job, error) -> Optional[str]:
+        conn = self._connect()
+        available_at = (_now() + timedelta(seconds=retry_delay(job["attempts"]))).isoformat()
+        cur = conn.execute(
+            "UPDATE evaluation_jobs SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END, "
+            "available_at = ?, leased_until = NULL, lease_token = NULL, last_error = ?, updated_at = ? "
+            "WHERE id = ? AND lease_token = ?",
+            (available_at, error[:2000], _now().isoformat(), job["id"], job["lease_token"])
+        )
+        if cur.rowcount != 1:
+            return None
+        return conn.execute("SELECT status FROM evaluation_jobs WHERE id = ?", (job["id"],)).fetchone()["status"]
+
+    def _release(self, job, delay) -> bool:
+        available_at = (_now() + timedelta(seconds=delay)).isoformat()
+        cur = self._connect().execute(
+            "UPDATE evaluation_jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), available_at = ?, "
+            "leased_until = NULL, lease_token = NULL, updated_at = ? WHERE id = ? AND lease_token = ?",
+            (available_at, _now().isoformat(), job["id"], job["lease_token"])
+        )
+        return cur.rowcount == 1
+
+    def _requeue_dead(self, limit) -> int:
+        now = _now().isoformat()
+        cur = self._connect().execute(
+            "UPDATE evaluation_jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? "
+            "WHERE id IN (SELECT id FROM evaluation_jobs WHERE status = 'dead' LIMIT ?)",
+            (now, now, limit)
+        )
+        return cur.rowcount
+
+    def _stats(self) -> Dict[str, Any]:
+        now = _now().isoformat()
+        row = self._connect().execute(
+            "SELECT SUM(status = 'queued') AS queued, SUM(status = 'queued' AND available_at <= ?) AS ready, "
+            "SUM(status = 'running') AS running, SUM(status = 'dead') AS dead, "
+            "MIN(CASE WHEN status = 'queued' AND available_at <= ? THEN available_at END) AS oldest "
+            "FROM evaluation_jobs",
+            (now, now)
+        ).fetchone()
+        oldest = (_now() - datetime.fromisoformat(row["oldest"])).total_seconds() if row["oldest"] else 0
+        return {
+            "backend": self.name,
+            "queued": row["queued"] or 0, "ready": row["ready"] or 0,
+            "running": row["running"] or 0, "dead": row["dead"] or 0,
+            "oldest_ready_age_seconds": oldest,
+        }
+
+    async def enqueue(self, kind, payload, team_id=None, dedupe_key=None, max_attempts=WORK_QUEUE_MAX_ATTEMPTS) -> bool:
+        return await asyncio.to_thread(self._enqueue, kind, payload, team_id, dedupe_key, max_attempts)
+
+    async def claim(self, worker_id, limit, visibility_timeout=WORK_QUEUE_VISIBILITY_TIMEOUT) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._claim, worker_id, limit, visibility_timeout)
+
+    async def extend_lease(self, job, visibility_timeout=WORK_QUEUE_VISIBILITY_TIMEOUT) -> bool:
+        return await asyncio.to_thread(self._extend_lease, job, visibility_timeout)
+
+    async def complete(self, job) -> bool:
+        return await asyncio.to_thread(self._complete, job)
+
+    async def fail(self, job, error) -> Optional[str]:
+        return await asyncio.to_thread(self._fail, job, error)
+
+    async def release(self, job, delay=WORK_QUEUE_DEFER_SECONDS) -> bool:
+        return await asyncio.to_thread(self._release, job, delay)
+
+    async def requeue_dead(self, limit: int = 1000) -> int:
+        return await asyncio.to_thread(self._requeue_dead, limit)
+
+    async def stats(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._stats)
+
+
+_queue: Optional[WorkQueue] = None
+_queue_lock = threading.Lock()
+
+def get_work_queue() -> Optional[WorkQueue]:
+    """The configured queue, or None when WORK_QUEUE_BACKEND=inline"""
+    global _queue
+    if WORK_QUEUE_BACKEND == "inline":
+        return None
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                if WORK_QUEUE_BACKEND == "db":
+                    _queue = DatabaseWorkQueue()
+                elif WORK_QUEUE_BACKEND == "sqlite":
+                    _queue = SQLiteWorkQueue()
+                else:
+                    raise ValueError(f"Unknown WORK_QUEUE_BACKEND '{WORK_QUEUE_BACKEND}' (expected inline, db or sqlite)")
+    return _queue
@@ -2,7 +2,8 @@ import os
 import json
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
-from app.repositories.persistence import PersistenceRepository
+from app.core.embedding_profile import EMBEDDING_MODEL, NATIVE_DIMENSIONS, get_embedding_profile
+from app.repositories.persistence import get_repository
 from app.services.integration_clients import fetch_all_events
 
 # --- MOCK OPENAI CLIENT ---
@@ -92,28 +93,33 @@ def generate_workflow_graph_with_llm(events: List[Dict]) -> Dict:
             "edges": []
         }
 
-def generate_embeddings(texts: List[str]) -> List[List[float]]:
-    """Generates vector embeddings for a list of strings"""
+def generate_embeddings(texts: List[str], profile: Optional[Dict[str, Any]] = None) -> List[List[float]]:
+    """Generates vector embeddings for a list of strings, sized for the embedding profile"""
+    profile = profile or get_embedding_profile()
+    dimensions = profile["dimensions"]
     client = get_openai_client()
     try:
         if isinstance(client, MockOpenAI):
-            # Return dummy 1536-dim vectors
-            return [[0.0] * 1536 for _ in texts]
+            # Return dummy vectors of the profile's size
+            return [[0.0] * dimensions for _ in texts]
 
-        response = client.embeddings.create(
-            input=texts,
-            model="text-embedding-3-small"
-        )
+        params = {"input": texts, "model": EMBEDDING_MODEL}
+        if dimensions != NATIVE_DIMENSIONS:
+            params["dimensions"] = dimensions  # Shortened server-side, already re-normalized
+        response = client.embeddings.create(**params)
         return [data.embedding for data in response.data]
     except Exception as e:
         print(f"Embedding Error: {e}")
-        return [[0.0] * 1536 for _ in texts]
+        return [[0.0] * dimensions for _ in texts]
 
-def infer_workflow(team_id: str, user_id: str = None) -> Dict[str, Any]:
-    """Main inference logic with UUID validation and Trace Logging"""
+def infer_workflow(team_id: str, user_id: str = None, shadow: bool = False) -> Dict[str, Any]:
+    """
+    Main inference logic with UUID validation and Trace Logging.
+    shadow=True saves the result as the team's shadow workflow instead of activating it.
+    """
     try:
         print(f"[TRACE] Starting Inference for Team: {team_id}", flush=True)
-        repo = PersistenceRepository()
+        repo = get_repository()
         
         real_team_id = team_id
         if user_id:
@@ -123,26 +129,32 @@ def infer_workflow(team_id: str, user_id: str = None) -> Dict[str, Any]:
         print(f"[TRACE] Resolved UUID: {real_team_id}. Fetching Events...", flush=True)
         events = fetch_all_events(real_team_id)
         
-        print(f"[TRACE] Events fetched: {len(events)}. Ingesting Signals...", flush=True)
-        signal_ids = repo.ingest_signals(real_team_id, events)
-        
-        print(f"[TRACE] Signals ingested. Creating Inference Run record...", flush=True)
+        print(f"[TRACE] Events fetched: {len(events)}. Creating Inference Run record...", flush=True)
         run_id = repo.create_inference_run(real_team_id, "manual_dashboard", {"model": "gpt-4"})
         
-        print(f"[TRACE] Linking run {run_id} to signals...", flush=True)
-        repo.link_signals_to_run(run_id, signal_ids)
+        print(f"[TRACE] Ingesting Signals and linking them to run {run_id}...", flush=True)
+        ingest = repo.ingest_signals(
+            real_team_id, events,
+            on_chunk=lambda ids: repo.link_signals_to_run(run_id, ids)
+        )
+        print(f"[TRACE] Signals ingested: {ingest['inserted']} new, {ingest['duplicates']} already known.", flush=True)
         
         print(f"[TRACE] Calling LLM Generation...", flush=True)
         workflow_graph = generate_workflow_graph_with_llm(events)
         
         print(f"[TRACE] LLM Success. Persisting Workflow to DB...", flush=True)
-        persisted_wf_id = repo.save_workflow(real_team_id, run_id, workflow_graph)
+        try:
+            persisted_wf_id = repo.save_workflow(real_team_id, run_id, workflow_graph, activate=not shadow)
+        except Exception:
+            repo.complete_inference_run(run_id, "failed")
+            raise
         
         print(f"[TRACE] Completion. Finalizing Run...", flush=True)
         repo.complete_inference_run(run_id, "success")
         
         workflow_graph["workflow_id"] = persisted_wf_id
         workflow_graph["team_id"] = real_team_id
+        workflow_graph["shadow"] = shadow
         return workflow_graph
         
     except Exception as e:
@@ -0,0 +1,224 @@
+"""
+Evaluation worker: consumes the durable work queue (WORK_QUEUE_BACKEND=db or sqlite) outside
+the web tier. Run as many processes as needed; jobs are leased, so workers never share one.
+
+Claimed jobs go through a per-worker fair scheduler (SCHEDULER_TEAM_CONCURRENCY jobs per team
+at once, weighted fair order across teams); a team with as many jobs already waiting gets the
+extra ones handed back to the queue for WORK_QUEUE_DEFER_SECONDS, so its flood stays in the
+queue instead of occupying this worker's slots.
+
+A job that fails or exceeds EVALUATION_TIMEOUT before its automation starts is retried with
+exponential backoff and dead-lettered after WORK_QUEUE_MAX_ATTEMPTS; a job whose automation ran
+is never retried, so the action is not executed twice. While a job is held (waiting in the
+scheduler or running) its lease is renewed every third of WORK_QUEUE_VISIBILITY_TIMEOUT, and once
+more right before the automation starts. A worker that dies mid-job stops renewing; its lease expires
+after WORK_QUEUE_VISIBILITY_TIMEOUT, then another worker picks the job up. If a lease is lost anyway
+(e.g. the database was unreachable for a while), the execution mark on the idempotency key keeps
+the second worker from running the automation again.
+
+Usage (from backend/):
+    python -m app.worker [--concurrency 8] [--poll-interval 1.0]
+    python -m app.worker --requeue-dead
+    python -m app.worker --stats
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from app.services.fair_scheduler import SCHEDULER_TEAM_CONCURRENCY, FairScheduler, SchedulerOverloaded
+from app.services.trigger_engine import run_evaluation, shadow_evaluator
+from app.services.work_queue import WORK_QUEUE_VISIBILITY_TIMEOUT, LeaseLost, WorkQueue, get_work_queue
+
+EVALUATION_TIMEOUT = float(os.environ.get("EVALUATION_TIMEOUT", "25"))
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "8"))
+WORKER_POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", "1.0"))
+WORKER_STATS_INTERVAL = float(os.environ.get("WORKER_STATS_INTERVAL", "60"))
+
+
+async def _evaluate_signal(job: Dict[str, Any], timeout: float, renew_lease: Callable[[], Awaitable[None]]):
+    payload = job["payload"]
+    # Only the first attempt claims the idempotency key; retries must not see it as a duplicate,
+    # but do check whether an earlier attempt already executed (see run_evaluation).
+    # The timeout stops at execution, so a slow automation is not cut off and run twice.
+    await run_evaluation(payload["team_id"], payload["signal"], dry_run=payload.get("dry_run", False),
+                         claim=job["attempts"] <= 1, timeout=timeout, before_execute=renew_lease)
+
+
+# Handlers get the job, the worker's timeout (applied only to work that is safe to repeat) and a
+# callback renewing the job's lease, to await right before any side effect that must not repeat
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], float, Callable[[], Awaitable[None]]], Awaitable[None]]] = {
+    "evaluate_signal": _evaluate_signal,
+}
+
+
+class Worker:
+    def __init__(self, queue: WorkQueue, concurrency: int = WORKER_CONCURRENCY, poll_interval: float = WORKER_POLL_INTERVAL,
+                 timeout: float = EVALUATION_TIMEOUT, visibility_timeout: int = WORK_QUEUE_VISIBILITY_TIMEOUT):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.visibility_timeout = visibility_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # Backlog = team concurrency: beyond that a team's jobs wait in the queue, not in this worker
+        self.scheduler = FairScheduler(max_concurrency=concurrency, team_concurrency=SCHEDULER_TEAM_CONCURRENCY,
+                                       max_backlog=SCHEDULER_TEAM_CONCURRENCY)
+        self.counters = {"completed": 0, "retried": 0, "dead": 0, "deferred": 0, "lost_leases": 0}
+        self._stopping = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def stop(self):
+        if not self._stopping.is_set():
+            print(f"[Worker] Stopping: finishing {len(self._tasks)} in-flight jobs")
+            self._stopping.set()
+
+    async def run(self):
+        print(f"[Worker] {self.worker_id} started ({self.queue.name} queue, concurrency {self.concurrency})")
+        last_stats = time.monotonic()
+        while not self._stopping.is_set():
+            free = self.concurrency - len(self._tasks)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await self.queue.claim(self.worker_id, free, self.visibility_timeout)
+                except Exception as e:
+                    print(f"[DB Error] Claim jobs: {e}")
+            for job in jobs:
+                task = asyncio.ensure_future(self._process(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            if time.monotonic() - last_stats >= WORKER_STATS_INTERVAL:
+                last_stats = time.monotonic()
+                await self._log_stats()
+            if not jobs:
+                # Idle (or saturated): wait for a poll tick, a finished job or a stop request
+                waiters = [asyncio.ensure_future(self._stopping.wait())] + list(self._tasks)
+                await asyncio.wait(waiters, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                waiters[0].cancel()
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._log_stats()
+
+    async def _process(self, job: Dict[str, Any]):
+        handler = JOB_HANDLERS.get(job["kind"])
+        team_id = job.get("team_id") or job["payload"].get("team_id") or "-"
+        # The lease is renewed from the claim on, time spent waiting in the scheduler included
+        heartbeat = asyncio.ensure_future(self._heartbeat(job))
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job kind '{job['kind']}'")
+            await self.scheduler.run(team_id, lambda: handler(job, self.timeout, lambda: self._renew_lease(job)))
+        except SchedulerOverloaded:
+            await self._release(job)
+            return
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            await self._fail(job, error)
+            return
+        finally:
+            heartbeat.cancel()
+        try:
+            if not await self.queue.complete(job):
+                self.counters["lost_leases"] += 1
+                print(f"⚠️ [Worker] Lease lost before completing job {job['id']} (ran longer than the visibility timeout)")
+                return
+            self.counters["completed"] += 1
+        except Exception as e:
+            print(f"[DB Error] Complete job {job['id']}: {e}")
+
+    async def _heartbeat(self, job: Dict[str, Any]):
+        """Renews the job's lease every third of the visibility timeout until cancelled or the lease is lost"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                if not await self.queue.extend_lease(job, self.visibility_timeout):
+                    print(f"⚠️ [Worker] Lease lost for job {job['id']}: another worker may have claimed it")
+                    return
+            except Exception as e:
+                print(f"[DB Error] Extend lease for job {job['id']}: {e}")
+
+    async def _renew_lease(self, job: Dict[str, Any]):
+        """Renews the lease now; raises LeaseLost (so nothing more is done) if another worker holds the job"""
+        if not await self.queue.extend_lease(job, self.visibility_timeout):
+            raise LeaseLost(f"Lease lost for job {job['id']}")
+
+    async def _release(self, job: Dict[str, Any]):
+        try:
+            if await self.queue.release(job):
+                self.counters["deferred"] += 1
+            else:
+                self.counters["lost_leases"] += 1
+        except Exception as e:
+            print(f"[DB Error] Release job {job['id']}: {e}")
+
+    async def _fail(self, job: Dict[str, Any], error: str):
+        try:
+            status = await self.queue.fail(job, error)
+        except Exception as e:
+            print(f"[DB Error] Fail job {job['id']}: {e}")
+            return
+        if status is None:
+            self.counters["lost_leases"] += 1
+        elif status == "dead":
+            self.counters["dead"] += 1
+            print(f"❌ [Worker] Job {job['id']} dead-lettered after {job['attempts']} attempts: {error}")
+        else:
+            self.counters["retried"] += 1
+            print(f"⚠️ [Worker] Job {job['id']} attempt {job['attempts']}/{job['max_attempts']} failed, will retry: {error}")
+
+    async def _log_stats(self):
+        try:
+            depth = await self.queue.stats()
+        except Exception as e:
+            depth = {"error": str(e)}
+        scheduler = self.scheduler.stats()
+        backlogged = {t: s["queued"] for t, s in scheduler["teams"].items() if s["queued"]}
+        print(f"[Worker] {json.dumps({**self.counters, 'in_flight': len(self._tasks), 'backlogged_teams': backlogged, 'queue': depth}, default=str)}", flush=True)
+
+
+async def _main(args):
+    queue = get_work_queue()
+    if queue is None:
+        raise SystemExit("WORK_QUEUE_BACKEND is 'inline': set it to 'db' or 'sqlite' to run a worker")
+
+    if args.requeue_dead:
+        print(f"[Worker] Requeued {await queue.requeue_dead()} dead jobs")
+        return
+    if args.stats:
+        print(json.dumps(await queue.stats(), indent=2, default=str))
+        return
+
+    worker = Worker(queue, concurrency=args.concurrency, poll_interval=args.poll_interval)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        from app.core.database import close_async_supabase_client, close_supabase_client
+        from app.services.audit_writer import audit_writer
+        await shadow_evaluator.drain(timeout=5)  # Let in-flight shadow decisions reach the DB
+        audit_writer.close()  # Flush buffered audit rows while the DB client is still open
+        close_supabase_client()
+        await close_async_supabase_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Jobs evaluated at once")
+    parser.add_argument("--poll-interval", type=float, default=WORKER_POLL_INTERVAL, help="Seconds between claims when idle")
+    parser.add_argument("--requeue-dead", action="store_true", help="Move dead-lettered jobs back to the queue and exit")
+    parser.add_argument("--stats", action="store_true", help="Print queue depth and exit")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
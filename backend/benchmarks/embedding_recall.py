@@ -0,0 +1,101 @@
+"""
+Benchmark: compact embedding profile (512-dim halfvec) vs. the full profile (1536-dim vector).
+
+Reports recall@k of the compact top-k against the full top-k (cosine, exact search), bytes per
+stored vector and JSON insert payload per vector.
+
+With OPENAI_API_KEY set, embeds --corpus (one text per line) once at 1536 dimensions and derives
+the compact vectors the way the API's `dimensions` parameter does (prefix, re-normalized), then
+rounds them to float16 as halfvec stores them. Without a key, synthetic vectors with
+Matryoshka-style decaying variance are used; those numbers are only indicative.
+
+Usage (from backend/):
+    python -m benchmarks.embedding_recall [--corpus docs.txt] [--queries 50] [--k 5 10]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import struct
+import time
+from operator import mul
+from typing import List
+
+from app.core.embedding_profile import EMBEDDING_MODEL, NATIVE_DIMENSIONS, bytes_per_vector, get_embedding_profile
+
+
+def normalize(v: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in v)) or 1.0
+    return [x / norm for x in v]
+
+
+def to_half(v: List[float]) -> List[float]:
+    return list(struct.unpack(f"{len(v)}e", struct.pack(f"{len(v)}e", *v)))
+
+
+def shorten(v: List[float], dimensions: int) -> List[float]:
+    return normalize(v[:dimensions])
+
+
+def top_k(query: List[float], corpus: List[List[float]], k: int, skip: int) -> List[int]:
+    # Vectors are unit length, so the dot product is the cosine similarity
+    scores = [(sum(map(mul, query, doc)), i) for i, doc in enumerate(corpus) if i != skip]
+    return [i for _, i in sorted(scores, reverse=True)[:k]]
+
+
+def synthetic_vectors(n: int, seed: int = 7) -> List[List[float]]:
+    rng = random.Random(seed)
+    scales = [math.exp(-i / 300) for i in range(NATIVE_DIMENSIONS)]
+    topics = [[rng.gauss(0, s) for s in scales] for _ in range(max(8, n // 25))]
+    return [normalize([t + rng.gauss(0, 0.6 * s) for t, s in zip(rng.choice(topics), scales)]) for _ in range(n)]
+
+
+def openai_vectors(texts: List[str]) -> List[List[float]]:
+    from openai import OpenAI
+    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    vectors = []
+    for i in range(0, len(texts), 256):
+        res = client.embeddings.create(input=texts[i:i + 256], model=EMBEDDING_MODEL)
+        vectors.extend(normalize(d.embedding) for d in res.data)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Text file, one document per line (requires OPENAI_API_KEY)")
+    parser.add_argument("--size", type=int, default=1000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=50, help="Corpus items reused as queries")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    args = parser.parse_args()
+
+    full_profile, compact_profile = get_embedding_profile("full"), get_embedding_profile("compact")
+    if args.corpus and os.environ.get("OPENAI_API_KEY"):
+        with open(args.corpus) as f:
+            texts = [line.strip() for line in f if line.strip()]
+        full = openai_vectors(texts)
+        source = f"{EMBEDDING_MODEL}, {len(full)} documents from {args.corpus}"
+    else:
+        full = synthetic_vectors(args.size)
+        source = f"synthetic, {len(full)} vectors (indicative only)"
+    compact = [to_half(shorten(v, compact_profile["dimensions"])) for v in full]
+
+    query_ids = random.Random(1).sample(range(len(full)), min(args.queries, len(full)))
+    print(f"Embedding recall: {source}, {len(query_ids)} queries")
+    start = time.perf_counter()
+    for k in args.k:
+        hits = 0
+        for q in query_ids:
+            truth = set(top_k(full[q], full, k, q))
+            hits += len(truth & set(top_k(compact[q], compact, k, q)))
+        print(f"  recall@{k:<3} {hits / (k * len(query_ids)):.3f}")
+    print(f"  ({(time.perf_counter() - start):.1f}s exact search)")
+
+    for profile, sample in ((full_profile, full[0]), (compact_profile, compact[0])):
+        payload = len(json.dumps([round(x, 8) for x in sample]))
+        print(f"  {profile['name']:>8}: {profile['dimensions']:>4} x {profile['storage']:<7} {bytes_per_vector(profile):>5} B/vector stored, ~{payload} B/vector JSON payload")
+    print(f"  storage ratio {bytes_per_vector(full_profile) / bytes_per_vector(compact_profile):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: per-signal latency of the trigger pipeline (run_evaluation), one signal at a time and
+as a concurrent burst, with the average time spent in each stage.
+
+DB round trips, the embeddings call and the LLM match are simulated with fixed delays; the
+decision cache and LLM micro-batching are disabled so every signal pays the full pipeline.
+
+Usage (from backend/):
+    python -m benchmarks.evaluate_signal_latency [--db-ms 30] [--embed-ms 120] [--llm-ms 600] [--signals 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("PERSISTENCE_BACKEND", "memory")
+
+from app.repositories.persistence import get_repository
+from app.services import prefilter as prefilter_module
+from app.services import rag_service, trigger_engine
+from app.services.audit_writer import audit_writer
+from app.services.decision_cache import decision_cache
+from app.services.tracing import stage_metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-ms", type=float, default=30.0, help="Simulated DB round trip")
+    parser.add_argument("--embed-ms", type=float, default=120.0, help="Simulated embeddings request")
+    parser.add_argument("--llm-ms", type=float, default=600.0, help="Simulated LLM match")
+    parser.add_argument("--signals", type=int, default=20)
+    args = parser.parse_args()
+
+    def embed(texts, profile=None):
+        time.sleep(args.embed_ms / 1000.0)
+        return [[1.0] + [0.0] * 63 for _ in texts]
+
+    def llm(signal_text, nodes, context_text=""):
+        time.sleep(args.llm_ms / 1000.0)
+        return nodes[0], 0.95, "benchmark"
+
+    for module in (trigger_engine, prefilter_module, rag_service):
+        module.generate_embeddings = embed
+    trigger_engine._match_signal_to_nodes = llm
+    trigger_engine._match_signal_batch = lambda items, nodes: [llm(t, nodes, c) for t, c in items]
+    trigger_engine.batch_evaluator.match_fn = trigger_engine._match_signal_batch
+    trigger_engine.batch_evaluator.window = 0
+    trigger_engine.run_automation_logic = lambda team_id, action, params: {"success": True}
+    decision_cache.enabled = False
+
+    repo = get_repository()
+    team_id = repo.get_or_create_team("Bench Team", "bench-owner")
+    run_id = repo.create_inference_run(team_id, "benchmark")
+    repo.save_workflow(team_id, run_id, {"nodes": [{"id": "1", "type": "process", "data": {"label": "Create Jira ticket"}}], "edges": []})
+    repo.set_node_auto_run_status(repo.get_active_workflow(team_id)["workflow_id"], "1", True)
+    repo.db.latency_ms = args.db_ms
+
+    def signal(tag, i):
+        return {"id": f"{tag}-{i}", "text": f"please open a jira ticket {tag} {i}", "source": "bench"}
+
+    async def one_at_a_time():
+        for i in range(args.signals):
+            await trigger_engine.run_evaluation(team_id, signal("serial", i))
+
+    async def burst():
+        await asyncio.gather(*(trigger_engine.run_evaluation(team_id, signal("burst", i)) for i in range(args.signals)))
+
+    print(f"run_evaluation, {args.signals} signals: db {args.db_ms}ms, embed {args.embed_ms}ms, llm {args.llm_ms}ms")
+    stdout = sys.stdout
+    for name, fn in (("one at a time", one_at_a_time), ("burst", burst)):
+        sys.stdout = open(os.devnull, "w")
+        try:
+            start = time.perf_counter()
+            asyncio.run(fn())
+            elapsed = (time.perf_counter() - start) * 1000 / args.signals
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        # A burst overlaps the LLM calls, so only the serial figure can be split
+        excluding = f", {elapsed - args.llm_ms:7.1f} ms excluding the LLM" if fn is one_at_a_time else " (wall time / signals)"
+        print(f"{name:>20}: {elapsed:7.1f} ms/signal{excluding}")
+    stages = stage_metrics.stats()["stages"]
+    print("  avg per stage: " + ", ".join(f"{stage} {h['avg_ms']}ms" for stage, h in stages.items() if stage != "total"))
+    audit_writer.close()
+
+
+if __name__ == "__main__":
+    main()
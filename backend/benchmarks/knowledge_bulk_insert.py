@@ -0,0 +1,48 @@
+"""
+Benchmark: knowledge-base backfill, legacy sequential 100-row inserts vs. parallel chunked bulk_insert_knowledge.
+
+Usage (from backend/):
+    python -m benchmarks.knowledge_bulk_insert [--latency-ms 80] [--rows 2000] [--concurrency 4]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("PERSISTENCE_BACKEND", "memory")
+
+from app.repositories.persistence import PersistenceRepository
+
+
+def legacy_insert(repo: PersistenceRepository, rows):
+    """The pre-change path: one chunk after another"""
+    for i in range(0, len(rows), 100):
+        repo.db.table("knowledge_base").insert(rows[i:i + 100]).execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Simulated round trip per request")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    repo = PersistenceRepository()
+    team_id = repo.get_or_create_team("Bench Team", "bench-owner")
+
+    def make_rows(tag):
+        return [{"team_id": team_id, "content": f"{tag} doc {i}", "embedding": None, "metadata": {}} for i in range(args.rows)]
+
+    repo.db.latency_ms = args.latency_ms
+    print(f"bulk_insert_knowledge, {args.rows} rows, {args.latency_ms}ms simulated RTT")
+    for name, fn in (
+        ("legacy sequential", lambda: legacy_insert(repo, make_rows("legacy"))),
+        (f"parallel x{args.concurrency}", lambda: repo.bulk_insert_knowledge(make_rows("parallel"), concurrency=args.concurrency)),
+    ):
+        repo.db.reset_stats()
+        start = time.perf_counter()
+        fn()
+        print(f"{name:>20}: {(time.perf_counter() - start) * 1000:8.1f} ms, {repo.db.query_count} queries")
+
+
+if __name__ == "__main__":
+    main()
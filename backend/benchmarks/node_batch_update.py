@@ -0,0 +1,52 @@
+"""
+Benchmark: editor save of N nodes, legacy per-node UPDATE loop vs. update_workflow_nodes_batch RPC.
+
+Usage (from backend/):
+    python -m benchmarks.node_batch_update [--latency-ms 25] [--sizes 5,20,40,80]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("PERSISTENCE_BACKEND", "memory")
+
+from app.repositories.persistence import PersistenceRepository
+
+
+def legacy_update(repo: PersistenceRepository, workflow_id: str, nodes):
+    """The pre-RPC path: one UPDATE round trip per node"""
+    for node in nodes:
+        repo.db.table("workflow_nodes").update({"metadata": node["metadata"]})\
+            .eq("workflow_id", workflow_id).eq("step_id", node["id"]).execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=25.0, help="Simulated round trip per request")
+    parser.add_argument("--sizes", default="5,20,40,80")
+    args = parser.parse_args()
+
+    repo = PersistenceRepository()
+    team_id = repo.get_or_create_team("Bench Team", "bench-owner")
+    run_id = repo.create_inference_run(team_id, "benchmark")
+
+    print(f"update_workflow_nodes_batch, {args.latency_ms}ms simulated RTT")
+    print(f"{'nodes':>6}{'legacy ms':>12}{'legacy q':>10}{'batch ms':>11}{'batch q':>9}")
+    for size in [int(n) for n in args.sizes.split(",")]:
+        repo.db.latency_ms = 0
+        graph = {"title": "Bench", "nodes": [{"id": str(i), "data": {"label": f"Step {i}"}} for i in range(size)], "edges": []}
+        workflow_id = repo.save_workflow(team_id, run_id, graph)
+        edits = [{"id": str(i), "metadata": {"label": f"Step {i}", "position": {"x": i, "y": i}}} for i in range(size)]
+        repo.db.latency_ms = args.latency_ms
+
+        row = [size]
+        for fn in (lambda: legacy_update(repo, workflow_id, edits), lambda: repo.update_workflow_nodes_batch(workflow_id, edits)):
+            repo.db.reset_stats()
+            start = time.perf_counter()
+            fn()
+            row += [(time.perf_counter() - start) * 1000, repo.db.query_count]
+        print(f"{row[0]:>6}{row[1]:>12.1f}{row[2]:>10}{row[3]:>11.1f}{row[4]:>9}")
+
+
+if __name__ == "__main__":
+    main()
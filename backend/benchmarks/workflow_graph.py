@@ -0,0 +1,88 @@
+"""
+Benchmark: active workflow graph assembly, legacy three-query path vs. single embedded select
+vs. the per-worker workflow cache.
+
+Runs against the in-process storage backend with a simulated network round trip,
+so the difference is the number of sequential requests rather than DB work.
+
+Usage (from backend/):
+    python -m benchmarks.workflow_graph [--latency-ms 25] [--nodes 40] [--iterations 50]
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("PERSISTENCE_BACKEND", "memory")
+
+from app.repositories.persistence import PersistenceRepository, assemble_workflow_graph
+
+
+def legacy_get_active_workflow(repo: PersistenceRepository, team_id: str):
+    """The pre-embedding path: workflow row, then nodes, then edges (3 round trips)"""
+    w_res = repo.db.table("workflows").select("*").eq("team_id", team_id).eq("is_active", True).maybe_single().execute()
+    workflow = dict(w_res.data)
+    workflow["workflow_nodes"] = repo.db.table("workflow_nodes").select("*").eq("workflow_id", workflow["id"]).execute().data
+    workflow["workflow_edges"] = repo.db.table("workflow_edges").select("*").eq("workflow_id", workflow["id"]).execute().data
+    return assemble_workflow_graph(workflow, workflow["workflow_nodes"], workflow["workflow_edges"])
+
+
+def seed(repo: PersistenceRepository, node_count: int) -> str:
+    team_id = repo.get_or_create_team("Bench Team", "bench-owner")
+    run_id = repo.create_inference_run(team_id, "benchmark")
+    nodes = [{"id": str(i), "type": "process", "data": {"label": f"Step {i}", "description": "..."}} for i in range(node_count)]
+    edges = [{"source": str(i), "target": str(i + 1), "label": "next"} for i in range(node_count - 1)]
+    repo.save_workflow(team_id, run_id, {"title": "Benchmark", "nodes": nodes, "edges": edges})
+    return team_id
+
+
+def measure(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+        "mean": statistics.mean(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=25.0, help="Simulated round trip per request")
+    parser.add_argument("--nodes", type=int, default=40)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    repo = PersistenceRepository()
+    team_id = seed(repo, args.nodes)
+    repo.db.latency_ms = args.latency_ms
+
+    results = {}
+    def uncached():
+        repo.workflow_cache.clear()
+        return repo.get_active_workflow(team_id)
+
+    for name, fn in [
+        ("legacy (3 queries)", lambda: legacy_get_active_workflow(repo, team_id)),
+        ("embedded select", uncached),
+        ("workflow cache", lambda: repo.get_active_workflow(team_id)),
+    ]:
+        repo.db.reset_stats()
+        results[name] = measure(fn, args.iterations)
+        results[name]["queries"] = repo.db.query_count / args.iterations
+
+    cached = {k: v for k, v in repo.get_active_workflow(team_id).items() if k != "version"}
+    assert legacy_get_active_workflow(repo, team_id) == cached
+
+    print(f"get_active_workflow: {args.nodes} nodes, {args.latency_ms}ms simulated RTT, {args.iterations} iterations")
+    print(f"{'path':<22}{'queries':>9}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['queries']:>9.0f}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['mean']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+-- Batch update of workflow nodes in one round trip and one transaction.
+-- Replaces the per-node UPDATE loop in PersistenceRepository.update_workflow_nodes_batch.
+--
+-- p_nodes: [{ "id": "<step_id>", "label": "...", "description": "...", "auto_run_enabled": true, "metadata": {...} }, ...]
+-- Only keys present on an element are written (partial-field semantics); absent keys keep their value.
+-- Returns one row per input element: (node_id, updated) where updated = a matching node existed.
+
+CREATE OR REPLACE FUNCTION public.update_workflow_nodes_batch(
+    p_workflow_id UUID,
+    p_nodes JSONB
+)
+RETURNS TABLE (
+    node_id TEXT,
+    updated BOOLEAN
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH input AS (
+        SELECT elem, elem->>'id' AS sid, ord
+        FROM jsonb_array_elements(p_nodes) WITH ORDINALITY AS t(elem, ord)
+    ),
+    changed AS (
+        UPDATE public.workflow_nodes n
+        SET
+            label = CASE WHEN i.elem ? 'label' THEN i.elem->>'label' ELSE n.label END,
+            description = CASE WHEN i.elem ? 'description' THEN i.elem->>'description' ELSE n.description END,
+            auto_run_enabled = CASE WHEN i.elem ? 'auto_run_enabled' THEN (i.elem->>'auto_run_enabled')::BOOLEAN ELSE n.auto_run_enabled END,
+            metadata = CASE WHEN i.elem ? 'metadata' THEN i.elem->'metadata' ELSE n.metadata END
+        FROM input i
+        WHERE n.workflow_id = p_workflow_id
+        AND n.step_id = i.sid
+        RETURNING n.step_id AS changed_step_id
+    )
+    SELECT i.sid, EXISTS (SELECT 1 FROM changed c WHERE c.changed_step_id = i.sid)
+    FROM input i
+    ORDER BY i.ord;
+END;
+$$;
@@ -0,0 +1,55 @@
+-- Atomic workflow save: deactivate the current graph, insert the new workflow as active
+-- and write its nodes and edges in one transaction and one network call.
+-- Replaces the four sequential requests in PersistenceRepository.save_workflow, which raced
+-- the idx_unique_active_workflow partial index and could leave half-written graphs behind.
+--
+-- p_nodes: React Flow nodes  [{ "id": "1", "type": "process", "data": { "label": ..., "description": ..., "actor": ... } }, ...]
+-- p_edges: React Flow edges  [{ "source": "1", "target": "2", "label": "..." }, ...]
+
+CREATE OR REPLACE FUNCTION public.save_workflow_graph(
+    p_team_id UUID,
+    p_inference_run_id UUID,
+    p_title TEXT,
+    p_nodes JSONB,
+    p_edges JSONB
+)
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_workflow_id UUID;
+BEGIN
+    -- Serialize concurrent saves for the same team; released at commit/rollback
+    PERFORM pg_advisory_xact_lock(hashtext('save_workflow_graph:' || p_team_id::TEXT));
+
+    UPDATE public.workflows
+    SET is_active = FALSE
+    WHERE team_id = p_team_id AND is_active = TRUE;
+
+    INSERT INTO public.workflows (team_id, inference_run_id, title, is_active)
+    VALUES (p_team_id, p_inference_run_id, COALESCE(p_title, 'Generated Workflow'), TRUE)
+    RETURNING id INTO v_workflow_id;
+
+    INSERT INTO public.workflow_nodes (workflow_id, step_id, label, type, description, actor, metadata)
+    SELECT
+        v_workflow_id,
+        n->>'id',
+        COALESCE(n->'data'->>'label', 'Untitled'),
+        COALESCE(n->>'type', 'process'),
+        COALESCE(n->'data'->>'description', ''),
+        COALESCE(n->'data'->>'actor', ''),
+        COALESCE(n->'data', '{}'::JSONB)
+    FROM jsonb_array_elements(COALESCE(p_nodes, '[]'::JSONB)) AS n;
+
+    INSERT INTO public.workflow_edges (workflow_id, source_step_id, target_step_id, label, condition)
+    SELECT
+        v_workflow_id,
+        e->>'source',
+        e->>'target',
+        COALESCE(e->>'label', ''),
+        ''
+    FROM jsonb_array_elements(COALESCE(p_edges, '[]'::JSONB)) AS e;
+
+    RETURN v_workflow_id;
+END;
+$$;
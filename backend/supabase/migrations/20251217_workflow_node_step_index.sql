@@ -0,0 +1,10 @@
+-- Workflow-scoped node lookups
+-- Step ids produced by the LLM ("1", "2", "3", ...) repeat across every workflow version, so
+-- node flag reads/toggles filter on (workflow_id, step_id). This composite index serves them
+-- (and, through its leading column, the per-workflow node fetch).
+
+CREATE INDEX IF NOT EXISTS idx_workflow_nodes_workflow_step
+ON public.workflow_nodes(workflow_id, step_id);
+
+-- Superseded by the composite index above
+DROP INDEX IF EXISTS public.idx_nodes_workflow;
@@ -0,0 +1,55 @@
+-- Dedicated idempotency store for Auto-Pilot evaluation
+-- Replaces the unindexed scan of inference_runs.model_config->>'idempotency_key'.
+-- Keys are claimed atomically *before* evaluation starts; expired keys can be re-claimed.
+
+CREATE TABLE IF NOT EXISTS public.idempotency_keys (
+    team_id UUID REFERENCES public.teams(id) ON DELETE CASCADE NOT NULL,
+    key TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (team_id, key)
+);
+
+ALTER TABLE public.idempotency_keys ENABLE ROW LEVEL SECURITY;
+-- No policies: only the service role (backend) reads/writes this table.
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON public.idempotency_keys(expires_at);
+
+-- Returns TRUE if the caller claimed the key (first sighting, or the previous claim expired),
+-- FALSE if it is a duplicate. Single statement, so concurrent claims cannot both win.
+CREATE OR REPLACE FUNCTION public.claim_idempotency_key(
+    p_team_id UUID,
+    p_key TEXT,
+    p_ttl_seconds INT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_claimed BOOLEAN;
+BEGIN
+    INSERT INTO public.idempotency_keys AS k (team_id, key, expires_at)
+    VALUES (p_team_id, p_key, NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (team_id, key) DO UPDATE
+        SET created_at = NOW(), expires_at = EXCLUDED.expires_at
+        WHERE k.expires_at <= NOW()
+    RETURNING TRUE INTO v_claimed;
+
+    RETURN COALESCE(v_claimed, FALSE);
+END;
+$$;
+
+-- Housekeeping. Schedule with pg_cron, e.g.:
+--   select cron.schedule('purge-idempotency-keys', '*/15 * * * *', 'select public.purge_expired_idempotency_keys()');
+CREATE OR REPLACE FUNCTION public.purge_expired_idempotency_keys()
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_deleted INT;
+BEGIN
+    DELETE FROM public.idempotency_keys WHERE expires_at <= NOW();
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN v_deleted;
+END;
+$$;
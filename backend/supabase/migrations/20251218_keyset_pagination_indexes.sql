@@ -0,0 +1,21 @@
+-- Keyset pagination for knowledge, workflow history and Auto-Pilot audit listings
+-- Pages are ordered by (timestamp DESC, id DESC) and resumed with
+--   WHERE team_id = $1 AND (ts < $2 OR (ts = $2 AND id < $3))
+-- so every page is an index range scan, independent of how deep the client has paged.
+
+-- knowledge_base.created_at was nullable; NULLs would silently drop out of a keyset walk.
+UPDATE public.knowledge_base SET created_at = COALESCE(updated_at, NOW()) WHERE created_at IS NULL;
+ALTER TABLE public.knowledge_base ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_team_created_id
+    ON public.knowledge_base(team_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_workflows_team_created_id
+    ON public.workflows(team_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_inference_runs_team_started_id
+    ON public.inference_runs(team_id, started_at DESC, id DESC);
+
+-- Superseded: the new indexes share their leading columns
+DROP INDEX IF EXISTS public.idx_workflows_team_created;
+DROP INDEX IF EXISTS public.idx_inference_runs_team_started;
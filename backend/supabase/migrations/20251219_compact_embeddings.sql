@@ -0,0 +1,106 @@
+-- Compact embedding profile (EMBEDDING_PROFILE=compact, see app/core/embedding_profile.py)
+-- text-embedding-3-small shortened to 512 dimensions (API `dimensions` parameter) and stored as
+-- half precision: 1024 bytes per vector instead of 6144 for vector(1536).
+-- Requires pgvector >= 0.7 (halfvec). pgvector has no int8 vector type; `bit` binary quantization
+-- is too lossy for the short texts we embed, so halfvec is the quantized format used here.
+-- The 1536-dim columns are left in place until the backfill (python -m app.jobs.reembed) has run
+-- and the profile has been switched; drop them in a follow-up migration.
+
+ALTER TABLE public.knowledge_base ADD COLUMN IF NOT EXISTS embedding_compact halfvec(512);
+ALTER TABLE public.raw_signals ADD COLUMN IF NOT EXISTS embedding_compact halfvec(512);
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_embedding_compact
+    ON public.knowledge_base USING hnsw (embedding_compact halfvec_cosine_ops);
+
+-- HNSW rather than the ivfflat used for the full column: no training step, so it is valid
+-- while the column is still being backfilled.
+CREATE INDEX IF NOT EXISTS idx_raw_signals_embedding_compact
+    ON public.raw_signals USING hnsw (embedding_compact halfvec_cosine_ops);
+
+CREATE OR REPLACE FUNCTION public.match_knowledge_base_compact (
+    query_embedding halfvec(512),
+    match_threshold FLOAT,
+    match_count INT,
+    filter_team_id UUID
+)
+RETURNS TABLE (
+    id UUID,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        kb.id,
+        kb.content,
+        kb.metadata,
+        1 - (kb.embedding_compact <=> query_embedding) AS similarity
+    FROM public.knowledge_base kb
+    WHERE kb.team_id = filter_team_id
+    AND 1 - (kb.embedding_compact <=> query_embedding) > match_threshold
+    ORDER BY kb.embedding_compact <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.match_signals_compact (
+    query_embedding halfvec(512),
+    match_threshold FLOAT,
+    match_count INT,
+    filter_team_id UUID
+)
+RETURNS TABLE (
+    id UUID,
+    content TEXT,
+    occurred_at TIMESTAMPTZ,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        rs.id,
+        rs.content,
+        rs.occurred_at,
+        1 - (rs.embedding_compact <=> query_embedding) AS similarity
+    FROM public.raw_signals rs
+    WHERE rs.team_id = filter_team_id
+    AND 1 - (rs.embedding_compact <=> query_embedding) > match_threshold
+    ORDER BY rs.embedding_compact <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+-- Backfill writer: one UPDATE per batch of [{ "id": uuid, "embedding": [floats] }, ...].
+-- Only fills rows that are still NULL, so re-running the job is harmless.
+CREATE OR REPLACE FUNCTION public.set_compact_embeddings(
+    p_table TEXT,
+    p_rows JSONB
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_updated INT;
+BEGIN
+    IF p_table = 'knowledge_base' THEN
+        UPDATE public.knowledge_base t
+        SET embedding_compact = (r.value->>'embedding')::halfvec(512)
+        FROM jsonb_array_elements(p_rows) AS r
+        WHERE t.id = (r.value->>'id')::uuid AND t.embedding_compact IS NULL;
+    ELSIF p_table = 'raw_signals' THEN
+        UPDATE public.raw_signals t
+        SET embedding_compact = (r.value->>'embedding')::halfvec(512)
+        FROM jsonb_array_elements(p_rows) AS r
+        WHERE t.id = (r.value->>'id')::uuid AND t.embedding_compact IS NULL;
+    ELSE
+        RAISE EXCEPTION 'set_compact_embeddings: unsupported table %', p_table;
+    END IF;
+    GET DIAGNOSTICS v_updated = ROW_COUNT;
+    RETURN v_updated;
+END;
+$$;
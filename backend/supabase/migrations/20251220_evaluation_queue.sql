@@ -0,0 +1,127 @@
+-- Durable Auto-Pilot evaluation queue (WORK_QUEUE_BACKEND=db, consumed by `python -m app.worker`)
+-- Jobs are claimed with FOR UPDATE SKIP LOCKED, so any number of workers can poll concurrently
+-- without double-claiming. A claim is a lease: if the worker dies, the job becomes claimable again
+-- once leased_until passes. Completed jobs are deleted; jobs out of attempts stay as status 'dead'.
+
+CREATE TABLE IF NOT EXISTS public.evaluation_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    team_id UUID REFERENCES public.teams(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL DEFAULT 'evaluate_signal',
+    payload JSONB NOT NULL,
+    dedupe_key TEXT UNIQUE,                 -- NULLs are distinct: jobs without a key never collide
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued | running | dead
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    leased_until TIMESTAMPTZ,
+    lease_token UUID,
+    worker_id TEXT,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE public.evaluation_jobs ENABLE ROW LEVEL SECURITY;
+-- No policies: only the service role (backend, workers) reads/writes this table.
+
+CREATE INDEX IF NOT EXISTS idx_evaluation_jobs_ready
+    ON public.evaluation_jobs(available_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_evaluation_jobs_leases
+    ON public.evaluation_jobs(leased_until) WHERE status = 'running';
+
+-- Leases up to p_limit ready jobs (queued and due, or running with an expired lease).
+-- Expired leases that have used up their attempts are dead-lettered instead.
+CREATE OR REPLACE FUNCTION public.claim_evaluation_jobs(
+    p_worker_id TEXT,
+    p_limit INT,
+    p_visibility_seconds INT
+)
+RETURNS SETOF public.evaluation_jobs
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE public.evaluation_jobs
+    SET status = 'dead', leased_until = NULL, lease_token = NULL, updated_at = NOW(),
+        last_error = COALESCE(last_error, 'lease expired')
+    WHERE status = 'running' AND leased_until <= NOW() AND attempts >= max_attempts;
+
+    RETURN QUERY
+    WITH ready AS (
+        SELECT j.id
+        FROM public.evaluation_jobs j
+        WHERE (j.status = 'queued' AND j.available_at <= NOW())
+           OR (j.status = 'running' AND j.leased_until <= NOW())
+        ORDER BY j.available_at, j.created_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE public.evaluation_jobs j
+    SET status = 'running',
+        attempts = j.attempts + 1,
+        leased_until = NOW() + make_interval(secs => p_visibility_seconds),
+        lease_token = gen_random_uuid(),
+        worker_id = p_worker_id,
+        updated_at = NOW()
+    FROM ready
+    WHERE j.id = ready.id
+    RETURNING j.*;
+END;
+$$;
+
+-- Acknowledges a job. FALSE if the lease was lost (expired and re-claimed elsewhere).
+CREATE OR REPLACE FUNCTION public.complete_evaluation_job(
+    p_id UUID,
+    p_lease_token UUID
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM public.evaluation_jobs WHERE id = p_id AND lease_token = p_lease_token;
+    RETURN FOUND;
+END;
+$$;
+
+-- Records a failed attempt: back to 'queued' after p_retry_delay_seconds, or 'dead' when out of
+-- attempts. Returns the new status, NULL if the lease was lost.
+CREATE OR REPLACE FUNCTION public.fail_evaluation_job(
+    p_id UUID,
+    p_lease_token UUID,
+    p_error TEXT,
+    p_retry_delay_seconds INT
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_status TEXT;
+BEGIN
+    UPDATE public.evaluation_jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+        available_at = NOW() + make_interval(secs => p_retry_delay_seconds),
+        leased_until = NULL,
+        lease_token = NULL,
+        last_error = p_error,
+        updated_at = NOW()
+    WHERE id = p_id AND lease_token = p_lease_token
+    RETURNING status INTO v_status;
+    RETURN v_status;
+END;
+$$;
+
+-- Queue depth for /metrics and the worker log
+CREATE OR REPLACE FUNCTION public.evaluation_queue_stats()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'queued', COUNT(*) FILTER (WHERE status = 'queued'),
+        'ready', COUNT(*) FILTER (WHERE status = 'queued' AND available_at <= NOW()),
+        'running', COUNT(*) FILTER (WHERE status = 'running'),
+        'dead', COUNT(*) FILTER (WHERE status = 'dead'),
+        'oldest_ready_age_seconds', COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(available_at) FILTER (
+            WHERE status = 'queued' AND available_at <= NOW())), 0)
+    )
+    FROM public.evaluation_jobs;
+$$;
@@ -0,0 +1,22 @@
+-- Deferral for the evaluation queue: a worker whose fair scheduler sheds a job hands it back
+-- without consuming an attempt (the job never ran), to be claimed again after p_delay_seconds.
+CREATE OR REPLACE FUNCTION public.release_evaluation_job(
+    p_id UUID,
+    p_lease_token UUID,
+    p_delay_seconds INT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE public.evaluation_jobs
+    SET status = 'queued',
+        attempts = GREATEST(attempts - 1, 0),
+        available_at = NOW() + make_interval(secs => p_delay_seconds),
+        leased_until = NULL,
+        lease_token = NULL,
+        updated_at = NOW()
+    WHERE id = p_id AND lease_token = p_lease_token;
+    RETURN FOUND;
+END;
+$$;
@@ -0,0 +1,7 @@
+-- Historical replay (app/services/replay.py) walks a team's raw_signals over an occurred_at range
+-- with the same (timestamp DESC, id DESC) keyset as the other listings.
+CREATE INDEX IF NOT EXISTS idx_raw_signals_team_occurred_id
+    ON public.raw_signals(team_id, occurred_at DESC, id DESC);
+
+-- Superseded: the new index shares its leading columns
+DROP INDEX IF EXISTS public.idx_raw_signals_team_occurred;
@@ -0,0 +1,155 @@
+-- Shadow mode for candidate workflow versions.
+-- A team may have one shadow workflow next to its active one: a saved but inactive version that
+-- every incoming signal is also evaluated against (off the critical path, nothing is executed).
+-- Both decisions are stored side by side in shadow_decisions; promote_shadow_workflow makes the
+-- candidate the active version once its diff report looks right.
+
+ALTER TABLE public.teams
+ADD COLUMN IF NOT EXISTS shadow_workflow_id UUID REFERENCES public.workflows(id) ON DELETE SET NULL;
+
+COMMENT ON COLUMN public.teams.shadow_workflow_id IS 'Candidate workflow evaluated in shadow mode alongside the active one (never executed).';
+
+CREATE TABLE IF NOT EXISTS public.shadow_decisions (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    team_id UUID NOT NULL REFERENCES public.teams(id) ON DELETE CASCADE,
+    active_workflow_id UUID REFERENCES public.workflows(id) ON DELETE SET NULL,
+    shadow_workflow_id UUID NOT NULL REFERENCES public.workflows(id) ON DELETE CASCADE,
+    source TEXT,
+    external_id TEXT,
+    signal_text TEXT,
+    -- outcome: prefiltered | noise | below_threshold | fired
+    active_outcome TEXT NOT NULL,
+    active_node_id TEXT,
+    active_node_label TEXT,
+    active_confidence FLOAT NOT NULL DEFAULT 0,
+    shadow_outcome TEXT NOT NULL,
+    shadow_node_id TEXT,
+    shadow_node_label TEXT,
+    shadow_confidence FLOAT NOT NULL DEFAULT 0,
+    shadow_cached BOOLEAN NOT NULL DEFAULT FALSE,
+    -- Only one version would fire, or both would fire different nodes (compared by label)
+    differs BOOLEAN NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE public.shadow_decisions ENABLE ROW LEVEL SECURITY;
+-- No policies: written by the backend's service role, read through the API.
+
+-- Diff report: keyset pages of one candidate's decisions, newest first (optionally differences only)
+CREATE INDEX IF NOT EXISTS idx_shadow_decisions_report
+    ON public.shadow_decisions(team_id, shadow_workflow_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_shadow_decisions_differs
+    ON public.shadow_decisions(team_id, shadow_workflow_id, created_at DESC, id DESC) WHERE differs;
+
+
+-- save_workflow_graph gains p_activate: FALSE saves the graph inactive and makes it the team's
+-- shadow workflow instead of replacing the active one.
+DROP FUNCTION IF EXISTS public.save_workflow_graph(UUID, UUID, TEXT, JSONB, JSONB);
+
+CREATE OR REPLACE FUNCTION public.save_workflow_graph(
+    p_team_id UUID,
+    p_inference_run_id UUID,
+    p_title TEXT,
+    p_nodes JSONB,
+    p_edges JSONB,
+    p_activate BOOLEAN DEFAULT TRUE
+)
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_workflow_id UUID;
+BEGIN
+    -- Serialize concurrent saves for the same team; released at commit/rollback
+    PERFORM pg_advisory_xact_lock(hashtext('save_workflow_graph:' || p_team_id::TEXT));
+
+    IF p_activate THEN
+        UPDATE public.workflows
+        SET is_active = FALSE
+        WHERE team_id = p_team_id AND is_active = TRUE;
+    END IF;
+
+    INSERT INTO public.workflows (team_id, inference_run_id, title, is_active)
+    VALUES (p_team_id, p_inference_run_id, COALESCE(p_title, 'Generated Workflow'), p_activate)
+    RETURNING id INTO v_workflow_id;
+
+    INSERT INTO public.workflow_nodes (workflow_id, step_id, label, type, description, actor, metadata)
+    SELECT
+        v_workflow_id,
+        n->>'id',
+        COALESCE(n->'data'->>'label', 'Untitled'),
+        COALESCE(n->>'type', 'process'),
+        COALESCE(n->'data'->>'description', ''),
+        COALESCE(n->'data'->>'actor', ''),
+        COALESCE(n->'data', '{}'::JSONB)
+    FROM jsonb_array_elements(COALESCE(p_nodes, '[]'::JSONB)) AS n;
+
+    INSERT INTO public.workflow_edges (workflow_id, source_step_id, target_step_id, label, condition)
+    SELECT
+        v_workflow_id,
+        e->>'source',
+        e->>'target',
+        COALESCE(e->>'label', ''),
+        ''
+    FROM jsonb_array_elements(COALESCE(p_edges, '[]'::JSONB)) AS e;
+
+    IF NOT p_activate THEN
+        UPDATE public.teams SET shadow_workflow_id = v_workflow_id WHERE id = p_team_id;
+    END IF;
+
+    RETURN v_workflow_id;
+END;
+$$;
+
+
+-- Makes the team's shadow workflow the active one and ends shadow mode.
+-- Returns the promoted workflow id, NULL if the team has no shadow workflow.
+CREATE OR REPLACE FUNCTION public.promote_shadow_workflow(p_team_id UUID)
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_workflow_id UUID;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('save_workflow_graph:' || p_team_id::TEXT));
+
+    SELECT shadow_workflow_id INTO v_workflow_id
+    FROM public.teams
+    WHERE id = p_team_id
+    FOR UPDATE;
+
+    IF v_workflow_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE public.workflows
+    SET is_active = FALSE
+    WHERE team_id = p_team_id AND is_active = TRUE;
+
+    UPDATE public.workflows SET is_active = TRUE WHERE id = v_workflow_id;
+    UPDATE public.teams SET shadow_workflow_id = NULL WHERE id = p_team_id;
+
+    RETURN v_workflow_id;
+END;
+$$;
+
+
+-- Counts for the diff report header, computed in the database rather than by paging every row.
+CREATE OR REPLACE FUNCTION public.shadow_decision_stats(p_team_id UUID, p_shadow_workflow_id UUID)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'evaluated', COUNT(*),
+        'differs', COUNT(*) FILTER (WHERE differs),
+        'both_fired', COUNT(*) FILTER (WHERE active_outcome = 'fired' AND shadow_outcome = 'fired'),
+        'active_only', COUNT(*) FILTER (WHERE active_outcome = 'fired' AND shadow_outcome <> 'fired'),
+        'shadow_only', COUNT(*) FILTER (WHERE active_outcome <> 'fired' AND shadow_outcome = 'fired'),
+        'different_node', COUNT(*) FILTER (WHERE differs AND active_outcome = 'fired' AND shadow_outcome = 'fired'),
+        'first_at', MIN(created_at),
+        'last_at', MAX(created_at)
+    )
+    FROM public.shadow_decisions
+    WHERE team_id = p_team_id AND shadow_workflow_id = p_shadow_workflow_id;
+$$;
@@ -0,0 +1,71 @@
+-- Long-running evaluation jobs: workers renew their lease while a job runs, and the automation
+-- for an idempotency key is marked as executed before it starts, so a job re-claimed after a
+-- lost lease can never run it a second time.
+
+-- Pushes a running job's lease out to NOW() + p_visibility_seconds. FALSE if the lease was lost
+-- (expired and re-claimed by another worker, or the job already finished).
+CREATE OR REPLACE FUNCTION public.extend_evaluation_job_lease(
+    p_id UUID,
+    p_lease_token UUID,
+    p_visibility_seconds INT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE public.evaluation_jobs
+    SET leased_until = NOW() + make_interval(secs => p_visibility_seconds),
+        updated_at = NOW()
+    WHERE id = p_id AND lease_token = p_lease_token AND status = 'running';
+    RETURN FOUND;
+END;
+$$;
+
+ALTER TABLE public.idempotency_keys ADD COLUMN IF NOT EXISTS executed_at TIMESTAMPTZ;
+
+-- A re-claimed (expired) key starts over, execution mark included.
+CREATE OR REPLACE FUNCTION public.claim_idempotency_key(
+    p_team_id UUID,
+    p_key TEXT,
+    p_ttl_seconds INT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_claimed BOOLEAN;
+BEGIN
+    INSERT INTO public.idempotency_keys AS k (team_id, key, expires_at)
+    VALUES (p_team_id, p_key, NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (team_id, key) DO UPDATE
+        SET created_at = NOW(), expires_at = EXCLUDED.expires_at, executed_at = NULL
+        WHERE k.expires_at <= NOW()
+    RETURNING TRUE INTO v_claimed;
+
+    RETURN COALESCE(v_claimed, FALSE);
+END;
+$$;
+
+-- Returns TRUE if the caller set the execution mark (and may run the automation), FALSE if an
+-- earlier attempt already did. Single statement, so two workers holding the same job cannot both win.
+CREATE OR REPLACE FUNCTION public.mark_idempotency_key_executed(
+    p_team_id UUID,
+    p_key TEXT,
+    p_ttl_seconds INT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_marked BOOLEAN;
+BEGIN
+    INSERT INTO public.idempotency_keys AS k (team_id, key, expires_at, executed_at)
+    VALUES (p_team_id, p_key, NOW() + make_interval(secs => p_ttl_seconds), NOW())
+    ON CONFLICT (team_id, key) DO UPDATE
+        SET executed_at = NOW()
+        WHERE k.executed_at IS NULL
+    RETURNING TRUE INTO v_marked;
+
+    RETURN COALESCE(v_marked, FALSE);
+END;
+$$;
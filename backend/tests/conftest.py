@@ -0,0 +1,39 @@
+"""
+Shared fixtures. The suite runs against the in-process storage backend (PERSISTENCE_BACKEND=memory),
+so it needs neither Supabase nor OpenAI. Run from backend/: python -m pytest
+"""
+import os
+import uuid
+
+os.environ["PERSISTENCE_BACKEND"] = "memory"
+
+import pytest
+
+from app.repositories.persistence import PersistenceRepository, get_repository
+
+
+@pytest.fixture
+def repo() -> PersistenceRepository:
+    repo = get_repository()
+    repo.db.reset_stats()
+    return repo
+
+
+@pytest.fixture
+def team_id(repo) -> str:
+    """A fresh team per test, so the shared workflow caches never carry state across tests"""
+    return repo.get_or_create_team("Test Team", f"owner-{uuid.uuid4().hex[:8]}")
+
+
+@pytest.fixture
+def make_workflow(repo):
+    def _make(team_id: str, labels=("Create Jira ticket",), activate: bool = True, auto_run: bool = True) -> str:
+        run_id = repo.create_inference_run(team_id, "test")
+        nodes = [{"id": str(i), "type": "process", "data": {"label": label}} for i, label in enumerate(labels, 1)]
+        edges = [{"source": a["id"], "target": b["id"]} for a, b in zip(nodes, nodes[1:])]
+        workflow_id = repo.save_workflow(team_id, run_id, {"title": "Test", "nodes": nodes, "edges": edges}, activate=activate)
+        if auto_run:
+            for node in nodes:
+                repo.set_node_auto_run_status(workflow_id, node["id"], True)
+        return workflow_id
+    return _make
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from app.services import audit_writer as audit_writer_module
+from app.services.audit_writer import AuditWriter
+
+
+@pytest.fixture
+def writer():
+    writer = AuditWriter(flush_size=1000, interval=60)  # Flushed by hand unless a test says otherwise
+    yield writer
+    writer.close()
+
+
+def _run(repo, run_id):
+    return repo.db.table("inference_runs").select("*").eq("id", run_id).maybe_single().execute().data
+
+
+def test_run_finished_between_flushes_is_written_once(repo, team_id, writer):
+    run_id = writer.start(team_id, "auto_pilot_evaluation", {"confidence": 0.95})
+    writer.finish(run_id, "completed", {"execution_result": {"success": True}}, trigger_type="create_jira_ticket")
+    repo.db.reset_stats()
+
+    assert writer.flush() == 1
+
+    assert repo.db.stats["inference_runs.upsert"] == 1
+    row = _run(repo, run_id)
+    assert row["status"] == "completed" and row["trigger_type"] == "create_jira_ticket"
+    assert row["model_config"] == {"confidence": 0.95, "execution_result": {"success": True}}
+    assert writer.stats()["coalesced"] == 1 and writer.stats()["buffered"] == 0
+
+
+def test_open_run_is_written_again_when_it_finishes(repo, team_id, writer):
+    run_id = writer.start(team_id, "auto_pilot_evaluation", {"confidence": 0.5})
+    writer.flush()
+    assert _run(repo, run_id)["status"] == "processing"
+
+    writer.finish(run_id, "skipped")
+    assert writer.flush() == 1
+
+    assert _run(repo, run_id)["status"] == "skipped"
+    assert writer.stats()["buffered"] == 0
+
+
+def test_failed_flush_requeues_rows(repo, team_id, writer, monkeypatch):
+    run_id = writer.start(team_id, "auto_pilot_evaluation")
+    writer.finish(run_id, "completed")
+
+    def unreachable():
+        raise ConnectionError("database unreachable")
+    monkeypatch.setattr(audit_writer_module, "get_repository", unreachable)
+    assert writer.flush() == 0
+    assert writer.stats()["failed_flushes"] == 1 and writer.stats()["dirty"] == 1
+
+    monkeypatch.undo()
+    assert writer.flush() == 1
+    assert _run(repo, run_id)["status"] == "completed"
+
+
+def test_full_buffer_sheds_the_oldest_runs(team_id):
+    writer = AuditWriter(flush_size=1000, interval=60, max_buffer=2)
+    try:
+        first = writer.start(team_id, "auto_pilot_evaluation")
+        writer.start(team_id, "auto_pilot_evaluation")
+        writer.start(team_id, "auto_pilot_evaluation")
+
+        writer.finish(first, "completed")  # Evicted: the finish is dropped, not written
+        assert writer.stats()["dropped"] == 2 and writer.stats()["buffered"] == 2
+    finally:
+        writer.close()
+
+
+def test_background_thread_flushes_at_flush_size(repo, team_id):
+    writer = AuditWriter(flush_size=2, interval=60)
+    try:
+        run_ids = [writer.start(team_id, "auto_pilot_evaluation") for _ in range(2)]
+        for _ in range(100):
+            if writer.stats()["rows_written"] == 2:
+                break
+            time.sleep(0.01)
+        assert all(_run(repo, run_id) for run_id in run_ids)
+    finally:
+        writer.close()
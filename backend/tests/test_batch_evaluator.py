@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.services.batch_evaluator import BatchEvaluator
+
+NODES = [{"id": "1", "data": {"label": "Create Jira ticket"}}]
+
+
+def _recording_match_fn(calls):
+    def match_fn(items, nodes):
+        calls.append([text for text, _ in items])
+        return [(nodes[0], 0.9, f"decided {text} with {context}") for text, context in items]
+    return match_fn
+
+
+def _match_all(evaluator, requests):
+    async def scenario():
+        return await asyncio.gather(*(evaluator.match(*request) for request in requests))
+    return asyncio.run(scenario())
+
+
+def test_signals_within_the_window_share_one_call():
+    calls = []
+    evaluator = BatchEvaluator(_recording_match_fn(calls), window_ms=20, max_size=10)
+
+    results = _match_all(evaluator, [("t", "wf", f"s{i}", NODES, f"c{i}") for i in range(3)])
+
+    assert calls == [["s0", "s1", "s2"]]
+    assert [reasoning for _, _, reasoning in results] == [f"decided s{i} with c{i}" for i in range(3)]
+    assert evaluator.stats()["batches"] == 1 and evaluator.stats()["avg_batch"] == 3.0
+
+
+def test_full_batch_goes_out_before_the_window():
+    calls = []
+    evaluator = BatchEvaluator(_recording_match_fn(calls), window_ms=10_000, max_size=2)
+
+    _match_all(evaluator, [("t", "wf", f"s{i}", NODES) for i in range(4)])
+
+    assert calls == [["s0", "s1"], ["s2", "s3"]]
+
+
+def test_batches_never_mix_teams_or_workflow_versions():
+    calls = []
+    evaluator = BatchEvaluator(_recording_match_fn(calls), window_ms=20, max_size=10)
+    edited = [{"id": "1", "data": {"label": "Open Jira ticket"}}]
+
+    _match_all(evaluator, [("t", "wf", "a", NODES), ("u", "wf", "b", NODES), ("t", "wf", "c", edited), ("t", "wf", "d", NODES)])
+
+    assert sorted(calls) == [["a", "d"], ["b"], ["c"]]
+
+
+def test_every_caller_gets_the_original_error():
+    def rate_limited(items, nodes):
+        raise TimeoutError("LLM request timed out")
+    evaluator = BatchEvaluator(rate_limited, window_ms=20, max_size=10)
+
+    async def scenario():
+        return await asyncio.gather(*(evaluator.match("t", "wf", f"s{i}", NODES) for i in range(2)), return_exceptions=True)
+    errors = asyncio.run(scenario())
+
+    assert all(isinstance(e, TimeoutError) for e in errors)
+    assert evaluator.stats()["failed_batches"] == 1
+
+
+def test_short_answer_fails_the_batch():
+    evaluator = BatchEvaluator(lambda items, nodes: [(None, 0.0, "only one")], window_ms=20, max_size=10)
+
+    with pytest.raises(ValueError):
+        _match_all(evaluator, [("t", "wf", f"s{i}", NODES) for i in range(2)])
+
+
+def test_zero_window_disables_batching():
+    calls = []
+    evaluator = BatchEvaluator(_recording_match_fn(calls), window_ms=0)
+
+    _match_all(evaluator, [("t", "wf", f"s{i}", NODES) for i in range(2)])
+
+    assert sorted(calls) == [["s0"], ["s1"]]
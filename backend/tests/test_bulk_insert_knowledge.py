@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.repositories import persistence
+from app.repositories.async_persistence import AsyncPersistenceRepository
+from app.repositories.persistence import PersistenceRepository
+from app.services import rag_service
+from app.services.rag_service import RAGService
+
+
+@pytest.fixture
+def failing_chunks(monkeypatch):
+    """Chunks containing a "bad" row fail permanently; returns the list of chunks sent"""
+    sent = []
+    monkeypatch.setattr(persistence, "KNOWLEDGE_INSERT_CHUNK_SIZE", 2)
+
+    def insert_chunk(self, chunk):
+        sent.append([row["content"] for row in chunk])
+        if any(row["content"] == "bad" for row in chunk):
+            return 0, ValueError("invalid row")
+        return len(chunk), None
+
+    async def insert_chunk_async(self, chunk):
+        return insert_chunk(self, chunk)
+
+    monkeypatch.setattr(PersistenceRepository, "_insert_knowledge_chunk", insert_chunk)
+    monkeypatch.setattr(AsyncPersistenceRepository, "_insert_knowledge_chunk", insert_chunk_async)
+    return sent
+
+
+def _rows(contents):
+    return [{"team_id": "t", "content": content, "metadata": {}} for content in contents]
+
+
+def test_ranges_are_merged_and_failures_listed(repo, failing_chunks):
+    rows = _rows(["a", "b", "c", "d", "bad", "e", "f"])
+
+    result = repo.bulk_insert_knowledge(rows)
+
+    assert result["inserted"] == 5
+    assert result["committed"] == [[0, 4], [6, 7]]
+    assert [(f["start"], f["end"]) for f in result["failed"]] == [(4, 6)]
+    assert "invalid row" in result["failed"][0]["error"]
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test_caller_rows_are_not_modified(repo, failing_chunks, is_async):
+    rows = _rows(["a", "b", "c"])
+    rows[1]["id"] = "given"
+    before = [dict(row) for row in rows]
+
+    if is_async:
+        result = asyncio.run(AsyncPersistenceRepository(repo.db).bulk_insert_knowledge(rows))
+    else:
+        result = repo.bulk_insert_knowledge(rows)
+
+    assert result["inserted"] == 3 and rows == before
+
+
+def test_generated_ids_are_stored(repo, team_id):
+    rows = [{"team_id": team_id, "content": f"doc {i}", "metadata": {}} for i in range(3)]
+
+    assert repo.bulk_insert_knowledge(rows, chunk_size=2)["committed"] == [[0, 3]]
+    stored = repo.db.table("knowledge_base").select("*").eq("team_id", team_id).execute().data
+    assert len({row["id"] for row in stored}) == 3 and all("id" not in row for row in rows)
+
+
+def test_documents_batch_returns_failed_ranges_without_resending(repo, failing_chunks, monkeypatch):
+    monkeypatch.setattr(rag_service, "generate_embeddings", lambda texts, profile=None: [[0.0] * 8 for _ in texts])
+
+    result = RAGService(repo).add_documents_batch("t", [{"content": c} for c in ["a", "b", "bad", "c"]])
+
+    assert [(f["start"], f["end"]) for f in result["failed"]] == [(2, 4)]
+    assert failing_chunks == [["a", "b"], ["bad", "c"]]  # The failed range is left to the caller
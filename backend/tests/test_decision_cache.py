@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app.services import trigger_engine
+from app.services.decision_cache import DecisionCache, decision_cache, normalize_signal_text
+
+NODES = [{"id": "1", "data": {"label": "Create Jira ticket"}, "auto_run_enabled": True}]
+WORKFLOW = {"workflow_id": "wf-1", "version": 1, "nodes": NODES}
+
+
+def test_volatile_text_is_normalized():
+    assert normalize_signal_text("Deploy FAILED: build 48213 https://ci/x") == "deploy failed: build <n> <url>"
+    assert normalize_signal_text("502 on login") != normalize_signal_text("504 on login")
+
+
+def test_key_covers_version_nodes_signal_and_context():
+    cache = DecisionCache(enabled=True)
+    key = cache.key("t", WORKFLOW, "Deploy failed: build 48213", "ctx")
+
+    assert cache.key("t", WORKFLOW, "deploy FAILED: build 50001", "ctx") == key
+    assert cache.key("t", {**WORKFLOW, "version": 2}, "Deploy failed: build 48213", "ctx") != key
+    assert cache.key("t", {**WORKFLOW, "nodes": []}, "Deploy failed: build 48213", "ctx") != key
+    assert cache.key("t", WORKFLOW, "Deploy failed: build 48213", "other ctx") != key
+    assert cache.key("u", WORKFLOW, "Deploy failed: build 48213", "ctx") != key
+
+
+def test_hit_resolves_against_current_nodes():
+    cache = DecisionCache(enabled=True)
+    key = cache.key("t", WORKFLOW, "outage", "")
+    cache.set(key, (NODES[0], 0.95, "AI Error budget exceeded, open a ticket"))  # A reasoning, not an error
+
+    renamed = [{**NODES[0], "data": {"label": "Open Jira ticket"}}]
+    assert cache.get(key, renamed) == (renamed[0], 0.95, "AI Error budget exceeded, open a ticket")
+    assert cache.get(key, []) == (None, 0.95, "AI Error budget exceeded, open a ticket")
+    assert DecisionCache(enabled=False).get(key, NODES) is None
+
+
+def test_workflow_writes_drop_the_workflows_entries(repo, team_id, make_workflow, monkeypatch):
+    monkeypatch.setattr(decision_cache, "enabled", True)
+    workflow_id = make_workflow(team_id)
+    workflow = repo.get_active_workflow(team_id)
+    key = decision_cache.key(team_id, workflow, "outage", "")
+    other = decision_cache.key("other-team", {**WORKFLOW, "workflow_id": "other"}, "outage", "")
+    decision_cache.set(key, (workflow["nodes"][0], 0.95, "match"))
+    decision_cache.set(other, (None, 0.2, "no match"))
+
+    repo.set_node_auto_run_status(workflow_id, "1", False)
+
+    assert decision_cache.get(key, workflow["nodes"]) is None
+    assert decision_cache.get(other, []) == (None, 0.2, "no match")
+    decision_cache.clear()
+
+
+@pytest.mark.parametrize("error, raised", [
+    (TimeoutError("LLM request timed out"), trigger_engine.EvaluationError),
+    (Exception("OpenAI Disabled"), trigger_engine.LLMUnavailable),
+])
+def test_llm_errors_are_raised_and_not_cached(monkeypatch, error, raised):
+    cache = DecisionCache(enabled=True)
+    monkeypatch.setattr(trigger_engine, "decision_cache", cache)
+    monkeypatch.setattr(trigger_engine.batch_evaluator, "window", 0)
+
+    def failing_match(items, nodes):
+        raise error
+    monkeypatch.setattr(trigger_engine.batch_evaluator, "match_fn", failing_match)
+
+    with pytest.raises(raised):
+        asyncio.run(trigger_engine.decide_async("t", WORKFLOW, "outage", ""))
+    assert cache.stats()["size"] == 0
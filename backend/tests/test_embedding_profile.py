@@ -0,0 +1,32 @@
+import pytest
+
+from app.core.embedding_profile import bytes_per_vector, embedding_fields, get_embedding_profile
+
+
+def test_compact_profile_is_a_sixth_of_full():
+    full, compact = get_embedding_profile("full"), get_embedding_profile("compact")
+
+    assert bytes_per_vector(full) == 6144 and bytes_per_vector(compact) == 1024
+    assert embedding_fields([0.1], compact) == {"embedding_compact": [0.1]}
+
+
+def test_profile_is_selected_from_the_environment(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_PROFILE", "compact")
+    assert get_embedding_profile()["name"] == "compact"
+
+    monkeypatch.setenv("EMBEDDING_PROFILE", "tiny")
+    with pytest.raises(ValueError):
+        get_embedding_profile()
+
+
+def test_compact_search_reads_the_compact_column(repo, team_id, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_PROFILE", "compact")
+    repo.db.table("knowledge_base").insert([
+        {"team_id": team_id, "content": "compact", "metadata": {}, **embedding_fields([1.0, 0.0])},
+        {"team_id": team_id, "content": "full only", "metadata": {}, "embedding": [1.0, 0.0]},
+    ]).execute()
+
+    hits = repo.search_knowledge_base(team_id, [1.0, 0.0])
+
+    assert [h["content"] for h in hits] == ["compact"]
+    assert repo.db.stats["rpc:match_knowledge_base_compact.call"] == 1
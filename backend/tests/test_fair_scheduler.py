@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from app.services.fair_scheduler import FairScheduler, SchedulerOverloaded
+
+
+def test_full_backlog_sheds_only_that_team():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=4, team_concurrency=1, max_backlog=1)
+        gate = asyncio.Event()
+
+        async def job():
+            await gate.wait()
+            return "done"
+
+        running = asyncio.ensure_future(scheduler.run("noisy", job))
+        waiting = asyncio.ensure_future(scheduler.run("noisy", job))
+        await asyncio.sleep(0)
+        assert scheduler.backlog("noisy") == 1
+
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.run("noisy", job)
+        quiet = asyncio.ensure_future(scheduler.run("quiet", job))  # Other teams are still admitted
+        await asyncio.sleep(0)
+
+        gate.set()
+        results = await asyncio.gather(running, waiting, quiet)
+        return results, scheduler.stats()["teams"]
+
+    results, teams = asyncio.run(scenario())
+
+    assert results == ["done", "done", "done"]
+    assert teams["noisy"]["shed"] == 1 and teams["noisy"]["completed"] == 2
+    assert teams["quiet"]["shed"] == 0 and teams["quiet"]["completed"] == 1
+
+
+def test_team_concurrency_is_enforced():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=8, team_concurrency=2, max_backlog=10)
+        active, peak = 0, 0
+
+        async def job():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        await asyncio.gather(*(scheduler.run("team", job) for _ in range(6)))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,44 @@
+import hashlib
+import uuid
+
+
+def _key() -> str:
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+
+def test_duplicates_are_rejected_from_the_local_cache(repo, team_id):
+    key = _key()
+
+    assert repo.claim_idempotency_key(team_id, key) is True
+    repo.db.reset_stats()
+
+    assert repo.claim_idempotency_key(team_id, key) is False
+    assert repo.db.query_count == 0  # The per-worker LRU answers a Slack retry
+
+
+def test_another_worker_sees_the_claim(repo, team_id):
+    key = _key()
+    repo.claim_idempotency_key(team_id, key)
+    repo.idempotency_cache.pop((team_id, key))  # As if claimed by another worker
+    repo.db.reset_stats()
+
+    assert repo.claim_idempotency_key(team_id, key) is False
+    assert repo.db.stats["rpc:claim_idempotency_key.call"] == 1
+
+
+def test_expired_key_can_be_claimed_again_and_purged(repo, team_id):
+    key = _key()
+    assert repo.claim_idempotency_key(team_id, key, ttl_seconds=-1)  # Already expired
+    repo.idempotency_cache.pop((team_id, key))
+
+    assert repo.claim_idempotency_key(team_id, key, ttl_seconds=-1) is True
+    assert repo.db.rpc("purge_expired_idempotency_keys", {}).execute().data >= 1
+    assert not repo.db.table("idempotency_keys").select("key").eq("key", key).execute().data
+
+
+def test_keys_are_scoped_to_the_team(repo, team_id):
+    key = _key()
+    other_team = repo.get_or_create_team("Other", f"owner-{uuid.uuid4().hex[:8]}")
+
+    assert repo.claim_idempotency_key(team_id, key) is True
+    assert repo.claim_idempotency_key(other_team, key) is True
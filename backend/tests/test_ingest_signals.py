@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.repositories.async_persistence import get_async_repository
+
+
+def _signals(count: int, pulled: list = None, prefix: str = "s"):
+    for i in range(count):
+        if pulled is not None:
+            pulled.append(i)
+        yield {"id": f"{prefix}{i}", "source": "jira", "text": f"signal {i}"}
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_chunks_are_streamed_in_input_order(repo, team_id, concurrency):
+    pulled, seen = [], []
+
+    def on_chunk(ids):
+        seen.append((len(pulled), ids))
+
+    result = repo.ingest_signals(team_id, _signals(10, pulled), on_chunk=on_chunk, chunk_size=3, concurrency=concurrency)
+
+    assert result == {"inserted": 10, "duplicates": 0, "chunks": 4}
+    assert [len(ids) for _, ids in seen] == [3, 3, 3, 1]
+    assert seen[0][0] <= 3 * (concurrency + 1)  # The generator is not drained up front
+    stored = {r["id"]: r["external_id"] for r in repo.db.table("raw_signals").select("id, external_id").eq("team_id", team_id).execute().data}
+    assert [stored[i] for _, ids in seen for i in ids] == [f"s{i}" for i in range(10)]
+
+
+def test_reingest_counts_duplicates_and_returns_existing_ids(repo, team_id):
+    first = repo.ingest_signals(team_id, _signals(4), collect_ids=True, chunk_size=2)
+    repo.db.reset_stats()
+
+    again = repo.ingest_signals(team_id, list(_signals(5)), collect_ids=True, chunk_size=2, concurrency=2)
+
+    assert (again["inserted"], again["duplicates"], again["chunks"]) == (1, 4, 3)
+    assert again["ids"][:4] == first["ids"]
+    assert repo.db.stats["raw_signals.upsert"] == 3 and repo.db.stats["raw_signals.select"] == 2
+
+
+def test_ids_are_only_looked_up_when_asked_for(repo, team_id):
+    repo.ingest_signals(team_id, _signals(4))
+    repo.db.reset_stats()
+
+    assert repo.ingest_signals(team_id, _signals(4), chunk_size=2) == {"inserted": 0, "duplicates": 4, "chunks": 2}
+    assert repo.db.query_count == 2
+
+
+def test_async_twin_accepts_async_iterables(repo, team_id):
+    async def signals():
+        for signal in _signals(5, prefix="a"):
+            yield signal
+
+    async def ingest():
+        seen = []
+
+        async def on_chunk(ids):
+            seen.append(ids)
+        arepo = await get_async_repository()
+        return await arepo.ingest_signals(team_id, signals(), on_chunk=on_chunk, chunk_size=2, concurrency=2), seen
+
+    result, seen = asyncio.run(ingest())
+
+    assert result == {"inserted": 5, "duplicates": 0, "chunks": 3}
+    assert [len(ids) for ids in seen] == [2, 2, 1]
@@ -0,0 +1,56 @@
+import base64
+import json
+import uuid
+
+import pytest
+
+from app.repositories.persistence import decode_cursor, encode_cursor
+
+
+def _raw_cursor(sort_value, row_id) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode()).decode().rstrip("=")
+
+
+def _add_knowledge(repo, team_id: str, count: int, created_at: str = None):
+    rows = [{"team_id": team_id, "content": f"doc {i}", "metadata": {}} for i in range(count)]
+    if created_at:
+        for row in rows:
+            row["created_at"] = created_at  # Ties on the sort column are broken by id
+    repo.db.table("knowledge_base").insert(rows).execute()
+
+
+def test_pages_cover_every_row_once(repo, team_id):
+    _add_knowledge(repo, team_id, 7)
+    _add_knowledge(repo, team_id, 5, created_at="2025-01-01T00:00:00+00:00")
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = repo.get_knowledge_items(team_id, limit=3, cursor=cursor)
+        seen.extend(item["id"] for item in page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert pages == 4 and len(seen) == len(set(seen)) == 12
+    assert [item["id"] for item in repo.iter_listing("knowledge", team_id, page_size=5)] == seen
+
+
+def test_cursor_round_trip():
+    row_id = str(uuid.uuid4())
+    assert decode_cursor(encode_cursor("2025-12-14T10:00:00.123456+00:00", row_id)) == ("2025-12-14T10:00:00.123456+00:00", row_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    _raw_cursor("2025-01-01T00:00:00+00:00", "abc"),
+    _raw_cursor('2025-01-01",id.gt."0', str(uuid.uuid4())),  # Filter injection through the sort value
+    _raw_cursor("2025-01-01T00:00:00+00:00", 'x",or(id.gt.0'),
+    _raw_cursor(None, str(uuid.uuid4())),
+    _raw_cursor(["2025-01-01"], str(uuid.uuid4())),
+])
+def test_malformed_cursor_is_rejected(repo, team_id, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    with pytest.raises(ValueError):
+        repo.get_knowledge_items(team_id, cursor=cursor)
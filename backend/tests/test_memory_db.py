@@ -0,0 +1,89 @@
+import pytest
+
+from app.core.memory_db import InMemoryClient, MemoryDBError
+
+
+@pytest.fixture
+def db() -> InMemoryClient:
+    return InMemoryClient(latency_ms=0)
+
+
+def _add_signals(db: InMemoryClient, team_id: str = "t1"):
+    db.table("raw_signals").insert([
+        {"team_id": team_id, "source": "slack", "external_id": str(i), "content": f"signal {i}",
+         "created_at": f"2025-01-0{i}T00:00:00+00:00"}
+        for i in range(1, 6)
+    ]).execute()
+
+
+def test_filters_order_and_range(db):
+    _add_signals(db)
+
+    rows = db.table("raw_signals").select("external_id").eq("team_id", "t1").gte("created_at", "2025-01-02")\
+        .order("created_at", desc=True).range(1, 2).execute().data
+
+    assert rows == [{"external_id": "4"}, {"external_id": "3"}]
+    assert [r["external_id"] for r in db.table("raw_signals").select("*").in_("external_id", ["1", "5"]).execute().data] == ["1", "5"]
+
+
+def test_or_logic_tree(db):
+    _add_signals(db)
+
+    rows = db.table("raw_signals").select("external_id")\
+        .or_('created_at.lt."2025-01-02T00:00:00+00:00",and(created_at.eq."2025-01-04T00:00:00+00:00",external_id.gt.3)')\
+        .execute().data
+
+    assert sorted(r["external_id"] for r in rows) == ["1", "4"]
+
+
+def test_unique_constraint_rejects_the_whole_batch(db):
+    _add_signals(db)
+
+    with pytest.raises(MemoryDBError):
+        db.table("raw_signals").insert([
+            {"team_id": "t1", "source": "slack", "external_id": "new"},
+            {"team_id": "t1", "source": "slack", "external_id": "1"},
+        ]).execute()
+    assert len(db.table("raw_signals").select("id").execute().data) == 5
+
+
+def test_upsert_on_conflict(db):
+    _add_signals(db)
+    row = {"team_id": "t1", "source": "slack", "external_id": "1", "content": "edited"}
+
+    assert db.table("raw_signals").upsert(row, on_conflict="team_id,source,external_id", ignore_duplicates=True).execute().data == []
+    db.table("raw_signals").upsert(row, on_conflict="team_id,source,external_id").execute()
+
+    stored = db.table("raw_signals").select("content").eq("external_id", "1").single().execute().data
+    assert stored == {"content": "edited"}
+
+
+def test_embedded_select_and_single(db):
+    team = db.table("teams").insert({"name": "T"}).execute().data[0]
+    workflow = db.table("workflows").insert({"team_id": team["id"], "is_active": True}).execute().data[0]
+    db.table("workflow_nodes").insert([{"workflow_id": workflow["id"], "step_id": str(i)} for i in range(2)]).execute()
+
+    graph = db.table("workflows").select("id, workflow_nodes(step_id)").eq("team_id", team["id"]).single().execute().data
+
+    assert graph == {"id": workflow["id"], "workflow_nodes": [{"step_id": "0"}, {"step_id": "1"}]}
+    with pytest.raises(MemoryDBError):
+        db.table("workflows").select("*").eq("team_id", "nobody").single().execute()
+    assert db.table("workflows").select("*").eq("team_id", "nobody").maybe_single().execute().data is None
+
+
+def test_every_request_is_counted(db):
+    _add_signals(db)
+    db.table("raw_signals").select("*").execute()
+    db.rpc("increment_usage", {"team_id_input": "t1"}).execute()
+
+    assert db.stats["raw_signals.insert"] == 1 and db.stats["raw_signals.select"] == 1
+    assert db.stats["rpc:increment_usage.call"] == 1 and db.query_count == 3
+    db.reset_stats()
+    assert db.query_count == 0
+
+
+def test_repository_runs_on_the_memory_backend(repo):
+    team_id = repo.get_or_create_team("Acme", "owner-memory-db")
+
+    assert repo.get_or_create_team("Acme", "owner-memory-db") == team_id
+    assert repo.get_team_auto_pilot_status(team_id) is True
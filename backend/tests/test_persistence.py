@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.repositories.async_persistence import get_async_repository
+
+
+def test_save_workflow_is_one_round_trip(repo, team_id):
+    run_id = repo.create_inference_run(team_id, "test")
+    nodes = [{"id": str(i), "type": "process", "data": {"label": f"Step {i}"}} for i in range(1, 21)]
+    edges = [{"source": a["id"], "target": b["id"]} for a, b in zip(nodes, nodes[1:])]
+    repo.db.reset_stats()
+
+    repo.save_workflow(team_id, run_id, {"nodes": nodes, "edges": edges})
+
+    assert repo.db.stats["rpc:save_workflow_graph.call"] == 1
+    assert repo.db.query_count == 1
+
+
+def test_get_active_workflow_queries_once_then_hits_cache(repo, team_id, make_workflow):
+    workflow_id = make_workflow(team_id, labels=("Triage", "Create Jira ticket", "Notify"))
+    repo.db.reset_stats()
+
+    first = repo.get_active_workflow(team_id)
+    assert repo.db.query_count == 1  # Nodes and edges are embedded in the workflows select
+    second = repo.get_active_workflow(team_id)
+    assert repo.db.query_count == 1
+
+    assert first["workflow_id"] == workflow_id and len(first["nodes"]) == 3 and len(first["edges"]) == 2
+    assert second is first
+
+
+def test_save_workflow_invalidates_cached_graph(repo, team_id, make_workflow):
+    make_workflow(team_id, labels=("Old",))
+    assert repo.get_active_workflow(team_id)["nodes"][0]["data"]["label"] == "Old"
+
+    new_id = make_workflow(team_id, labels=("New",))
+
+    active = repo.get_active_workflow(team_id)
+    assert active["workflow_id"] == new_id and active["nodes"][0]["data"]["label"] == "New"
+
+
+def test_promote_shadow_workflow(repo, team_id, make_workflow):
+    active_id = make_workflow(team_id, labels=("Current",))
+    shadow_id = make_workflow(team_id, labels=("Candidate",), activate=False)
+    assert repo.get_active_workflow(team_id)["workflow_id"] == active_id
+    assert repo.get_shadow_workflow(team_id)["workflow_id"] == shadow_id
+
+    async def promote():
+        arepo = await get_async_repository()
+        promoted = await arepo.promote_shadow_workflow(team_id)
+        return promoted, await arepo.get_active_workflow(team_id), await arepo.get_shadow_workflow(team_id)
+
+    promoted, active, shadow = asyncio.run(promote())
+
+    assert promoted == shadow_id
+    assert active["workflow_id"] == shadow_id  # The cached pre-promotion graph is not served
+    assert shadow is None
+    assert repo.get_active_workflow(team_id)["workflow_id"] == shadow_id  # Sync twin shares the caches
+
+
+def test_promote_without_shadow_workflow(repo, team_id, make_workflow):
+    active_id = make_workflow(team_id)
+
+    assert repo.promote_shadow_workflow(team_id) is None
+    assert repo.get_active_workflow(team_id)["workflow_id"] == active_id
+
+
+def test_concurrent_team_resolution_creates_one_team(repo, monkeypatch):
+    monkeypatch.setattr(repo.db, "latency_ms", 20)  # Overlap the first requests
+    owner_id = f"owner-{uuid.uuid4().hex[:8]}"
+    creates = repo.team_cache.creates
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        team_ids = set(pool.map(lambda _: repo.get_or_create_team("Burst", owner_id), range(8)))
+
+    assert len(team_ids) == 1 and repo.team_cache.creates == creates + 1
+    assert repo.db.stats["teams.select"] == 1 and repo.db.stats["teams.insert"] == 1
+    assert len(repo.db.table("teams").select("id").eq("owner_id", owner_id).execute().data) == 1
+
+    repo.db.reset_stats()
+    assert repo.get_or_create_team("Burst", owner_id) in team_ids
+    assert repo.db.query_count == 0
+
+
+def test_node_batch_is_one_rpc_with_per_node_results(repo, team_id, make_workflow):
+    workflow_id = make_workflow(team_id, labels=("A", "B", "C"), auto_run=False)
+    repo.get_active_workflow(team_id)
+    repo.db.reset_stats()
+
+    results = repo.update_workflow_nodes_batch(workflow_id, [
+        {"id": "1", "label": "Triage", "metadata": {"label": "Triage"}},  # The editor sends full metadata
+        {"id": "2", "auto_run_enabled": True},
+        {"id": "missing", "label": "Ghost"},
+    ])
+
+    assert results == [{"id": "1", "updated": True}, {"id": "2", "updated": True}, {"id": "missing", "updated": False}]
+    assert repo.db.stats["rpc:update_workflow_nodes_batch.call"] == 1 and repo.db.query_count == 1
+    nodes = {n["id"]: n for n in repo.get_active_workflow(team_id)["nodes"]}  # Cache was invalidated
+    assert nodes["1"]["data"]["label"] == "Triage" and nodes["2"]["auto_run_enabled"] is True
+
+
+def test_node_flags_are_scoped_to_their_workflow(repo, team_id, make_workflow):
+    draft_id = make_workflow(team_id, labels=("A", "B"), activate=False, auto_run=False)
+    active_id = make_workflow(team_id, labels=("A", "B"), auto_run=False)  # Same step ids
+
+    assert repo.set_node_auto_run_status(active_id, "1", True) is True
+    assert repo.get_node_auto_run_status(active_id, "1") is True
+    assert repo.get_node_auto_run_status(draft_id, "1") is False
+    assert repo.set_node_auto_run_status(active_id, "missing", True) is False
@@ -0,0 +1,80 @@
+import pytest
+
+from app.services import prefilter as prefilter_module
+from app.services.prefilter import SignalPrefilter, keywords
+
+JIRA = {"id": "1", "auto_run_enabled": True, "data": {"label": "Create Jira ticket", "description": "File a bug for an outage"}}
+PAGE = {"id": "2", "auto_run_enabled": True, "data": {"label": "Page on-call", "description": None}}
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """Node texts mentioning Jira embed to [1, 0], everything else to [0, 1]; returns the texts embedded"""
+    calls = []
+
+    def generate_embeddings(texts, profile=None):
+        calls.append(list(texts))
+        return [[1.0, 0.0] if "jira" in t.lower() else [0.0, 1.0] for t in texts]
+    monkeypatch.setattr(prefilter_module, "generate_embeddings", generate_embeddings)
+    return calls
+
+
+def test_keywords_drop_stopwords_and_suffixes():
+    assert keywords("Please create tickets for the failing deploys!") == {"create", "ticket", "fail", "deploy"}
+
+
+def test_keyword_overlap_passes_without_embedding_similarity(embedded):
+    screen = SignalPrefilter(min_score=0.3).check("can someone file a bug, login outage", [JIRA], [0.0, 1.0])
+
+    assert screen["passed"] and screen["node_id"] == "1" and screen["score"] >= 0.3
+
+
+def test_embedding_similarity_passes_without_keyword_overlap(embedded):
+    screen = SignalPrefilter(min_score=0.3).check("prod is down", [JIRA, PAGE], [0.0, 1.0])
+
+    assert screen["passed"] and screen["node_id"] == "2" and screen["score"] == 1.0
+
+
+def test_unrelated_signal_is_skipped(embedded):
+    prefilter = SignalPrefilter(min_score=0.3)
+
+    screen = prefilter.check("lunch order for friday", [JIRA], [0.0, 1.0])
+
+    assert not screen["passed"] and screen["reason"] == "below_floor"
+    assert prefilter.stats()["skip_rate"] == 1.0
+
+
+def test_fails_open_without_an_embedding(embedded, monkeypatch):
+    monkeypatch.setattr(prefilter_module, "generate_embeddings", lambda texts, profile=None: [])
+    screen = SignalPrefilter().check("lunch order for friday", [JIRA])
+
+    assert screen["passed"] and screen["reason"] == "embedding_unavailable"
+
+
+def test_no_auto_pilot_nodes_never_pass(embedded):
+    screen = SignalPrefilter().check("create a jira ticket", [{**JIRA, "auto_run_enabled": False}], [1.0, 0.0])
+
+    assert not screen["passed"] and screen["reason"] == "no_auto_pilot_nodes"
+
+
+def test_node_profiles_are_cached_until_the_node_changes(embedded):
+    prefilter = SignalPrefilter()
+    prefilter.check("outage", [JIRA, PAGE], [1.0, 0.0])
+    prefilter.check("outage again", [JIRA, PAGE], [1.0, 0.0])
+    assert len(embedded) == 1 and len(embedded[0]) == 2  # Both nodes profiled in one request
+
+    edited = {**PAGE, "data": {"label": "Page the on-call engineer"}}
+    prefilter.check("outage", [JIRA, edited], [1.0, 0.0])
+    assert embedded[1] == ["Page the on-call engineer"]
+
+
+def test_audit_counts_false_negatives(embedded):
+    prefilter = SignalPrefilter(min_score=0.9)
+    screen = prefilter.check("lunch order for friday", [JIRA], [0.0, 1.0])
+
+    prefilter._audit("team", "lunch order for friday", [JIRA], screen, lambda text, nodes, ctx: (JIRA, 0.95, "match"), 0.9)
+    prefilter._audit("team", "lunch order for friday", [JIRA], screen, lambda text, nodes, ctx: (None, 0.1, "no"), 0.9)
+
+    stats = prefilter.stats()
+    assert stats["audited"] == 2 and stats["false_negatives"] == 1 and stats["false_negative_rate"] == 0.5
+    assert stats["false_negative_samples"][0]["llm_node_id"] == "1"
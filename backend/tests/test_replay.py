@@ -0,0 +1,44 @@
+from app.services.replay import node_counts, threshold_curve
+
+NODES = [{"id": "jira", "data": {"label": "Create Jira ticket"}}, {"id": "page", "data": {"label": "Page on-call"}}]
+DECISIONS = [
+    {"signal_id": "s1", "label_key": "s1", "node_id": "jira", "confidence": 0.95},
+    {"signal_id": "s2", "label_key": "s2", "node_id": "jira", "confidence": 0.85},
+    {"signal_id": "s3", "label_key": "s3", "node_id": "page", "confidence": 0.92},
+    {"signal_id": "s4", "label_key": "s4", "node_id": None, "confidence": 0.0},
+    {"signal_id": "s5", "label_key": None, "node_id": "page", "confidence": 0.6},
+]
+
+
+def test_threshold_curve_without_labels():
+    curve = threshold_curve(DECISIONS, [0.9, 0.8])
+
+    assert [row["threshold"] for row in curve] == [0.8, 0.9]
+    assert [(row["fired"], row["coverage"]) for row in curve] == [(3, 0.6), (2, 0.4)]
+    assert curve[1]["mean_confidence"] == 0.935
+    assert curve[0]["precision"] is None and curve[0]["recall"] is None
+
+
+def test_threshold_curve_with_labels():
+    labels = {"s1": "jira", "s2": "page", "s3": "page", "s4": None}
+
+    low, high = threshold_curve(DECISIONS, [0.8, 0.9], labels)
+
+    # s2 should fire on "page" but matches "jira": a wrong fire at 0.8, a miss at either threshold
+    assert (low["precision"], low["recall"]) == (0.6667, 0.6667)
+    assert (high["precision"], high["recall"]) == (1.0, 0.6667)
+
+
+def test_threshold_curve_of_nothing():
+    assert threshold_curve([], [0.9]) == [
+        {"threshold": 0.9, "fired": 0, "coverage": 0.0, "mean_confidence": None, "precision": None, "recall": None}
+    ]
+
+
+def test_node_counts():
+    counts = node_counts(DECISIONS + [{"signal_id": "s6", "label_key": "s6", "node_id": "gone", "confidence": 0.99}], NODES, 0.9)
+
+    assert counts == {
+        "jira": {"label": "Create Jira ticket", "matches": 2, "fired": 1, "avg_confidence": 0.9},
+        "page": {"label": "Page on-call", "matches": 2, "fired": 1, "avg_confidence": 0.76},
+    }
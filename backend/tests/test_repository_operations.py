@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.repositories import persistence
+from app.repositories.async_persistence import AsyncPersistenceRepository, get_async_repository
+from app.repositories.persistence import PersistenceRepository
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _FlakyKnowledgeTable:
+    """knowledge_base stand-in whose first `failures` upserts time out"""
+
+    def __init__(self, failures: int, is_async: bool):
+        self.failures = failures
+        self.is_async = is_async
+        self.calls = 0
+        self._rows = []
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self._rows = rows
+        return self
+
+    def _execute(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TimeoutError("read timed out")
+        return _Response(self._rows)
+
+    def execute(self):
+        if not self.is_async:
+            return self._execute()
+
+        async def _run():
+            return self._execute()
+        return _run()
+
+
+def _repository(cls, db):
+    repo = cls.__new__(cls)
+    persistence.RepositoryOperations.__init__(repo, db)
+    return repo
+
+
+def test_sync_and_async_twins_return_the_same_graph(repo, team_id, make_workflow):
+    make_workflow(team_id, labels=("Triage", "Create Jira ticket"))
+    sync_graph = repo.get_active_workflow(team_id)
+    repo.workflow_cache.invalidate_team(team_id)
+
+    async def load():
+        return await (await get_async_repository()).get_active_workflow(team_id)
+
+    async_graph = asyncio.run(load())
+    assert async_graph == sync_graph and async_graph is not sync_graph
+
+
+def test_request_errors_reach_the_operation_error_handling(repo):
+    unknown_team = str(uuid.uuid4())  # .single() on no rows raises inside the operation
+
+    assert repo.get_team_auto_pilot_status(unknown_team) is True  # Fail-open, as before
+
+    async def status():
+        return await (await get_async_repository()).get_team_auto_pilot_status(unknown_team)
+
+    assert asyncio.run(status()) is True
+
+
+def test_unembedded_graph_fetches_nodes_and_edges_together(repo, team_id, make_workflow):
+    workflow_id = make_workflow(team_id, labels=("A", "B"))
+    row = repo.db.table("workflows").select("*").eq("id", workflow_id).single().execute().data
+    repo.db.reset_stats()
+
+    graph = repo._drive(repo._assemble_workflow_graph(row))
+
+    assert [n["id"] for n in graph["nodes"]] == ["1", "2"] and len(graph["edges"]) == 1
+    assert repo.db.query_count == 2
+
+
+@pytest.mark.parametrize("cls", [PersistenceRepository, AsyncPersistenceRepository])
+def test_transient_errors_are_retried_with_backoff(cls, monkeypatch):
+    monkeypatch.setattr(persistence, "KNOWLEDGE_INSERT_BACKOFF", 0)
+    db = _FlakyKnowledgeTable(failures=2, is_async=cls is AsyncPersistenceRepository)
+    repo = _repository(cls, db)
+    rows = [{"id": str(i), "content": "x"} for i in range(3)]
+
+    outcome = repo._insert_knowledge_chunk(rows)
+    if asyncio.iscoroutine(outcome):
+        outcome = asyncio.run(outcome)
+
+    assert outcome == (3, None) and db.calls == 3
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.services.tracing import StageMetrics, Trace
+
+
+def test_repeated_and_overlapping_stages_are_totalled():
+    metrics = StageMetrics(slow_percentile=100, sample_rate=0)
+    trace = Trace(metrics, team_id="t")
+
+    async def run():
+        await asyncio.gather(trace.timed("workflow", asyncio.sleep(0.01)), trace.timed("embedding", asyncio.sleep(0.01)))
+    asyncio.run(run())
+    for _ in range(2):
+        with trace.span("audit"):
+            pass
+    with pytest.raises(ValueError):
+        with trace.span("llm_match"):
+            raise ValueError("boom")
+
+    fields = trace.audit_fields()
+    trace.finish()
+    trace.finish()  # Histograms are fed once
+
+    assert set(fields["timings"]["stages"]) == {"workflow", "embedding", "audit", "llm_match"}
+    assert "trace" not in fields and trace.spans[-1]["error"] == "ValueError"
+    stats = metrics.stats()
+    assert stats["traces"] == 1 and stats["stages"]["audit"]["count"] == 1 and stats["stages"]["total"]["count"] == 1
+
+
+def test_slow_evaluations_keep_their_full_trace():
+    metrics = StageMetrics(slow_percentile=90, sample_rate=0)
+    for _ in range(100):
+        metrics.record(Trace(metrics), 10.0)
+    assert metrics.slow_threshold_ms() == 10.0
+
+    assert metrics.capture_reason(9.0) is None
+    slow = Trace(metrics, team_id="t")
+    slow._start -= 1  # A second old
+    with slow.span("llm_match"):
+        pass
+
+    fields = slow.audit_fields()
+    slow.finish()
+
+    assert fields["trace"]["captured"] == "slow" and fields["trace"]["team_id"] == "t"
+    assert metrics.stats()["captured_slow"] == 1 and len(metrics.slow_traces) == 1
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = StageMetrics(slow_percentile=100, sample_rate=0)
+    for ms in (3, 40, 40, 30000):
+        metrics.observe("rag_search", ms)
+
+    text = metrics.prometheus()
+
+    assert 'livesop_trigger_stage_duration_seconds_bucket{stage="rag_search",le="0.005"} 1' in text
+    assert 'livesop_trigger_stage_duration_seconds_bucket{stage="rag_search",le="0.05"} 3' in text
+    assert 'livesop_trigger_stage_duration_seconds_bucket{stage="rag_search",le="+Inf"} 4' in text
+    assert 'livesop_trigger_stage_duration_seconds_count{stage="rag_search"} 4' in text
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.services import work_queue
+from app.services.work_queue import SQLiteWorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_queue, "WORK_QUEUE_RETRY_BASE", 0)  # Failed jobs are claimable again at once
+    return SQLiteWorkQueue(str(tmp_path / "queue.sqlite3"))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_enqueue_dedupes_and_claim_leases(queue):
+    assert run(queue.enqueue("evaluate_signal", {"n": 1}, dedupe_key="a"))
+    assert not run(queue.enqueue("evaluate_signal", {"n": 1}, dedupe_key="a"))
+    assert run(queue.enqueue("evaluate_signal", {"n": 2}))
+
+    jobs = run(queue.claim("w1", 5))
+    assert [j["payload"] for j in jobs] == [{"n": 1}, {"n": 2}]
+    assert all(j["attempts"] == 1 and j["status"] == "running" for j in jobs)
+    assert run(queue.claim("w2", 5)) == []  # Leased jobs are not handed out twice
+
+    assert run(queue.complete(jobs[0]))
+    assert not run(queue.complete(jobs[0]))
+    assert run(queue.stats())["running"] == 1
+
+
+def test_fail_retries_then_dead_letters(queue):
+    run(queue.enqueue("evaluate_signal", {}, max_attempts=2))
+
+    job = run(queue.claim("w1", 1))[0]
+    assert run(queue.fail(job, "boom")) == "queued"
+    job = run(queue.claim("w1", 1))[0]
+    assert job["attempts"] == 2
+    assert run(queue.fail(job, "boom again")) == "dead"
+
+    assert run(queue.claim("w1", 1)) == []
+    assert run(queue.stats())["dead"] == 1
+    assert run(queue.requeue_dead()) == 1
+    assert run(queue.claim("w1", 1))[0]["attempts"] == 1
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_loses(queue):
+    run(queue.enqueue("evaluate_signal", {}))
+    stale = run(queue.claim("w1", 1, visibility_timeout=0))[0]
+
+    fresh = run(queue.claim("w2", 1))[0]
+    assert fresh["id"] == stale["id"] and fresh["attempts"] == 2
+
+    assert run(queue.fail(stale, "late")) is None
+    assert not run(queue.complete(stale))
+    assert run(queue.complete(fresh))
+
+
+def test_release_does_not_use_an_attempt(queue):
+    run(queue.enqueue("evaluate_signal", {}))
+    job = run(queue.claim("w1", 1))[0]
+
+    assert run(queue.release(job, delay=0))
+    assert not run(queue.release(job, delay=0))  # The lease went with the release
+
+    again = run(queue.claim("w1", 1))[0]
+    assert again["id"] == job["id"] and again["attempts"] == 1
+
+
+def test_extended_lease_is_not_reclaimed(queue):
+    run(queue.enqueue("evaluate_signal", {}))
+    job = run(queue.claim("w1", 1, visibility_timeout=0))[0]
+
+    assert run(queue.extend_lease(job, 60))
+    assert run(queue.claim("w2", 1)) == []
+    assert run(queue.complete(job))
+
+
+def test_lost_lease_cannot_be_extended(queue):
+    run(queue.enqueue("evaluate_signal", {}))
+    stale = run(queue.claim("w1", 1, visibility_timeout=0))[0]
+    fresh = run(queue.claim("w2", 1))[0]
+
+    assert not run(queue.extend_lease(stale, 60))
+    assert run(queue.extend_lease(fresh, 60))
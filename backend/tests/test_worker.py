@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import pytest
+
+from app import worker as worker_module
+from app.repositories.async_persistence import AsyncPersistenceRepository
+from app.services import trigger_engine, work_queue
+from app.services.decision_cache import decision_cache
+from app.services.work_queue import SQLiteWorkQueue
+
+SIGNAL = {"id": "sig-1", "source": "slack", "text": "please create a jira ticket for the outage"}
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    """Stubs out the LLM, embeddings and automations; returns the list of executed actions"""
+    actions = []
+    monkeypatch.setattr(work_queue, "WORK_QUEUE_RETRY_BASE", 0)
+    monkeypatch.setattr(decision_cache, "enabled", False)
+    monkeypatch.setattr(trigger_engine, "generate_embeddings", lambda texts, profile=None: [[0.0] * 8 for _ in texts])
+    monkeypatch.setattr(trigger_engine.batch_evaluator, "window", 0)
+    monkeypatch.setattr(trigger_engine.batch_evaluator, "match_fn", lambda items, nodes: [(nodes[0], 0.95, "match") for _ in items])
+    monkeypatch.setattr(trigger_engine, "run_automation_logic", lambda team_id, action, params: actions.append(action) or {"success": True})
+    return actions
+
+
+def drain(tmp_path, team_id: str, timeout: float = 5.0, workers: int = 1, visibility_timeout: int = 60):
+    """Enqueues SIGNAL and runs workers until the queue is empty; returns (summed worker counters, queue stats)"""
+    async def scenario():
+        queue = SQLiteWorkQueue(str(tmp_path / "queue.sqlite3"))
+        await queue.enqueue("evaluate_signal", {"team_id": team_id, "signal": SIGNAL}, team_id=team_id, max_attempts=3)
+        pool = [worker_module.Worker(queue, concurrency=2, poll_interval=0.02, timeout=timeout, visibility_timeout=visibility_timeout)
+                for _ in range(workers)]
+        tasks = [asyncio.ensure_future(w.run()) for w in pool]
+        for _ in range(200):
+            await asyncio.sleep(0.02)
+            stats = await queue.stats()
+            if stats["queued"] == 0 and stats["running"] == 0:
+                break
+        for w in pool:
+            w.stop()
+        await asyncio.gather(*tasks)
+        counters = {k: sum(w.counters[k] for w in pool) for k in pool[0].counters}
+        return counters, await queue.stats()
+    return asyncio.run(scenario())
+
+
+def test_usage_error_after_execution_is_not_retried(tmp_path, repo, team_id, make_workflow, executed, monkeypatch):
+    make_workflow(team_id)
+
+    async def increment_usage(self, team_id):
+        raise RuntimeError("usage table unavailable")
+    monkeypatch.setattr(AsyncPersistenceRepository, "increment_usage", increment_usage)
+
+    counters, stats = drain(tmp_path, team_id)
+
+    assert executed == ["create_jira_ticket"]
+    assert counters["completed"] == 1 and counters["retried"] == 0
+    assert stats["dead"] == 0
+
+
+def test_slow_automation_is_not_cut_off_by_the_timeout(tmp_path, repo, team_id, make_workflow, executed, monkeypatch):
+    make_workflow(team_id)
+
+    def slow_automation(team_id, action, params):
+        time.sleep(0.3)
+        executed.append(action)
+        return {"success": True}
+    monkeypatch.setattr(trigger_engine, "run_automation_logic", slow_automation)
+
+    counters, _ = drain(tmp_path, team_id, timeout=0.1)
+
+    assert executed == ["create_jira_ticket"]
+    assert counters["completed"] == 1 and counters["retried"] == 0
+
+
+def test_transient_llm_error_is_retried_and_executes_once(tmp_path, repo, team_id, make_workflow, executed, monkeypatch):
+    make_workflow(team_id)
+    calls = []
+
+    def flaky_match(items, nodes):
+        calls.append(len(items))
+        if len(calls) == 1:
+            raise TimeoutError("LLM request timed out")
+        return [(nodes[0], 0.95, "match") for _ in items]
+    monkeypatch.setattr(trigger_engine.batch_evaluator, "match_fn", flaky_match)
+
+    counters, _ = drain(tmp_path, team_id)
+
+    assert len(calls) == 2  # The retry is not mistaken for a duplicate of the first attempt
+    assert executed == ["create_jira_ticket"]
+    assert counters["retried"] == 1 and counters["completed"] == 1
+
+
+def test_permanent_llm_error_is_dropped_without_retry(tmp_path, repo, team_id, make_workflow, executed, monkeypatch):
+    make_workflow(team_id)
+
+    def disabled_match(items, nodes):
+        raise Exception("OpenAI Disabled")
+    monkeypatch.setattr(trigger_engine.batch_evaluator, "match_fn", disabled_match)
+
+    counters, stats = drain(tmp_path, team_id)
+
+    assert executed == []
+    assert counters["completed"] == 1 and counters["retried"] == 0 and stats["dead"] == 0
+
+
+def test_disabled_team_stops_before_llm_and_audit(tmp_path, repo, team_id, make_workflow, executed, monkeypatch):
+    make_workflow(team_id)
+    repo.set_team_auto_pilot_status(team_id, False)
+    runs = len(repo.get_inference_runs(team_id)["items"])
+    calls = []
+    monkeypatch.setattr(trigger_engine.batch_evaluator, "match_fn", lambda items, nodes: calls.append(items) or [])
+
+    counters, _ = drain(tmp_path, team_id)
+
+    assert executed == [] and calls == []
+    assert counters["completed"] == 1
+    assert len(repo.get_inference_runs(team_id)["items"]) == runs  # No audit row for a disabled team
+
+
+def _slow_automation(executed, seconds: float):
+    def automation(team_id, action, params):
+        time.sleep(seconds)
+        executed.append(action)
+        return {"success": True}
+    return automation
+
+
+def test_lease_outlives_a_visibility_timeout_shorter_than_the_automation(tmp_path, repo, team_id, make_workflow, executed, monkeypatch):
+    make_workflow(team_id)
+    monkeypatch.setattr(trigger_engine, "run_automation_logic", _slow_automation(executed, 1.6))
+
+    counters, stats = drain(tmp_path, team_id, workers=2, visibility_timeout=1)
+
+    assert executed == ["create_jira_ticket"]  # The second worker never got the job
+    assert counters["completed"] == 1 and counters["lost_leases"] == 0 and counters["retried"] == 0
+    assert stats["running"] == 0
+
+
+def test_reclaimed_job_does_not_execute_again(tmp_path, repo, team_id, make_workflow, executed, monkeypatch):
+    make_workflow(team_id)
+    monkeypatch.setattr(trigger_engine, "run_automation_logic", _slow_automation(executed, 1.6))
+
+    async def no_heartbeat(self, job):
+        return  # Lease renewals are lost (e.g. the database was unreachable)
+    monkeypatch.setattr(worker_module.Worker, "_heartbeat", no_heartbeat)
+
+    counters, _ = drain(tmp_path, team_id, workers=2, visibility_timeout=1)
+
+    assert executed == ["create_jira_ticket"]  # The retry found the execution mark
+    assert counters["completed"] == 1 and counters["lost_leases"] == 1
@@ -4,6 +4,7 @@ import { Trash2, FileText, Plus, Upload, Loader2, Book } from 'lucide-react';
 
 export default function KnowledgeBase({ teamId }) {
     const [docs, setDocs] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [loading, setLoading] = useState(true);
     const [uploading, setUploading] = useState(false);
     const [newText, setNewText] = useState("");
@@ -13,12 +14,15 @@ export default function KnowledgeBase({ teamId }) {
         if (teamId) loadDocs();
     }, [teamId]);
 
-    const loadDocs = async () => {
+    const loadDocs = async (cursor = null) => {
         setLoading(true);
         try {
-            const res = await api.get(`/knowledge/${teamId}/knowledge`);
+            const res = await api.get(`/knowledge/${teamId}/knowledge`, {
+                params: cursor ? { cursor } : {}
+            });
             if (res.data.success) {
-                setDocs(res.data.documents);
+                setDocs(prev => cursor ? [...prev, ...res.data.documents] : res.data.documents);
+                setNextCursor(res.data.next_cursor || null);
             }
         } catch (e) {
             console.error("Failed to load KB", e);
@@ -134,6 +138,12 @@ export default function KnowledgeBase({ teamId }) {
                     </div>
                 )}
 
+                {!loading && nextCursor && (
+                    <button onClick={() => loadDocs(nextCursor)} className="mx-auto px-4 py-2 text-sm font-medium text-blue-600 hover:bg-blue-50 dark:hover:bg-blue-900/20 rounded-lg transition-colors">
+                        Load more
+                    </button>
+                )}
+
                 {loading && (
                     <div className="flex justify-center py-12">
                         <Loader2 className="w-8 h-8 animate-spin text-blue-600" />